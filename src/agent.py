@@ -1,16 +1,25 @@
+import asyncio
 import sys
 import threading
 import time
 
-from lib.packets import ACKPacket, AgentRegistrationStatus, MetricsPacket, Packet, PacketType, RegisterAgentPacket
+from lib.packets import AgentRegistrationStatus, MetricsPacket, Packet, PacketType, RegisterAgentPacket
 from lib.udp import UDPServer
+from lib.udp_async import AsyncUDPServer
 from agent.metrics import MetricsResult, calculate_bandwidth, calculate_jitter, calculate_packet_loss, calculate_latency
 from agent.conditions import ConditionsResult, calculate_cpu_usage, calculate_ram_usage, calculate_interface_stats
 from agent.tools import iperf
+from agent.batching import MetricsBatcher
+from agent.alerts import AlertSuppressor
+from lib.checksum import set_checksum_algorithm
+from lib.compression import CAPABILITIES, Compression
 from lib.logging import log
 from lib.tcp import TCPClient, AlertMessage, AlertType
 
 agent_id = None
+metrics_batcher = None
+alert_suppressor = None
+compression = Compression.NONE  # Negotiated with the server on registration
 
 def task_runner(task, server_address, udp_server, tcp_client):
     '''
@@ -18,8 +27,8 @@ def task_runner(task, server_address, udp_server, tcp_client):
 
     This function calculates various metrics (bandwidth, jitter, packet loss, latency) 
     and conditions (CPU usage, RAM usage, interface stats) as per the task's configuration. 
-    The results are sent back to the server via UDP, and alerts are sent via TCP if 
-    thresholds are exceeded.
+    The results are batched with the metrics of other tasks and sent back to the server via
+    UDP, and alerts are sent via TCP when thresholds start being exceeded.
 
     Args:
         task: The task object containing metrics and conditions to calculate.
@@ -76,48 +85,54 @@ def task_runner(task, server_address, udp_server, tcp_client):
     log(f"Calculating Interface Stats for task ({task.id}).")
     resultConditions.set_interface_stats(calculate_interface_stats(interface_stats))
 
-    # Send the results back to the server
+    # Send the results back to the server, along with the ones of other tasks
     packet = MetricsPacket(task.id, agent_id, result.bandwidth, result.jitter, result.packet_loss, result.latency, int(time.time()))
-    udp_server.send_message(packet, server_address)
+    metrics_batcher.add(packet)
 
-    alerts = check_critical_changes(resultConditions, alterflow_conditions)
+    alerts = check_critical_changes(task.id, resultConditions, alterflow_conditions)
     for alert, alert_type in alerts:
         alert_message = AlertMessage(
             task_id=task.id,
             device_id=agent_id,
             alert_type=alert_type,
             details=alert,
-            timestamp=int(time.time())
+            timestamp=int(time.time()),
+            compression=compression
         )
         tcp_client.send_alert(alert_message)
 
-def check_critical_changes(metrics, thresholds):
+def check_critical_changes(task_id, metrics, thresholds):
     '''
-    Checks if any calculated metrics exceed their defined thresholds and generates alerts.
+    Checks the calculated metrics against their defined thresholds and generates alerts.
+
+    Every check goes through the agent's AlertSuppressor, so a threshold that stays exceeded
+    raises one alert when it starts firing, then a roll-up per cooldown, not one alert per run.
 
     Args:
+        task_id (str): The ID of the task that calculated the metrics.
         metrics (ConditionsResult): The calculated metrics of the agent (CPU, RAM, jitter, etc.).
         thresholds: The thresholds specified for the task's metrics and conditions.
 
     Returns:
         list: A list of tuples containing the alert message and its type.
     '''
-    alerts = []
-
-    if metrics.cpu_usage > thresholds.cpu_usage:
-        alerts.append((f"CPU usage is above the threshold: {round(metrics.cpu_usage, 2)}%", AlertType.HIGH_CPU_USAGE))
-    
-    if metrics.ram_usage > thresholds.ram_usage:
-        alerts.append((f"RAM usage is above the threshold: {round(metrics.ram_usage, 2)}%", AlertType.HIGH_RAM_USAGE))
+    conditions = [
+        (AlertType.HIGH_CPU_USAGE, metrics.cpu_usage, thresholds.cpu_usage, "CPU usage is above the threshold: {}%"),
+        (AlertType.HIGH_RAM_USAGE, metrics.ram_usage, thresholds.ram_usage, "RAM usage is above the threshold: {}%"),
+        (AlertType.HIGH_PACKET_LOSS, metrics.packet_loss, thresholds.packet_loss, "Packet loss is above the threshold: {}%"),
+        (AlertType.HIGH_JITTER, metrics.jitter, thresholds.jitter, "Jitter is above the threshold: {}ms"),
+        (AlertType.HIGH_INTERFACE_STATS, metrics.interface_stats, thresholds.interface_stats, "Interface stats are above the threshold: {}")
+    ]
 
-    if metrics.packet_loss and metrics.packet_loss > thresholds.packet_loss:
-        alerts.append((f"Packet loss is above the threshold: {round(metrics.packet_loss, 2)}%", AlertType.HIGH_PACKET_LOSS))
+    alerts = []
+    for alert_type, value, threshold, message in conditions:
+        # Packet loss and jitter are only measured by some tasks
+        if value is None:
+            continue
 
-    if metrics.jitter and metrics.jitter > thresholds.jitter:
-        alerts.append((f"Jitter is above the threshold: {round(metrics.jitter, 2)}ms", AlertType.HIGH_JITTER))
-    
-    if metrics.interface_stats > thresholds.interface_stats:
-        alerts.append((f"Interface stats are above the threshold: {round(metrics.interface_stats, 2)}", AlertType.HIGH_INTERFACE_STATS))
+        details = alert_suppressor.check(task_id, alert_type, value, threshold, message.format(round(value, 2)))
+        if details:
+            alerts.append((details, alert_type))
 
     return alerts
 
@@ -181,8 +196,8 @@ def agent_packet_handler(message, server_address, server, tcp_client):
     '''
     Handles incoming packets from the NMS server.
 
-    This function processes registration responses and task packets. It sends acknowledgments 
-    for received packets and starts tasks in separate threads.
+    This function processes registration responses and task packets and starts tasks in
+    separate threads. Packets are acknowledged by the UDP server itself.
 
     Args:
         message (Packet): The incoming packet object from the server.
@@ -193,17 +208,12 @@ def agent_packet_handler(message, server_address, server, tcp_client):
     Returns:
         None.
     '''
-    if message.ack_number != 0:
-        log(f"ACK received for sequence {message.ack_number}")
-        return
-    
-    ack_packet = ACKPacket(message.sequence_number, message.sequence_number)
-    server.send_message(ack_packet, server_address)
-
+    global compression
     if message.packet_type == PacketType.RegisterAgentResponse:
         register_status = message.agent_registration_status
         if register_status == AgentRegistrationStatus.Success:
-            log("Agent registered successfully.")
+            compression = message.compression
+            log(f"Agent registered successfully (compression: {compression.name}).")
         elif register_status == AgentRegistrationStatus.AlreadyRegistered:
             log("An agent with this ID is already registered.", "ERROR")
             exit(1)
@@ -222,6 +232,29 @@ def agent_packet_handler(message, server_address, server, tcp_client):
 
     return None
 
+async def run_agent_async(server_ip, tcp_client):
+    '''
+    Runs the agent's UDP side on a single event loop.
+
+    Registers the agent with the server and keeps serving. Tasks still run on their own
+    threads, since the measurement tools block, and hand their metrics to the event loop.
+
+    Args:
+        server_ip (str): The IP address of the server.
+        tcp_client (TCPClient): The TCP client instance used for sending alerts.
+
+    Returns:
+        None.
+    '''
+    global metrics_batcher
+    udp_server = AsyncUDPServer("0.0.0.0", 0, lambda msg, addr, srv: agent_packet_handler(msg, addr, srv, tcp_client))
+    await udp_server.start()
+    metrics_batcher = MetricsBatcher(udp_server, (server_ip, 8080))
+
+    udp_server.send_message(RegisterAgentPacket(agent_id, None, None, CAPABILITIES), (server_ip, 8080))
+
+    await udp_server.serve_forever()
+
 def main():
     '''
     The entry point for the agent program.
@@ -232,27 +265,64 @@ def main():
     Command-line arguments:
         <server_ip>: The IP address of the server.
         <agent_id>: The unique ID of the agent.
+        --asyncio: Run the UDP transport on an asyncio event loop.
+        --alert-cooldown <seconds>: Minimum time between two alerts of the same type for a task (default 300).
+        --alert-hysteresis <fraction>: Fraction of a threshold a value must fall below it to clear its alert, below 1 (default 0.1).
+        --checksum <algorithm>: Checksum of the packets sent, crc32 (default), sha256-32 or sha256.
 
     Returns:
         None.
     '''
-    global agent_id
+    global agent_id, metrics_batcher, alert_suppressor
     log("Starting up NMS agent.")
 
-    if len(sys.argv) != 3:
-        print("Usage: python " + sys.argv[0] + " <server_ip> <agent_id>")
+    usage = "Usage: python " + sys.argv[0] + " <server_ip> <agent_id> [--asyncio] [--alert-cooldown <seconds>] [--alert-hysteresis <fraction>] [--checksum <crc32|sha256-32|sha256>]"
+    use_asyncio = "--asyncio" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--asyncio"]
+
+    options = {"--alert-cooldown": 300.0, "--alert-hysteresis": 0.1}
+    for option in options:
+        if option in args:
+            index = args.index(option)
+            try:
+                options[option] = float(args[index + 1])
+            except (IndexError, ValueError):
+                options[option] = -1.0
+            # A hysteresis of the whole threshold or more would never clear an alert
+            if options[option] < 0 or (option == "--alert-hysteresis" and options[option] >= 1):
+                print(usage)
+                sys.exit(1)
+            del args[index:index + 2]
+
+    if "--checksum" in args:
+        index = args.index("--checksum")
+        try:
+            set_checksum_algorithm(args[index + 1])
+        except (IndexError, KeyError):
+            print(usage)
+            sys.exit(1)
+        del args[index:index + 2]
+
+    if len(args) != 2:
+        print(usage)
         sys.exit(1)
 
-    server_ip = sys.argv[1]
-    agent_id = sys.argv[2]
+    server_ip = args[0]
+    agent_id = args[1]
+    alert_suppressor = AlertSuppressor(options["--alert-cooldown"], options["--alert-hysteresis"])
     
     tcp_client = TCPClient(server_ip, server_port=9090)
 
+    if use_asyncio:
+        asyncio.run(run_agent_async(server_ip, tcp_client))
+        return
+
     udp_server = UDPServer("0.0.0.0", 0, lambda msg, addr, srv: agent_packet_handler(msg, addr, srv, tcp_client))
+    metrics_batcher = MetricsBatcher(udp_server, (server_ip, 8080))
     net_task_thread = threading.Thread(target=udp_server.start, daemon=True)
     net_task_thread.start()
 
-    udp_server.send_message(RegisterAgentPacket(agent_id, None, None), (server_ip, 8080))
+    udp_server.send_message(RegisterAgentPacket(agent_id, None, None, CAPABILITIES), (server_ip, 8080))
 
     net_task_thread.join()
 
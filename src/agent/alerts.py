@@ -0,0 +1,90 @@
+import threading
+import time
+
+from lib.logging import log
+
+class AlertSuppressor:
+    '''
+    Turns the threshold checks made on every run of a task into alerts sent on state changes.
+
+    Every (task, alert type) pair is a condition that starts firing when its value goes above
+    the threshold, and only clears once the value falls below the threshold lowered by the
+    hysteresis, so a value hovering around the threshold doesn't flap. A condition sends at most
+    one alert per cooldown: the one it starts firing with, then, while it keeps firing, a
+    "still firing, N occurrences" roll-up once the cooldown is over. Breaches within a cooldown
+    are only counted, and reported by the next alert.
+
+    Attributes:
+        cooldown (float): Minimum time between two alerts of the same condition, in seconds.
+        hysteresis (float): Fraction of the threshold the value must fall below it to clear the condition.
+        sent (int): Number of alerts let through.
+        suppressed (int): Number of breaches that didn't produce an alert.
+    '''
+    def __init__(self, cooldown=300, hysteresis=0.1):
+        '''
+        Initializes an AlertSuppressor.
+
+        Args:
+            cooldown (float, optional): Minimum time between two alerts of the same condition, in seconds. Defaults to 300.
+            hysteresis (float, optional): Fraction of the threshold the value must fall below it to clear the condition. Defaults to 0.1.
+
+        Raises:
+            ValueError: If the cooldown is negative or the hysteresis isn't in [0, 1).
+        '''
+        if cooldown < 0:
+            raise ValueError("The alert cooldown can't be negative.")
+        if not 0 <= hysteresis < 1:
+            raise ValueError("The alert hysteresis must be at least 0 and below 1.")
+
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        # Map (task_id, alert_type) -> {firing, occurrences, last_sent}
+        self.conditions = {}
+        self.sent = 0
+        self.suppressed = 0
+        self.lock = threading.Lock()  # Tasks run on their own threads
+
+    def check(self, task_id, alert_type, value, threshold, details, now=None):
+        '''
+        Updates a condition with a new value, and tells whether to send an alert for it.
+
+        Args:
+            task_id (str): The task that measured the value.
+            alert_type (AlertType): The type of alert raised by the condition.
+            value (float): The measured value.
+            threshold (float): The threshold the value is compared with.
+            details (str): The details of the alert, if one is sent.
+            now (float, optional): The current monotonic time. Defaults to time.monotonic().
+
+        Returns:
+            str or None: The details of the alert to send, with the number of occurrences it
+            rolls up, or None if no alert should be sent.
+        '''
+        now = time.monotonic() if now is None else now
+        key = (task_id, alert_type)
+
+        with self.lock:
+            condition = self.conditions.setdefault(key, {"firing": False, "occurrences": 0, "last_sent": None})
+            was_firing = condition["firing"]
+            condition["firing"] = value > (threshold * (1 - self.hysteresis) if was_firing else threshold)
+
+            if not condition["firing"]:
+                if was_firing:
+                    log(f"Alert {alert_type.name} of task {task_id} cleared.")
+                return None
+
+            condition["occurrences"] += 1
+            if condition["last_sent"] is not None and now - condition["last_sent"] < self.cooldown:
+                self.suppressed += 1
+                return None
+
+            occurrences = condition["occurrences"]
+            condition["occurrences"] = 0
+            condition["last_sent"] = now
+            self.sent += 1
+
+        if was_firing:
+            return f"{details} (still firing, {occurrences} occurrence{'s' if occurrences > 1 else ''} since the last alert)"
+        if occurrences > 1:
+            return f"{details} ({occurrences} occurrences since the last alert)"
+        return details
@@ -0,0 +1,89 @@
+import threading
+
+from lib.logging import log
+from lib.packets import MetricsBatchPacket
+
+class MetricsBatcher:
+    '''
+    Collects the metrics produced by the agent's tasks and sends them to the server in batches.
+
+    The first sample of a batch starts a short batching window; every sample produced before it
+    ends goes out in the same MetricsBatchPacket. A full batch is sent right away.
+
+    Attributes:
+        udp_server (UDPServer or AsyncUDPServer): The transport used to send the batches.
+        server_address (tuple): The server's address.
+        window (float): How long samples wait for others before being sent, in seconds.
+        max_samples (int): Maximum number of samples per batch.
+    '''
+    def __init__(self, udp_server, server_address, window=0.5, max_samples=32):
+        '''
+        Initializes a MetricsBatcher.
+
+        Args:
+            udp_server (UDPServer or AsyncUDPServer): The transport used to send the batches.
+            server_address (tuple): The server's address.
+            window (float, optional): How long samples wait for others before being sent, in seconds. Defaults to 0.5.
+            max_samples (int, optional): Maximum number of samples per batch, small enough for one datagram. Defaults to 32.
+        '''
+        self.udp_server = udp_server
+        self.server_address = server_address
+        self.window = window
+        self.max_samples = min(max_samples, MetricsBatchPacket.MAX_SAMPLES)
+        self.samples = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def add(self, sample):
+        '''
+        Adds a sample to the current batch.
+
+        Args:
+            sample (MetricsPacket): The metrics to send.
+        '''
+        with self.lock:
+            self.samples.append(sample)
+            if len(self.samples) >= self.max_samples:
+                samples = self.take()
+            else:
+                samples = None
+                if self.timer is None:
+                    self.timer = threading.Timer(self.window, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+
+        if samples:
+            self.send(samples)
+
+    def flush(self):
+        '''
+        Sends the current batch, if it has any sample.
+        '''
+        with self.lock:
+            samples = self.take()
+
+        if samples:
+            self.send(samples)
+
+    def take(self):
+        '''
+        Empties the current batch and cancels its batching window. Must be called with the lock held.
+
+        Returns:
+            list: The samples of the batch.
+        '''
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        samples, self.samples = self.samples, []
+        return samples
+
+    def send(self, samples):
+        '''
+        Sends a batch of samples to the server.
+
+        Args:
+            samples (list[MetricsPacket]): The samples to send.
+        '''
+        log(f"Sending batch of {len(samples)} metrics samples.")
+        self.udp_server.send_message(MetricsBatchPacket(samples), self.server_address)
@@ -0,0 +1,146 @@
+import argparse
+import socket
+import threading
+import time
+
+from bench.fleet import percentile
+from lib.tcp import AlertMessage, AlertType, TCPServer, frame
+
+
+def measure(alerts, details_size, write_size, timeout=60):
+    '''
+    Sends `alerts` alerts over a single connection to a TCPServer, and measures how fast they
+    are handled.
+
+    The alerts are framed beforehand and written in `write_size` pieces, so frames arrive both
+    coalesced and split across reads.
+
+    Args:
+        alerts (int): Number of alerts sent.
+        details_size (int): Size of the details of every alert, in bytes.
+        write_size (int): Bytes written at once by the client.
+        timeout (float, optional): How long to wait for the server to handle them, in seconds. Defaults to 60.
+
+    Returns:
+        tuple: (alerts handled per second, number of alerts handled).
+    '''
+    handled = 0
+    done = threading.Event()
+
+    def handler(alert_message, address):
+        # A single connection is handled by a single worker
+        nonlocal handled
+        handled += 1
+        if handled == alerts:
+            done.set()
+
+    server = TCPServer("127.0.0.1", 0, handler)
+    threading.Thread(target=server.start, daemon=True).start()
+
+    alert = AlertMessage("task-1", "n1", AlertType.HIGH_CPU_USAGE, "x" * details_size, int(time.time()))
+    data = frame(alert.serialize()) * alerts
+
+    client = socket.create_connection(server.socket.getsockname(), timeout=5)
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    started = time.monotonic()
+    with memoryview(data) as view:
+        for offset in range(0, len(data), write_size):
+            client.sendall(view[offset:offset + write_size])
+    done.wait(timeout)
+    elapsed = time.monotonic() - started
+
+    client.close()
+    server.stop()
+    return handled / elapsed, handled
+
+def measure_burst(agents, backlog, rounds, connect_timeout=10, timeout=60):
+    '''
+    Connects `agents` agents to a TCPServer all at once, as when a fleet-wide event makes every
+    agent alert, then has each agent the server accepted send one alert at once, `rounds` times.
+
+    Args:
+        agents (int): Number of agents, each with its own connection.
+        backlog (int): Backlog of the server's listening socket.
+        rounds (int): Number of alert bursts.
+        connect_timeout (float, optional): How long to wait for the connections, in seconds. Defaults to 10.
+        timeout (float, optional): How long to wait for every burst, in seconds. Defaults to 60.
+
+    Returns:
+        tuple: (number of agents accepted in time, seconds until every connection was accepted or
+        the wait given up, alerts handled per second during the bursts, sorted send to handler latencies).
+    '''
+    latencies = []
+
+    def handler(alert_message, address):
+        # The details carry the time the alert was sent
+        latencies.append(time.monotonic() - float(alert_message.details))
+
+    server = TCPServer("127.0.0.1", 0, handler, backlog=backlog)
+    threading.Thread(target=server.start, daemon=True).start()
+    address = server.socket.getsockname()
+
+    clients = []
+    started = time.monotonic()
+    for _ in range(agents):
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.setblocking(False)
+        client.connect_ex(address)
+        clients.append(client)
+    # Connections the backlog had no room for are only accepted once the kernel retries them
+    while server.accepted < agents and time.monotonic() - started < connect_timeout:
+        time.sleep(0.001)
+    connect_time = time.monotonic() - started
+
+    # Leave out the agents still waiting for room in the backlog
+    accepted = {key.data["address"] for key in list(server.selector.get_map().values()) if key.data}
+    for client in clients:
+        if client.getsockname() not in accepted:
+            client.close()
+    clients = [client for client in clients if client.fileno() != -1]
+
+    busy = 0.0
+    for round_number in range(1, rounds + 1):
+        started = time.monotonic()
+        for client in clients:
+            alert = AlertMessage("task-1", "n1", AlertType.HIGH_CPU_USAGE, repr(time.monotonic()), int(time.time()))
+            client.send(frame(alert.serialize()))
+        while len(latencies) < len(clients) * round_number and time.monotonic() - started < timeout:
+            time.sleep(0.001)
+        busy += time.monotonic() - started
+
+    for client in clients:
+        client.close()
+    server.stop()
+    return len(clients), connect_time, len(latencies) / busy, sorted(latencies)
+
+def main(argv):
+    '''
+    Prints the rate at which the TCP server handles alerts sent back to back over one connection,
+    then the time it takes to accept a burst of agents and the latency of their alerts.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="alerts", description="Alerts handled per second over a single connection, and accept rate and alert latency of many agents.")
+    parser.add_argument("--alerts", type=int, default=50000, help="alerts sent per run over a single connection")
+    parser.add_argument("--details", type=int, nargs="+", default=[32, 1024, 16384], help="sizes of the alert details, in bytes")
+    parser.add_argument("--write-size", type=int, nargs="+", default=[65536, 1000], help="bytes written at once by the client")
+    parser.add_argument("--agents", type=int, default=1000, help="agents connecting and alerting at once")
+    parser.add_argument("--backlog", type=int, nargs="+", default=[5, 1024], help="backlogs of the listening socket")
+    parser.add_argument("--rounds", type=int, default=5, help="alert bursts per agent")
+    args = parser.parse_args(argv)
+
+    print(f"{args.alerts} alerts per run over one connection")
+    print(f"{'details':>8} {'write':>7} {'alerts/s':>10} {'MB/s':>8} {'handled':>8}")
+    for details_size in args.details:
+        frame_size = len(frame(AlertMessage("task-1", "n1", AlertType.HIGH_CPU_USAGE, "x" * details_size, 0).serialize()))
+        for write_size in args.write_size:
+            rate, handled = measure(args.alerts, details_size, write_size)
+            print(f"{details_size:>8} {write_size:>7} {rate:>10.0f} {rate * frame_size / 1e6:>8.1f} {handled:>8}")
+
+    print()
+    print(f"{args.agents} agents connecting at once, then {args.rounds} bursts of one alert per agent")
+    print(f"{'backlog':>8} {'accepted':>9} {'connect s':>10} {'alerts/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'handled':>8}")
+    for backlog in args.backlog:
+        accepted, connect_time, rate, latencies = measure_burst(args.agents, backlog, args.rounds)
+        print(f"{backlog:>8} {accepted:>9} {connect_time:>10.3f} {rate:>10.0f} {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} {len(latencies):>8}")
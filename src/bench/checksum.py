@@ -0,0 +1,91 @@
+import argparse
+import hashlib
+import time
+
+from bench.codec import measure, packets
+from lib import checksum
+from lib.checksum import ChecksumAlgorithm, set_checksum_algorithm
+
+
+def legacy_checksum(data):
+    # Packet.calculate_checksum of the previous format
+    return hashlib.sha256(data).hexdigest()
+
+def legacy_validate(data, checksum):
+    # Packet.validate_checksum of the previous format
+    return checksum == legacy_checksum(data)
+
+def legacy_rate(data, duration):
+    '''
+    Measures the checksum work of the previous format, a 64-byte hex SHA-256, the way the packets
+    did it: the sender appends the encoded hex digest, the receiver decodes it and compares it
+    with the hex digest of the rest of the packet.
+
+    Args:
+        data (bytes): The packet, without checksum.
+        duration (float): How long to measure, in seconds.
+
+    Returns:
+        float: Packets checksummed and verified per second.
+    '''
+    done = 0
+    started = time.perf_counter()
+    while True:
+        for _ in range(1000):
+            packet = data + legacy_checksum(data).encode('utf-8')
+            end = len(packet) - 64
+            if not legacy_validate(packet[:end], packet[end:].decode('utf-8')):
+                raise ValueError("Invalid checksum")
+        done += 1000
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            return done / elapsed
+
+def checksum_rate(data, duration):
+    '''
+    Measures the checksum work of the current format: the sender appends the integrity field and
+    the receiver validates it.
+
+    Args:
+        data (bytes): The packet, without checksum.
+        duration (float): How long to measure, in seconds.
+
+    Returns:
+        float: Packets checksummed and verified per second.
+    '''
+    done = 0
+    started = time.perf_counter()
+    while True:
+        for _ in range(1000):
+            checksum.split_checksum(checksum.append_checksum(data), "packet")
+        done += 1000
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            return done / elapsed
+
+def main(argv):
+    '''
+    Prints the size of the checksummed packets and the CPU spent on their checksums, for the
+    previous format (hex SHA-256, decodes not measured since it is gone) and every checksum algorithm.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="checksum", description="Packet size and checksum cost per algorithm.")
+    parser.add_argument("--duration", type=float, default=0.5, help="time spent on every measurement, in seconds")
+    args = parser.parse_args(argv)
+
+    print(f"{'packet':>18} {'checksum':>11} {'bytes':>6} {'sign+verify/s':>14} {'us':>6} {'decodes/s':>10}")
+    for name in ("Metrics", "MetricsBatch (32)", "Task"):
+        for algorithm in [None] + list(ChecksumAlgorithm):
+            set_checksum_algorithm(algorithm or ChecksumAlgorithm.CRC32)
+            data = packets()[name]
+            # The packet without its integrity field (digest and algorithm byte)
+            body = data[:len(data) - 1 - checksum.digest_size(checksum.algorithm)]
+            if algorithm is None:
+                rate = legacy_rate(body, args.duration)
+                print(f"{name:>18} {'hex sha256':>11} {len(body) + 64:>6} {rate:>14.0f} {1e6 / rate:>6.2f} {'-':>10}")
+            else:
+                rate = checksum_rate(body, args.duration)
+                print(f"{name:>18} {algorithm.name.lower():>11} {len(data):>6} {rate:>14.0f} {1e6 / rate:>6.2f} {measure(data, args.duration):>10.0f}")
+    set_checksum_algorithm(ChecksumAlgorithm.CRC32)
@@ -0,0 +1,121 @@
+import argparse
+import multiprocessing
+import socket
+import threading
+import time
+
+from lib.logging import set_log_level
+from lib.packets import MetricsPacket
+from lib.udp import UDPServer
+
+
+def run_worker(index, port, progress, ready, stop):
+    '''
+    Entry point of a benchmark ingest worker: a UDPServer sharing `port` with the other workers,
+    whose handler only counts packets.
+
+    Args:
+        index (int): Index of the worker.
+        port (int): Port shared by every worker.
+        progress (multiprocessing.Array): Per worker (packets handled, monotonic time of the last one).
+        ready (multiprocessing.Semaphore): Released once the worker is bound.
+        stop (multiprocessing.Event): Set when the run is over.
+    '''
+    set_log_level("ERROR")
+
+    def handler(packet, address, server):
+        progress[2 * index] += 1
+        progress[2 * index + 1] = time.monotonic()
+
+    server = UDPServer("127.0.0.1", port, handler, worker_queue_size=100000, reuse_port=True)
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    threading.Thread(target=server.start, daemon=True).start()
+    ready.release()
+    stop.wait()
+    server.stop()
+
+def measure(workers, agents, messages, timeout=30):
+    '''
+    Sends `messages` metrics packets, spread over `agents` simulated agents, to `workers` ingest
+    processes sharing a port through SO_REUSEPORT, and measures how fast they are handled.
+
+    As in the `ingest` benchmark, agents are plain sockets that never retransmit, ACKs are left unread.
+
+    Args:
+        workers (int): Number of ingest worker processes.
+        agents (int): Number of simulated agents.
+        messages (int): Total number of messages sent.
+        timeout (float, optional): How long to wait for the workers to drain, in seconds. Defaults to 30.
+
+    Returns:
+        tuple: (messages handled per second, number of messages handled, list of messages handled by each worker).
+    '''
+    context = multiprocessing.get_context("spawn")
+    progress = context.Array("d", 2 * workers, lock=False)
+    ready = context.Semaphore(0)
+    stop = context.Event()
+
+    # Reserve a free port for the workers to share
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    processes = [context.Process(target=run_worker, args=(index, port, progress, ready, stop), daemon=True) for index in range(workers)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    sockets = []
+    for _ in range(agents):
+        agent_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        agent_socket.bind(("127.0.0.1", 0))
+        sockets.append(agent_socket)
+
+    rounds = []
+    for sequence_number in range(1, messages // agents + 1):
+        packet = MetricsPacket("task-1", "n1", 10.0, 1.0, 0.0, 1.0, int(time.time()))
+        packet.sequence_number = sequence_number
+        packet.ack_number = sequence_number
+        rounds.append(packet.serialize())
+
+    started = time.monotonic()
+    for data in rounds:
+        for agent_socket in sockets:
+            agent_socket.sendto(data, ("127.0.0.1", port))
+    # Stop once every message was handled, or the workers went quiet
+    while time.monotonic() - started < timeout:
+        time.sleep(0.5)
+        handled = sum(progress[0::2])
+        last_handled = max(progress[1::2])
+        if handled >= messages or (last_handled and time.monotonic() - last_handled > 0.5):
+            break
+
+    per_worker = [int(count) for count in progress[0::2]]
+    elapsed = (max(progress[1::2]) or time.monotonic()) - started
+
+    stop.set()
+    for process in processes:
+        process.join(timeout=5)
+    for agent_socket in sockets:
+        agent_socket.close()
+    return sum(per_worker) / elapsed, sum(per_worker), per_worker
+
+def main(argv):
+    '''
+    Prints the ingest rate of several SO_REUSEPORT ingest worker processes.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="cluster", description="Ingest rate against the number of worker processes.")
+    parser.add_argument("--messages", type=int, default=40000, help="messages sent per run, spread over the agents")
+    parser.add_argument("--agents", type=int, default=200, help="number of simulated agents")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of worker processes")
+    args = parser.parse_args(argv)
+
+    print(f"{args.messages} messages per run, {args.agents} agents, {multiprocessing.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'msgs/s':>10} {'handled':>10}  per worker")
+    for workers in args.workers:
+        rate, handled, per_worker = measure(workers, args.agents, args.messages - args.messages % args.agents)
+        print(f"{workers:>8} {rate:>10.1f} {handled:>10}  {' '.join(str(count) for count in per_worker)}")
@@ -0,0 +1,98 @@
+import argparse
+import time
+
+from lib.compression import Compression
+from lib.packets import (
+    ACKPacket, AgentRegistrationStatus, FragmentPacket, MetricsBatchPacket, MetricsPacket, Packet,
+    RegisterAgentPacket, RegisterAgentPacketResponse, TaskPacket
+)
+from lib.task import Task
+
+# A task monitoring every metric, as in tasks.json
+TASK = {
+    "task_id": "task-1",
+    "frequency": 10,
+    "devices": [
+        {
+            "device_id": f"PC{index}",
+            "device_metrics": {"cpu_usage": True, "ram_usage": True, "interface_stats": ["eth0", "eth1"]},
+            "link_metrics": {
+                "bandwidth": {"tool": "iperf", "is_server": False, "server_address": "10.0.5.1", "duration": 2, "transport": "udp", "frequency": 2},
+                "jitter": {"tool": "iperf", "is_server": False, "server_address": "10.0.5.1", "duration": 2, "transport": "udp", "frequency": 2},
+                "packet_loss": {"tool": "iperf", "is_server": False, "server_address": "10.0.5.1", "duration": 2, "transport": "udp", "frequency": 2},
+                "latency": {"tool": "ping", "destination_address": "10.0.5.1", "packet_count": 5, "frequency": 2},
+                "alertflow_conditions": {"cpu_usage": 80, "ram_usage": 90, "interface_stats": 200, "packet_loss": 5, "jitter": 10}
+            }
+        }
+        for index in range(1, 4)
+    ]
+}
+
+def packet_objects():
+    '''
+    Builds one packet of every type.
+
+    Returns:
+        dict: Map packet name -> packet.
+    '''
+    sample = MetricsPacket("task-1", "PC1", 10.0, 1.0, 0.0, 1.0, int(time.time()))
+    return {
+        "RegisterAgent": RegisterAgentPacket("PC1", 1, 1),
+        "RegisterAgentResponse": RegisterAgentPacketResponse(AgentRegistrationStatus.Success, 1, 1),
+        "Task": TaskPacket([Task(TASK)], 1, 1),
+        "Task (compressed)": TaskPacket([Task(TASK)], 1, 1, Compression.ZLIB_DICTIONARY),
+        "Metrics": MetricsPacket("task-1", "PC1", 10.0, 1.0, 0.0, 1.0, int(time.time()), 1, 1),
+        "MetricsBatch (32)": MetricsBatchPacket([sample] * 32, 1, 1),
+        "ACK": ACKPacket(0, 1, 0b1011, 16),
+        "Fragment": FragmentPacket(1, 0, 2, bytes(1382))
+    }
+
+def packets():
+    '''
+    Builds one serialized packet of every type.
+
+    Returns:
+        dict: Map packet name -> serialized packet.
+    '''
+    return {name: packet.serialize() for name, packet in packet_objects().items()}
+
+def measure(data, duration, function=Packet.deserialize):
+    '''
+    Calls a function on the same data over and over for about `duration` seconds, decoding a packet unless told otherwise.
+
+    Args:
+        data (bytes or Packet): The serialized packet, or whatever `function` takes.
+        duration (float): How long to measure, in seconds.
+        function (callable, optional): What is measured, called with `data`. Defaults to Packet.deserialize.
+
+    Returns:
+        float: Calls per second.
+    '''
+    done = 0
+    batch = 1000
+    started = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            function(data)
+        done += batch
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            return done / elapsed
+
+def main(argv):
+    '''
+    Prints how many packets of every type are encoded and decoded per second.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="codec", description="Packet encodes and decodes per second, for every packet type.")
+    parser.add_argument("--duration", type=float, default=1, help="time spent on every measurement, in seconds")
+    args = parser.parse_args(argv)
+
+    print(f"{'packet':>22} {'bytes':>6} {'encodes/s':>12} {'us/encode':>10} {'decodes/s':>12} {'us/decode':>10}")
+    for name, packet in packet_objects().items():
+        data = packet.serialize()
+        encode_rate = measure(packet, args.duration, lambda packet: packet.serialize())
+        decode_rate = measure(data, args.duration)
+        print(f"{name:>22} {len(data):>6} {encode_rate:>12.0f} {1e6 / encode_rate:>10.2f} {decode_rate:>12.0f} {1e6 / decode_rate:>10.2f}")
@@ -0,0 +1,411 @@
+'''
+Synthetic agent fleet, to size the collector without real machines.
+
+Runs the real server (server.py) on loopback against thousands of virtual agents spread over
+one or a few simulator processes. Every virtual agent speaks the real protocol on its own
+AsyncUDPServer: it registers, receives its TaskPacket, then sends a MetricsPacket per task
+every `interval` seconds and, now and then, an AlertMessage on its persistent TCP connection.
+Measurements are stubbed with random values, so no iperf or ping runs. Datagrams are dropped
+in both directions with a configurable probability, which the transport recovers from.
+
+Reported:
+    - ingest throughput: metrics rows the server stored per second, read from its database.
+    - end-to-end latency: from a metrics packet being sent to it being acknowledged, including
+      retransmissions, p50 and p99.
+    - collector CPU and RSS: of the server process and its children (ingest workers), from /proc.
+'''
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from lib.compression import CAPABILITIES, Compression
+from lib.logging import set_log_level
+from lib.packets import AgentRegistrationStatus, MetricsPacket, PacketType, RegisterAgentPacket
+from lib.tcp import AlertMessage, AlertType, frame
+from lib.udp_async import AsyncUDPServer
+
+SERVER_ADDRESS = ("127.0.0.1", 8080)
+ALERT_ADDRESS = ("127.0.0.1", 9090)
+
+def agent_id(index):
+    '''
+    Returns the ID of a virtual agent, short enough for RegisterAgentPacket's 5 bytes.
+
+    Args:
+        index (int): Index of the agent in the fleet.
+
+    Returns:
+        str: "v" followed by the index in base 36, on 4 digits.
+    '''
+    digits = ""
+    for _ in range(4):
+        index, digit = divmod(index, 36)
+        digits = "0123456789abcdefghijklmnopqrstuvwxyz"[digit] + digits
+    return "v" + digits
+
+def write_tasks(path, agents, interval):
+    '''
+    Writes a tasks file with one task per virtual agent.
+
+    Args:
+        path (str): Where the tasks file is written.
+        agents (int): Number of virtual agents.
+        interval (float): Interval between the metrics of an agent, in seconds.
+    '''
+    tasks = [
+        {
+            "task_id": f"sim-{index}",
+            "frequency": max(1, round(interval)),
+            "devices": [{
+                "device_id": agent_id(index),
+                "device_metrics": {"cpu_usage": True, "ram_usage": True, "interface_stats": ["eth0"]},
+                "link_metrics": {
+                    "latency": {"tool": "ping", "destination_address": "127.0.0.1", "packet_count": 5, "frequency": 2},
+                    "alertflow_conditions": {"cpu_usage": 80, "ram_usage": 90, "interface_stats": 200, "packet_loss": 5, "jitter": 10}
+                }
+            }]
+        }
+        for index in range(agents)
+    ]
+    with open(path, "w") as tasks_file:
+        json.dump(tasks, tasks_file)
+
+class LossyTransport:
+    '''
+    Wraps an asyncio datagram transport and drops every sent datagram with probability `loss`.
+    '''
+    def __init__(self, transport, loss, random_generator):
+        self.transport = transport
+        self.loss = loss
+        self.random = random_generator
+
+    def sendto(self, data, address):
+        if self.random.random() >= self.loss:
+            self.transport.sendto(data, address)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+class VirtualAgent(AsyncUDPServer):
+    '''
+    A virtual agent: the asyncio transport of a real agent, whose links drop datagrams with
+    probability `loss` in both directions, and which records what happens to its packets.
+    '''
+    def __init__(self, index, loss, stats, random_generator):
+        '''
+        Initializes a virtual agent.
+
+        Args:
+            index (int): Index of the agent in the fleet.
+            loss (float): Probability of dropping each datagram, in either direction.
+            stats (dict): Counters and latencies shared by the agents of the process.
+            random_generator (random.Random): Source of losses and stubbed measurements.
+        '''
+        super().__init__("127.0.0.1", 0, self.handle, session_idle_timeout=None)
+        self.agent_id = agent_id(index)
+        self.loss = loss
+        self.stats = stats
+        self.random = random_generator
+        self.registered = asyncio.Event()
+        self.tasks = None
+        self.tasks_received = asyncio.Event()
+        self.alert_writer = None  # Persistent alert connection, opened on the first alert
+        self.alert_lock = asyncio.Lock()
+        self.compression = Compression.NONE
+
+    def connection_made(self, transport):
+        super().connection_made(LossyTransport(transport, self.loss, self.random))
+
+    def datagram_received(self, data, client_address):
+        if self.random.random() >= self.loss:
+            super().datagram_received(data, client_address)
+
+    def handle(self, message, client_address, server):
+        if message.packet_type == PacketType.RegisterAgentResponse:
+            if message.agent_registration_status == AgentRegistrationStatus.Success:
+                self.compression = message.compression
+            self.registered.set()
+        elif message.packet_type == PacketType.Task:
+            self.tasks = [task for task in message.tasks if any(device.device_id == self.agent_id for device in task.devices)]
+            self.tasks_received.set()
+
+    async def register(self, timeout):
+        '''
+        Registers with the server, again whenever the transport gives up on the registration.
+
+        Args:
+            timeout (float): How long to keep trying, in seconds.
+
+        Returns:
+            bool: True once the server answered, False if it didn't in time.
+        '''
+        deadline = self.loop.time() + timeout
+        while not self.registered.is_set() and self.loop.time() < deadline:
+            await self.send_message(RegisterAgentPacket(self.agent_id, None, None, CAPABILITIES), SERVER_ADDRESS)
+            try:
+                await asyncio.wait_for(self.registered.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+        return self.registered.is_set()
+
+    async def run_task(self, task, interval, alert_probability, until):
+        '''
+        Sends stubbed metrics for a task every `interval` seconds, with a random phase, and
+        sometimes an alert, until the loop time `until`.
+
+        Args:
+            task (Task): The task to run.
+            interval (float): Interval between two metrics packets, in seconds.
+            alert_probability (float): Probability of an alert after each metrics packet.
+            until (float): Loop time at which the task stops.
+        '''
+        await asyncio.sleep(self.random.uniform(0, interval))
+        while self.loop.time() < until:
+            started = self.loop.time()
+            packet = MetricsPacket(
+                task.id, self.agent_id, self.random.gauss(100, 10), self.random.gauss(1, 0.2),
+                self.random.uniform(0, 2), self.random.gauss(5, 1), int(time.time())
+            )
+            self.stats["sent"] += 1
+            self.send_message(packet, SERVER_ADDRESS).add_done_callback(lambda future, started=started: self.delivered(future, started))
+
+            if self.random.random() < alert_probability:
+                asyncio.ensure_future(self.send_alert(task))
+
+            await asyncio.sleep(max(0, started + interval - self.loop.time()))
+
+    def delivered(self, future, started):
+        if future.result():
+            self.stats["acknowledged"] += 1
+            self.stats["latencies"].append(self.loop.time() - started)
+        else:
+            self.stats["failed"] += 1
+
+    async def send_alert(self, task):
+        '''
+        Sends a stubbed CPU alert to the server, framed on the agent's persistent TCP connection.
+
+        Args:
+            task (Task): The task that raised the alert.
+        '''
+        alert = AlertMessage(
+            task.id, self.agent_id, AlertType.HIGH_CPU_USAGE,
+            f"CPU usage is above the threshold: {round(self.random.uniform(80, 100), 2)}%",
+            int(time.time()), self.compression
+        )
+        async with self.alert_lock:
+            try:
+                if self.alert_writer is None:
+                    _, self.alert_writer = await asyncio.open_connection(*ALERT_ADDRESS)
+                self.alert_writer.write(frame(alert.serialize()))
+                await self.alert_writer.drain()
+                self.stats["alerts"] += 1
+            except OSError:
+                self.alert_writer = None
+                self.stats["alerts_failed"] += 1
+
+    def stop(self):
+        if self.alert_writer:
+            self.alert_writer.close()
+        super().stop()
+
+async def run_fleet(indexes, args, started, results):
+    '''
+    Runs a slice of the fleet on the current event loop: registers every agent, waits for their
+    tasks, runs them for `args.duration` seconds after the start barrier, and reports.
+
+    Args:
+        indexes (range): Indexes of the agents of this process.
+        args (argparse.Namespace): Options of the benchmark.
+        started (multiprocessing.Barrier): Passed by every process once its agents got their tasks.
+        results (multiprocessing.Queue): Where the statistics of the process are sent.
+    '''
+    stats = {"sent": 0, "acknowledged": 0, "failed": 0, "latencies": [], "alerts": 0, "alerts_failed": 0}
+    random_generator = random.Random(indexes.start)
+    agents = [VirtualAgent(index, args.loss, stats, random_generator) for index in indexes]
+    for agent in agents:
+        await agent.start()
+
+    registered = await asyncio.gather(*(agent.register(args.timeout) for agent in agents))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + args.timeout
+    for agent in agents:
+        try:
+            await asyncio.wait_for(agent.tasks_received.wait(), max(0.01, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+    with_tasks = [agent for agent in agents if agent.tasks]
+
+    await loop.run_in_executor(None, started.wait)
+    until = loop.time() + args.duration
+    await asyncio.gather(*(
+        agent.run_task(task, args.interval, args.alert_probability, until)
+        for agent in with_tasks for task in agent.tasks
+    ))
+    # Give the last packets time to be acknowledged
+    await asyncio.sleep(2)
+
+    results.put({
+        **stats,
+        "registered": sum(registered),
+        "with_tasks": len(with_tasks),
+        "compression": agents[0].compression.name if agents else None
+    })
+    for agent in agents:
+        agent.stop()
+
+def run_simulator(indexes, args, started, results):
+    '''
+    Entry point of a simulator process.
+    '''
+    set_log_level("ERROR")
+    asyncio.run(run_fleet(indexes, args, started, results))
+
+def collector_usage(pid):
+    '''
+    Returns the CPU time and resident memory of a process and its children.
+
+    Args:
+        pid (int): The process ID.
+
+    Returns:
+        tuple: (CPU time in seconds, RSS in MiB), summed over the process and its children.
+    '''
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    if int(stat.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+
+    cpu = 0
+    rss = 0
+    for process_id in pids:
+        try:
+            with open(f"/proc/{process_id}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{process_id}/statm") as statm:
+                rss += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return cpu, rss / 2 ** 20
+
+def stored_rows(db_path):
+    '''
+    Returns the number of metrics rows stored by the server.
+
+    Args:
+        db_path (str): The server's database.
+
+    Returns:
+        int: The number of rows of the `packets` table, 0 if it doesn't exist yet.
+    '''
+    try:
+        with sqlite3.connect(db_path, timeout=5) as connection:
+            return connection.execute("SELECT COUNT(*) FROM packets").fetchone()[0]
+    except sqlite3.Error:
+        return 0
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main(argv):
+    '''
+    Runs the server against a fleet of virtual agents and prints its ingest rate, the latency of
+    the metrics and the CPU and memory of the collector.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="fleet", description="Collector capacity against a fleet of virtual agents.")
+    parser.add_argument("--agents", type=int, default=1000, help="number of virtual agents")
+    parser.add_argument("--processes", type=int, default=1, help="number of simulator processes")
+    parser.add_argument("--interval", type=float, default=1.0, help="interval between the metrics of an agent, in seconds")
+    parser.add_argument("--alert-probability", type=float, default=0.01, help="probability of an alert after each metrics packet")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of dropping each datagram, in either direction")
+    parser.add_argument("--duration", type=float, default=10, help="how long the agents send metrics, in seconds")
+    parser.add_argument("--timeout", type=float, default=30, help="how long registration and task distribution may take, in seconds")
+    parser.add_argument("--server-args", default="", help="extra arguments of server.py, e.g. \"--workers 2\" or \"--asyncio\"")
+    # argparse never takes a value starting with "-", so "--server-args --asyncio" becomes "--server-args=--asyncio"
+    argv = list(argv)
+    if "--server-args" in argv[:-1]:
+        index = argv.index("--server-args")
+        argv[index:index + 2] = [f"--server-args={argv[index + 1]}"]
+    args = parser.parse_args(argv)
+
+    if args.agents > 36 ** 4:
+        parser.error(f"at most {36 ** 4} agents")
+
+    with tempfile.TemporaryDirectory() as directory:
+        tasks_path = os.path.join(directory, "tasks.json")
+        db_path = os.path.join(directory, "metrics.db")
+        write_tasks(tasks_path, args.agents, args.interval)
+
+        server_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "server.py")
+        server = subprocess.Popen(
+            [sys.executable, server_script, tasks_path, db_path] + args.server_args.split(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+        # Let the server bind its sockets
+        time.sleep(1)
+
+        context = multiprocessing.get_context("spawn")
+        started = context.Barrier(args.processes + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(target=run_simulator, args=(range(index, args.agents, args.processes), args, started, results), daemon=True)
+            for index in range(args.processes)
+        ]
+
+        setup_started = time.monotonic()
+        for process in processes:
+            process.start()
+
+        try:
+            started.wait(timeout=args.timeout * 2 + 30)
+            setup = time.monotonic() - setup_started
+            cpu_before, _ = collector_usage(server.pid)
+            rows_before = stored_rows(db_path)
+            measure_started = time.monotonic()
+
+            peak_rss = 0
+            while time.monotonic() - measure_started < args.duration:
+                time.sleep(0.5)
+                peak_rss = max(peak_rss, collector_usage(server.pid)[1])
+
+            elapsed = time.monotonic() - measure_started
+            cpu_after, _ = collector_usage(server.pid)
+            rows_after = stored_rows(db_path)
+
+            reports = [results.get(timeout=args.duration + 60) for _ in processes]
+        finally:
+            os.killpg(server.pid, signal.SIGINT)
+            server.wait(timeout=10)
+            for process in processes:
+                process.join(timeout=5)
+
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    sent = sum(report["sent"] for report in reports)
+
+    print(f"{args.agents} agents on {args.processes} simulator process(es), one packet per {args.interval} s, loss {args.loss}")
+    print(f"registered {sum(report['registered'] for report in reports)}, got tasks {sum(report['with_tasks'] for report in reports)}, in {setup:.1f} s, compression {reports[0]['compression']}")
+    print(f"metrics sent {sent} ({sent / args.duration:.0f}/s), acknowledged {sum(report['acknowledged'] for report in reports)}, given up {sum(report['failed'] for report in reports)}")
+    print(f"alerts sent {sum(report['alerts'] for report in reports)}, failed {sum(report['alerts_failed'] for report in reports)}")
+    print(f"ingest {(rows_after - rows_before) / elapsed:.0f} rows/s stored")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms (send to ACK)")
+    print(f"collector cpu {(cpu_after - cpu_before) / elapsed * 100:.0f}% of a core, peak rss {peak_rss:.1f} MiB")
@@ -0,0 +1,73 @@
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import wait
+
+from lib.packets import MetricsPacket
+from lib.udp import UDPServer
+
+
+def measure(service_time, window_size, messages, interval=0.1):
+    '''
+    Sends `messages` metrics packets to a receiver whose handler takes `service_time` per
+    packet, and samples how many packets it handles in every interval.
+
+    Args:
+        service_time (float): Time the receiver's handler spends on each packet, in seconds.
+        window_size (int): Send window of the sender.
+        messages (int): Number of messages to send.
+        interval (float, optional): Length of a sampling interval, in seconds. Defaults to 0.1.
+
+    Returns:
+        tuple: (list of packets handled per second in each interval, number of retransmissions).
+    '''
+    handled = []
+
+    def handler(packet, address, server):
+        time.sleep(service_time)
+        handled.append(time.monotonic())
+
+    server = UDPServer("127.0.0.1", 0, handler, window_size=window_size, flow_control=window_size)
+    client = UDPServer("127.0.0.1", 0, lambda packet, address, srv: None, window_size=window_size, max_retries=50)
+    threading.Thread(target=server.start, daemon=True).start()
+    threading.Thread(target=client.start, daemon=True).start()
+
+    started = time.monotonic()
+    futures = [
+        client.send_message_nowait(MetricsPacket("task-1", "n1", 10.0, 1.0, 0.0, 1.0, int(time.time())), server.socket.getsockname())
+        for _ in range(messages)
+    ]
+    wait(futures)
+    retransmissions = sum(estimate["backoffs"] for estimate in client.rtt_estimates().values())
+
+    client.stop()
+    server.stop()
+
+    rates = [0] * (int((handled[-1] - started) / interval) + 1)
+    for handled_at in handled:
+        rates[int((handled_at - started) / interval)] += 1 / interval
+    return rates, retransmissions
+
+def main(argv):
+    '''
+    Prints how steadily the transport feeds a slow handler.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="flow", description="Delivery rate over time to a slow handler.")
+    parser.add_argument("--messages", type=int, default=1000, help="messages sent per run")
+    parser.add_argument("--service-times", type=float, nargs="+", default=[0.001, 0.005], help="handler time per packet, in seconds")
+    parser.add_argument("--windows", type=int, nargs="+", default=[16, 64], help="send window sizes")
+    args = parser.parse_args(argv)
+
+    print(f"{args.messages} messages per run, rates sampled every 100 ms")
+    print(f"{'service (ms)':>12} {'window':>8} {'mean/s':>8} {'stdev/s':>8} {'min/s':>8} {'max/s':>8} {'timeouts':>9}")
+    for service_time in args.service_times:
+        for window_size in args.windows:
+            rates, retransmissions = measure(service_time, window_size, args.messages)
+            # The last interval is only partly used
+            rates = rates[:-1] or rates
+            print(f"{service_time * 1000:>12.1f} {window_size:>8} {statistics.mean(rates):>8.1f} {statistics.pstdev(rates):>8.1f} "
+                  f"{min(rates):>8.1f} {max(rates):>8.1f} {retransmissions:>9}")
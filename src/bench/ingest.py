@@ -0,0 +1,90 @@
+import argparse
+import socket
+import threading
+import time
+
+from lib.packets import MetricsPacket
+from lib.udp import UDPServer
+
+
+def measure(agents, messages, workers=4, timeout=10):
+    '''
+    Sends `messages` metrics packets to a server, spread over `agents` simulated agents, and
+    measures how fast the server hands them to its handler.
+
+    Every simulated agent is a plain socket with its own address, so the server keeps one
+    session per agent. Agents send their packets in sequence and never retransmit, ACKs are
+    left unread.
+
+    Args:
+        agents (int): Number of simulated agents.
+        messages (int): Total number of messages sent.
+        workers (int, optional): Number of worker threads of the server. Defaults to 4.
+        timeout (float, optional): How long to wait for the server to drain, in seconds. Defaults to 10.
+
+    Returns:
+        tuple: (messages handled per second, number of messages handled). Datagrams dropped
+        by a full socket buffer are not retransmitted, so fewer messages than sent may be handled.
+    '''
+    handled = []
+    last_handled = [None]
+    done = threading.Event()
+
+    def handler(packet, address, server):
+        handled.append(packet.sequence_number)
+        last_handled[0] = time.monotonic()
+        if len(handled) >= messages:
+            done.set()
+
+    server = UDPServer("127.0.0.1", 0, handler, workers=workers, worker_queue_size=messages)
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    address = server.socket.getsockname()
+    threading.Thread(target=server.start, daemon=True).start()
+
+    sockets = []
+    for _ in range(agents):
+        agent_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        agent_socket.bind(("127.0.0.1", 0))
+        sockets.append(agent_socket)
+
+    # Packets are built up front so only the server's work is measured
+    rounds = []
+    for sequence_number in range(1, messages // agents + 1):
+        packet = MetricsPacket("task-1", "n1", 10.0, 1.0, 0.0, 1.0, int(time.time()))
+        packet.sequence_number = sequence_number
+        packet.ack_number = sequence_number
+        rounds.append(packet.serialize())
+
+    started = time.monotonic()
+    for data in rounds:
+        for agent_socket in sockets:
+            agent_socket.sendto(data, address)
+    # Datagrams dropped by the kernel never arrive, so stop once the server goes quiet
+    while not done.wait(0.5) and time.monotonic() - started < timeout:
+        if last_handled[0] and time.monotonic() - last_handled[0] > 0.5:
+            break
+    elapsed = (last_handled[0] or time.monotonic()) - started
+
+    server.stop()
+    for agent_socket in sockets:
+        agent_socket.close()
+    return len(handled) / elapsed, len(handled)
+
+def main(argv):
+    '''
+    Prints the ingest rate of the UDP server for several fleet sizes.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="ingest", description="Ingest rate against the number of agents.")
+    parser.add_argument("--messages", type=int, default=20000, help="messages sent per run, spread over the agents")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10, 100, 1000, 5000], help="numbers of simulated agents")
+    parser.add_argument("--workers", type=int, default=4, help="worker threads of the server")
+    args = parser.parse_args(argv)
+
+    print(f"{args.messages} messages per run, {args.workers} workers")
+    print(f"{'agents':>8} {'msgs/s':>10} {'handled':>10}")
+    for agents in args.agents:
+        rate, handled = measure(agents, args.messages - args.messages % agents, args.workers)
+        print(f"{agents:>8} {rate:>10.1f} {handled:>10}")
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import random
+import socket
+import threading
+import time
+
+
+class LossyLink:
+    '''
+    A UDP proxy that emulates a slow, lossy link between one client and a server.
+
+    The client sends to the proxy's address instead of the server's. Every datagram, in
+    either direction, is dropped with probability `loss` or delivered after half of `rtt`.
+    '''
+    def __init__(self, target_address, rtt=0.0, loss=0.0, host="127.0.0.1", seed=None):
+        '''
+        Initializes the lossy link.
+
+        Args:
+            target_address (tuple): The address of the server behind the proxy.
+            rtt (float, optional): Round-trip time added by the link, in seconds. Defaults to 0.
+            loss (float, optional): Probability of dropping each datagram. Defaults to 0.
+            host (str, optional): Address to bind the proxy to. Defaults to "127.0.0.1".
+            seed (int, optional): Seed for the loss generator, to make runs repeatable.
+        '''
+        self.target_address = target_address
+        self.rtt = rtt
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, 0))
+        self.address = self.socket.getsockname()
+        self.client_address = None
+        self.scheduled = []  # Heap of (due_time, counter, data, destination)
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.is_running = False
+        self.forwarded = 0
+        self.dropped = 0
+
+    def start(self):
+        '''
+        Starts forwarding datagrams in background threads.
+        '''
+        self.is_running = True
+        threading.Thread(target=self.receive_loop, daemon=True).start()
+        threading.Thread(target=self.deliver_loop, daemon=True).start()
+
+    def stop(self):
+        '''
+        Stops the proxy and releases its socket.
+        '''
+        self.is_running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.socket.close()
+
+    def receive_loop(self):
+        while self.is_running:
+            try:
+                data, address = self.socket.recvfrom(65535)
+            except OSError:
+                return
+
+            if address == self.target_address:
+                destination = self.client_address
+            else:
+                self.client_address = address
+                destination = self.target_address
+
+            if destination is None or self.random.random() < self.loss:
+                self.dropped += 1
+                continue
+
+            with self.condition:
+                heapq.heappush(self.scheduled, (time.monotonic() + self.rtt / 2, next(self.counter), data, destination))
+                self.condition.notify()
+
+    def deliver_loop(self):
+        while self.is_running:
+            with self.condition:
+                while self.is_running and not self.scheduled:
+                    self.condition.wait()
+                if not self.is_running:
+                    return
+
+                due, _, data, destination = self.scheduled[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                heapq.heappop(self.scheduled)
+
+            try:
+                self.socket.sendto(data, destination)
+                self.forwarded += 1
+            except OSError:
+                return
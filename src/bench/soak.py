@@ -0,0 +1,81 @@
+import argparse
+import os
+import random
+import resource
+import socket
+import threading
+import time
+
+from lib.packets import MetricsPacket
+from lib.udp import UDPServer
+from lib.window import SEQUENCE_SPACE, seq_add
+
+
+def rss():
+    '''
+    Returns the resident memory of the process.
+
+    Returns:
+        float: The resident set size, in MiB. Where /proc is missing, the peak size is returned instead.
+    '''
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+def connect(address, packets):
+    '''
+    Simulates one agent connection: a fresh socket, so a new source port, sends a few metrics
+    packets from a random initial sequence number, like a restarted agent, and goes away.
+
+    Args:
+        address (tuple): The server's address.
+        packets (int): Number of packets sent.
+    '''
+    first_sequence = random.randrange(SEQUENCE_SPACE)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as agent_socket:
+        for offset in range(packets):
+            packet = MetricsPacket("task-1", "n1", 10.0, 1.0, 0.0, 1.0, int(time.time()))
+            packet.sequence_number = seq_add(first_sequence, offset)
+            packet.ack_number = packet.sequence_number
+            agent_socket.sendto(packet.serialize(), address)
+
+def main(argv):
+    '''
+    Prints the memory of a UDP server while agents keep reconnecting from new ports.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="soak", description="Server memory across agent reconnects.")
+    parser.add_argument("--reconnects", type=int, default=100000, help="number of agent connections")
+    parser.add_argument("--packets", type=int, default=3, help="packets sent per connection")
+    parser.add_argument("--max-sessions", type=int, default=1000, help="session cap of the server")
+    parser.add_argument("--idle-timeout", type=float, default=2, help="idle timeout of the server's sessions, in seconds")
+    parser.add_argument("--reports", type=int, default=10, help="number of reports printed")
+    args = parser.parse_args(argv)
+
+    handled = [0]
+
+    def handler(packet, address, server):
+        handled[0] += 1
+
+    server = UDPServer("127.0.0.1", 0, handler, session_idle_timeout=args.idle_timeout, max_sessions=args.max_sessions)
+    address = server.socket.getsockname()
+    threading.Thread(target=server.start, daemon=True).start()
+
+    print(f"{args.reconnects} reconnects, {args.packets} packets each, at most {args.max_sessions} sessions idle for {args.idle_timeout} s")
+    print(f"{'reconnects':>10} {'handled':>10} {'sessions':>9} {'idle ev.':>9} {'lru ev.':>9} {'sessions KiB':>13} {'RSS MiB':>8}")
+    step = max(1, args.reconnects // args.reports)
+    for reconnects in range(1, args.reconnects + 1):
+        connect(address, args.packets)
+        if reconnects % step == 0:
+            # Let the server catch up, so the report is not about packets still in its socket buffer
+            time.sleep(0.2)
+            stats = server.stats()
+            session_bytes = sum(session["bytes"] for session in server.session_memory().values())
+            print(f"{reconnects:>10} {handled[0]:>10} {stats['clients']:>9} {stats['sessions_evicted']['idle']:>9} "
+                  f"{stats['sessions_evicted']['lru']:>9} {session_bytes / 1024:>13.1f} {rss():>8.1f}")
+
+    server.stop()
@@ -0,0 +1,73 @@
+import argparse
+import threading
+import time
+from concurrent.futures import wait
+
+from bench.lossy_link import LossyLink
+from lib.packets import MetricsPacket
+from lib.udp import UDPServer
+
+
+def measure(window_size, rtt, loss, messages, min_rto=0.1):
+    '''
+    Sends `messages` metrics packets through a lossy link and measures the delivery rate.
+
+    Args:
+        window_size (int): Send window of the sender.
+        rtt (float): Round-trip time of the link, in seconds.
+        loss (float): Probability of dropping each datagram.
+        messages (int): Number of messages to send.
+        min_rto (float, optional): Lower bound of the adaptive retransmission timeout. Defaults to 0.1.
+
+    Returns:
+        tuple: (messages delivered per second, number of messages delivered to the handler,
+        number of ACK datagrams sent by the receiver).
+    '''
+    received = []
+    timeout = max(4 * rtt, 0.05)
+
+    server = UDPServer("127.0.0.1", 0, lambda packet, address, srv: received.append(packet.sequence_number),
+                       retransmission_timeout=timeout, max_retries=50, window_size=window_size, min_retransmission_timeout=min_rto)
+    client = UDPServer("127.0.0.1", 0, lambda packet, address, srv: None,
+                       retransmission_timeout=timeout, max_retries=50, window_size=window_size, min_retransmission_timeout=min_rto)
+    link = LossyLink(server.socket.getsockname(), rtt, loss, seed=1)
+
+    threading.Thread(target=server.start, daemon=True).start()
+    threading.Thread(target=client.start, daemon=True).start()
+    link.start()
+
+    # Messages that don't fit in the window are held by the sender until a slot frees up
+    started = time.monotonic()
+    futures = [
+        client.send_message_nowait(MetricsPacket("task-1", "n1", 10.0, 1.0, 0.0, 1.0, int(time.time())), link.address)
+        for _ in range(messages)
+    ]
+    wait(futures)
+    elapsed = time.monotonic() - started
+
+    link.stop()
+    client.stop()
+    server.stop()
+    return messages / elapsed, len(received), server.control_sent
+
+def main(argv):
+    '''
+    Prints the throughput of the reliable UDP transport for several RTTs and window sizes.
+
+    Args:
+        argv (list): Command-line arguments of the benchmark.
+    '''
+    parser = argparse.ArgumentParser(prog="window", description="Throughput against RTT on a lossy loopback link.")
+    parser.add_argument("--messages", type=int, default=200, help="messages sent per run")
+    parser.add_argument("--loss", type=float, default=0.02, help="probability of dropping each datagram")
+    parser.add_argument("--rtts", type=float, nargs="+", default=[0.005, 0.02, 0.05], help="round-trip times, in seconds")
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 4, 16, 64], help="send window sizes")
+    parser.add_argument("--min-rto", type=float, default=0.1, help="lower bound of the retransmission timeout, in seconds")
+    args = parser.parse_args(argv)
+
+    print(f"{args.messages} messages per run, {args.loss * 100:.1f}% loss each way")
+    print(f"{'RTT (ms)':>10} {'window':>8} {'msgs/s':>10} {'delivered':>10} {'acks':>8}")
+    for rtt in args.rtts:
+        for window_size in args.windows:
+            rate, delivered, acks = measure(window_size, rtt, args.loss, args.messages, args.min_rto)
+            print(f"{rtt * 1000:>10.1f} {window_size:>8} {rate:>10.1f} {delivered:>10} {acks:>8}")
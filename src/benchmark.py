@@ -0,0 +1,39 @@
+import sys
+
+from lib.logging import set_log_level
+from bench import alerts, checksum, cluster, codec, fleet, flow, ingest, soak, window
+
+benchmarks = {
+    "window": window.main,
+    "ingest": ingest.main,
+    "flow": flow.main,
+    "cluster": cluster.main,
+    "soak": soak.main,
+    "codec": codec.main,
+    "checksum": checksum.main,
+    "fleet": fleet.main,
+    "alerts": alerts.main
+}
+
+def main():
+    '''
+    Runs one of the transport benchmarks.
+
+    Command-line arguments:
+        <benchmark>: The name of the benchmark to run.
+        [args]: Benchmark specific options (see `<benchmark> --help`).
+
+    Returns:
+        None.
+    '''
+    if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+        print("Usage: python " + sys.argv[0] + " <benchmark> [args]")
+        print("Benchmarks: " + ", ".join(benchmarks))
+        sys.exit(1)
+
+    # Per packet logging would dominate the measurements
+    set_log_level("ERROR")
+    benchmarks[sys.argv[1]](sys.argv[2:])
+
+if __name__ == "__main__":
+    main()
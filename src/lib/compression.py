@@ -0,0 +1,141 @@
+'''
+Optional compression of large payloads: the tasks of a TaskPacket and the details of an AlertMessage.
+
+Peers negotiate it when the agent registers: the agent offers the methods it supports in its
+RegisterAgentPacket, and the server answers with the best method both support, which each side
+then uses for what it sends. Every compressed payload is preceded by the byte of its method, so
+a payload too small to gain anything is simply sent with method NONE.
+
+Payloads are raw deflate streams (no zlib header nor trailer, the packets have their own
+checksum). The ZLIB_DICTIONARY method primes the compressor with DICTIONARY, byte sequences
+frequent in serialized tasks and alerts, so even a single task compresses well.
+
+Functions:
+    - negotiate:
+        Picks the best method among the ones a peer offers.
+    - compress:
+        Compresses a payload with a method, unless it is too small to gain anything.
+    - decompress:
+        Restores a payload compressed with a method, with a cap on its decompressed size.
+'''
+import zlib
+from enum import Enum
+
+class Compression(Enum):
+    '''
+    Enumeration of the compression methods, by the value of their method byte.
+    '''
+    NONE = 0
+    ZLIB = 1
+    ZLIB_DICTIONARY = 2
+
+# Preset dictionary of the ZLIB_DICTIONARY method, built from typical tasks.json content: the
+# length-prefixed strings and integers of serialized tasks (tools, transports, interfaces,
+# server addresses, durations and frequencies) and the text of alert details. Deflate finds
+# matches closer to the end more cheaply, so the most frequent sequences come last.
+# Both peers must use the same bytes: never change it, add a method instead.
+DICTIONARY = b''.join((
+    b'is above the threshold: ',
+    b'CPU usage is above the threshold: ',
+    b'RAM usage is above the threshold: ',
+    b'Packet loss is above the threshold: ',
+    b'Jitter is above the threshold: ',
+    b'Interface stats are above the threshold: ',
+    b'\x00\x00\x00\x03tcp',
+    b'\x00\x00\x00\x04eth1\x00\x00\x00\x04eth2\x00\x00\x00\x02lo',
+    b'\x00\x00\x00\x04ping\x00\x00\x00\x00\x00\x00\x00\x00\x05\x00\x00\x00\x01',
+    b'\x00\x00\x00\x0810.0.0.1\x00\x00\x00\t10.0.0.10\x00\x00\x00\t10.0.1.10',
+    b'\x00\x00\x00\t10.0.3.10\x00\x00\x00\x0810.0.5.1\x00\x00\x00\t10.0.5.10',
+    b'\x00\x00\x00P\x00\x00\x00Z\x00\x00\x07\xd0\x00\x00\x00\x05\x00\x00\x00d',
+    b'\x00\x00\x00\x06task-1\x00\x00\x00\n\x00\x00\x00\x02\x00\x00\x00\x03PC1\x01\x01',
+    b'\x00\x00\x00\x01\x00\x00\x00\x04eth0\x01',
+    b'\x00\x00\x00\x05iperf\x00\x00\x00\x00\x0810.0.5.1\x00\x00\x00\x02\x00\x00\x00\x03udp\x00\x00\x00\x02\x01',
+    b'\x00\x00\x00\x05iperf\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x03udp\x00\x00\x00\x02\x01'
+))
+
+# Methods this process supports, most preferred first
+PREFERENCE = (Compression.ZLIB_DICTIONARY, Compression.ZLIB)
+
+# Capabilities byte of the registration: bit n set means method n is supported (NONE always is)
+CAPABILITIES = sum(1 << method.value for method in PREFERENCE)
+
+# Payloads smaller than this are sent uncompressed, deflate can't gain enough on them
+COMPRESSION_THRESHOLD = 128
+
+# Largest payload accepted once decompressed, so a tiny datagram can't expand without bound
+MAX_DECOMPRESSED_SIZE = 1024 * 1024
+
+def negotiate(capabilities):
+    '''
+    Picks the best compression method among the ones a peer offers.
+
+    Args:
+        capabilities (int): The peer's capabilities byte, 0 if it supports no compression.
+
+    Returns:
+        Compression: The preferred method supported by both peers, NONE if there is none.
+    '''
+    for method in PREFERENCE:
+        if capabilities >> method.value & 1:
+            return method
+    return Compression.NONE
+
+def compress(data, method):
+    '''
+    Compresses a payload, unless it is too small to gain anything.
+
+    Args:
+        data (bytes): The payload.
+        method (Compression): The negotiated method.
+
+    Returns:
+        tuple: (method, payload), the method actually used (NONE if the payload is left as is)
+        and the payload to send.
+    '''
+    if method == Compression.NONE or len(data) < COMPRESSION_THRESHOLD:
+        return Compression.NONE, data
+
+    if method == Compression.ZLIB_DICTIONARY:
+        compressor = zlib.compressobj(wbits=-15, zdict=DICTIONARY)
+    else:
+        compressor = zlib.compressobj(wbits=-15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    if len(compressed) >= len(data):
+        return Compression.NONE, data
+    return method, compressed
+
+def decompress(data, method):
+    '''
+    Restores a payload compressed with a method.
+
+    Args:
+        data (bytes-like): The received payload.
+        method (int): The method byte sent along with the payload.
+
+    Returns:
+        bytes-like: The decompressed payload (the data itself for method NONE).
+
+    Raises:
+        ValueError: If the method is unknown, the data is corrupt or it expands beyond MAX_DECOMPRESSED_SIZE.
+    '''
+    if method == Compression.NONE.value:
+        return data
+
+    if method == Compression.ZLIB_DICTIONARY.value:
+        decompressor = zlib.decompressobj(wbits=-15, zdict=DICTIONARY)
+    elif method == Compression.ZLIB.value:
+        decompressor = zlib.decompressobj(wbits=-15)
+    else:
+        raise ValueError(f"Unknown compression method {method}")
+
+    try:
+        decompressed = decompressor.decompress(data, MAX_DECOMPRESSED_SIZE)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt compressed payload: {e}")
+
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Compressed payload larger than {MAX_DECOMPRESSED_SIZE} bytes")
+    if not decompressor.eof:
+        raise ValueError("Truncated compressed payload")
+    return decompressed
@@ -0,0 +1,170 @@
+'''
+Fragmentation and reassembly for the reliable UDP transport.
+
+Packets larger than a datagram are split into FragmentPackets before they are sent and put back
+together by the receiver before they are deserialized, so fragmentation is invisible to the
+sliding window: the whole packet keeps one sequence number, is acknowledged once it is complete
+and, if a fragment is lost, every fragment is sent again when the packet is retransmitted.
+
+Functions:
+    - fragment:
+        Splits serialized packet data into datagrams that fit a maximum size.
+
+Classes:
+    - Reassembler:
+        Buffers received fragments until their packet is complete, with a timeout and a cap on
+        the memory used by incomplete packets.
+'''
+import threading
+import time
+
+from lib.packets import FragmentPacket, FRAGMENT_HEADER_SIZE
+
+MAX_FRAGMENTS = 2 ** 16 - 1
+
+def fragment(data, fragment_id, max_datagram_size):
+    '''
+    Splits serialized packet data into datagrams of at most `max_datagram_size` bytes.
+
+    Args:
+        data (bytes): The serialized packet.
+        fragment_id (int): Identifier shared by every fragment of the packet.
+        max_datagram_size (int): Maximum size of a datagram, in bytes.
+
+    Returns:
+        list: The datagrams to send. Data that already fits is returned as is, unfragmented.
+
+    Raises:
+        ValueError: If the datagram size leaves no room for a payload or the packet needs too many fragments.
+    '''
+    if len(data) <= max_datagram_size:
+        return [data]
+
+    payload_size = max_datagram_size - FRAGMENT_HEADER_SIZE
+    if payload_size <= 0:
+        raise ValueError(f"Datagram size must be larger than {FRAGMENT_HEADER_SIZE} bytes.")
+
+    count = -(-len(data) // payload_size)
+    if count > MAX_FRAGMENTS:
+        raise ValueError(f"Packet of {len(data)} bytes needs more than {MAX_FRAGMENTS} fragments.")
+
+    return [
+        FragmentPacket(fragment_id, index, count, data[index * payload_size:(index + 1) * payload_size]).serialize()
+        for index in range(count)
+    ]
+
+class Reassembler:
+    '''
+    Puts fragmented packets back together.
+
+    Incomplete packets are dropped once they are older than `timeout`, and the oldest ones are
+    evicted whenever the fragments held would take more than `max_bytes`, so a peer that never
+    completes its packets cannot exhaust memory. Expiry is checked on every new fragment, so no
+    timer is needed. Safe to use from several threads.
+    '''
+    def __init__(self, timeout=5, max_bytes=1024 * 1024):
+        '''
+        Initializes the reassembler.
+
+        Args:
+            timeout (float, optional): How long an incomplete packet is kept, in seconds. Defaults to 5.
+            max_bytes (int, optional): Maximum number of payload bytes held for incomplete packets. Defaults to 1 MiB.
+        '''
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.buffers = {}  # Map key -> {count, fragments, size, created}, oldest first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def add(self, key, fragment_packet):
+        '''
+        Adds a received fragment.
+
+        Args:
+            key (tuple): Identifies the packet, e.g. (client_address, fragment_id).
+            fragment_packet (FragmentPacket): The received fragment.
+
+        Returns:
+            bytes or None: The reassembled packet data if this fragment completed it, None otherwise.
+
+        Raises:
+            ValueError: If the fragment is inconsistent with the ones already received for the packet.
+        '''
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = {"count": fragment_packet.count, "fragments": {}, "size": 0, "created": now}
+                self.buffers[key] = buffer
+            elif buffer["count"] != fragment_packet.count:
+                self.discard(key)
+                raise ValueError(f"Fragment count changed from {buffer['count']} to {fragment_packet.count}.")
+
+            if fragment_packet.index in buffer["fragments"]:
+                # Retransmitted fragment
+                return None
+
+            buffer["fragments"][fragment_packet.index] = fragment_packet.payload
+            buffer["size"] += len(fragment_packet.payload)
+            self.size += len(fragment_packet.payload)
+
+            if len(buffer["fragments"]) == buffer["count"]:
+                self.discard(key)
+                self.completed += 1
+                return b''.join(buffer["fragments"][index] for index in range(buffer["count"]))
+
+            # Make room by evicting the oldest packets, possibly this one
+            while self.size > self.max_bytes:
+                self.discard(next(iter(self.buffers)))
+                self.evicted += 1
+            return None
+
+    def expire(self, now=None):
+        '''
+        Drops incomplete packets older than the timeout. Must be called with the lock held.
+
+        Args:
+            now (float, optional): Current monotonic time. Defaults to time.monotonic().
+        '''
+        if now is None:
+            now = time.monotonic()
+
+        # Buffers are kept in creation order, so only the expired ones are visited
+        while self.buffers:
+            key, buffer = next(iter(self.buffers.items()))
+            if now - buffer["created"] < self.timeout:
+                break
+            self.discard(key)
+            self.expired += 1
+
+    def discard(self, key):
+        '''
+        Drops the fragments of a packet. Must be called with the lock held.
+
+        Args:
+            key (tuple): Identifies the packet.
+        '''
+        buffer = self.buffers.pop(key)
+        self.size -= buffer["size"]
+
+    def stats(self):
+        '''
+        Returns counters describing the reassembly buffers.
+
+        Returns:
+            dict: Number of incomplete packets and bytes held, and the number of packets
+            completed, expired and evicted to respect the memory cap.
+        '''
+        with self.lock:
+            return {
+                "pending": len(self.buffers),
+                "bytes": self.size,
+                "completed": self.completed,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
@@ -1,5 +1,18 @@
 import datetime
 
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+minimum_level = 0
+
+def set_log_level(log_type):
+    '''
+    Sets the minimum type of log that is printed (e.g. "ERROR" hides "INFO" messages).
+
+    Args:
+        log_type (str): The minimum log type to print.
+    '''
+    global minimum_level
+    minimum_level = LOG_LEVELS.get(log_type.upper(), 0)
+
 def log(message, log_type="INFO"):
     '''
     Logs a message with a timestamp and type.
@@ -8,5 +21,7 @@ def log(message, log_type="INFO"):
         message (str): The log message.
         log_type (str): The type of log (e.g., "INFO", "ERROR", "DEBUG"). Defaults to "INFO".
     '''
+    if LOG_LEVELS.get(log_type.upper(), LOG_LEVELS["INFO"]) < minimum_level:
+        return
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{log_type.upper()}] {message}")
\ No newline at end of file
+    print(f"[{timestamp}] [{log_type.upper()}] {message}")
@@ -0,0 +1,41 @@
+'''
+Memory introspection helpers.
+
+Functions:
+    - deep_sizeof:
+        Estimates the memory held by an object and everything it contains.
+'''
+import sys
+from collections import deque
+
+def deep_sizeof(obj, skip=()):
+    '''
+    Estimates the number of bytes held by an object, following containers and the attributes of
+    the classes defined in `lib`. Objects shared between several parts of
+    the structure are only counted once.
+
+    Args:
+        obj (object): The object to measure.
+        skip (tuple, optional): Types that are not measured, e.g. handles that reference a whole server. Defaults to ().
+
+    Returns:
+        int: The estimated size, in bytes.
+    '''
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, skip):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif type(current).__module__.startswith("lib.") and hasattr(current, "__dict__"):
+            stack.append(vars(current))
+    return size
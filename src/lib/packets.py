@@ -1,10 +1,32 @@
 from enum import Enum
-import hashlib
 from queue import Full
+from lib.checksum import append_checksum, split_checksum
+from lib.compression import Compression, compress, decompress
 from lib.task_serializer import TaskSerializer
 from lib.task import Task
+from lib.window import seq_distance, seq_lt
 import struct
 
+PROTOCOL_VERSION = 3
+
+# Header structure (common to every packet):
+# | 1 byte  | 1 byte | 4 bytes         | 4 bytes    | (10 bytes)
+# | Version | Type   | Sequence number | ACK number |
+#
+# Sequence and ACK numbers are 32-bit, per peer, and wrap around (see lib.window).
+HEADER_SIZE = 10
+HEADER = struct.Struct('>BBII')
+
+# Fragments add the fragment ID (4 bytes), the fragment index (2 bytes) and the fragment count (2 bytes)
+FRAGMENT_HEADER_SIZE = HEADER_SIZE + 8
+
+# Sent in place of the metrics an agent didn't measure
+NAN = float('nan')
+
+# Packets are encoded and decoded through precompiled structs, one per fixed layout, and decoded
+# from memoryviews, so the fields of a datagram are read in place instead of slicing a copy of the
+# data for each of them.
+
 class PacketType(Enum):
     '''
     Enumeration for the different types of packets.
@@ -14,11 +36,12 @@ class PacketType(Enum):
     Task = 2
     Metrics = 3
     ACK = 4
-    FlowControl = 5
+    Fragment = 6
+    MetricsBatch = 7
 
 class Packet():
     '''
-    Base class for packets with utility methods for checksum calculation and validation.
+    Base class for packets with utility methods shared by every packet type.
     '''
     def __init__(self, sequence_number = None, ack_number = None):
         '''
@@ -31,65 +54,84 @@ class Packet():
         self.sequence_number = sequence_number
         self.ack_number = ack_number
 
-    def calculate_checksum(data):
+    @staticmethod
+    def serialize_header(packet):
         '''
-        Calculates the SHA-256 checksum for a given data.
+        Serializes the header shared by every packet.
 
         Args:
-            data (bytes): The data to calculate the checksum for.
+            packet: The packet whose header is serialized.
 
         Returns:
-            str: The calculated checksum.
+            bytes: The serialized header.
         '''
-        return hashlib.sha256(data).hexdigest()
-    
-    def validate_checksum(data, checksum):
+        return HEADER.pack(PROTOCOL_VERSION, packet.packet_type.value, packet.sequence_number or 0, packet.ack_number or 0)
+
+    @staticmethod
+    def deserialize_header(data):
+        '''
+        Deserializes the sequence and ACK numbers of a packet header.
+
+        Args:
+            data (bytes-like): Raw packet data.
+
+        Returns:
+            tuple: (sequence_number, ack_number).
+        '''
+        _, _, sequence_number, ack_number = HEADER.unpack_from(data)
+        return sequence_number, ack_number
+
+    @staticmethod
+    def peek_type(data):
         '''
-        Validates the checksum of the data against the provided checksum.
+        Returns the packet type of raw packet data without deserializing it.
 
         Args:
-            data (bytes): The data to validate.
-            checksum (str): The checksum to compare against.
+            data (bytes): Raw packet data.
 
         Returns:
-            bool: True if valid, False otherwise.
+            PacketType or None: The packet type, or None if the data isn't a valid packet header.
         '''
-        return checksum == Packet.calculate_checksum(data)
+        if len(data) < HEADER_SIZE or data[0] != PROTOCOL_VERSION:
+            return None
+        return PACKET_TYPES.get(data[1])
 
     @staticmethod
     def deserialize(data):
         '''
         Deserializes the raw packet data into the appropriate packet type.
 
+        The data is wrapped in a memoryview, so the packet classes read their fields without copying it.
+
         Args:
-            data (bytes): Raw packet data.
+            data (bytes-like): Raw packet data.
 
         Returns:
             Packet: An instance of the appropriate packet subclass.
+
+        Raises:
+            ValueError: If the packet is truncated, from another protocol version or of an unknown type.
         '''
-        packet_type_value = data[0]
-        packet_type = PacketType(packet_type_value)
-           
-        if packet_type == PacketType.RegisterAgent:
-            return RegisterAgentPacket.deserialize(data)
-        elif packet_type == PacketType.RegisterAgentResponse:
-            return RegisterAgentPacketResponse.deserialize(data)
-        elif packet_type == PacketType.Task:
-            return TaskPacket.deserialize(data)
-        elif packet_type == PacketType.Metrics:
-            return MetricsPacket.deserialize(data)
-        elif packet_type == PacketType.ACK:
-            return ACKPacket.deserialize(data)
-        elif packet_type == PacketType.FlowControl:
-            return FlowControlPacket.deserialize(data)
-        else:
+        if len(data) < HEADER_SIZE:
+            raise ValueError("Packet shorter than its header.")
+        data = memoryview(data)
+        if data[0] != PROTOCOL_VERSION:
+            raise ValueError(f"Unsupported protocol version {data[0]}.")
+
+        deserialize = DESERIALIZERS.get(data[1])
+        if deserialize is None:
             raise ValueError("Unknown packet type.")
 
+        try:
+            return deserialize(data)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Truncated {PACKET_TYPES[data[1]].name} packet: {e}")
+
 class RegisterAgentPacket():
     '''
     Packet used for registering an agent with the server.
     '''
-    def __init__(self, agent_id, sequence_number = None, ack_number = None):
+    def __init__(self, agent_id, sequence_number = None, ack_number = None, capabilities = 0):
         '''
         Initializes a RegisterAgent packet.
 
@@ -97,29 +139,29 @@ class RegisterAgentPacket():
             agent_id (str): The agent's unique identifier.
             sequence_number (int, optional): Sequence number of the packet. Defaults to None.
             ack_number (int, optional): Acknowledgment number of the packet. Defaults to None.
+            capabilities (int, optional): Compression methods the agent supports (see lib.compression). Defaults to none.
         '''
         self.sequence_number = sequence_number
         self.ack_number = ack_number
         self.packet_type = PacketType.RegisterAgent
         self.agent_id = agent_id
+        self.capabilities = capabilities
 
     # Packet structure :
-    # | 1 byte | 5 bytes           | (6 bytes)
-    # | Type   | Agent ID          |
+    # | 10 bytes | 5 bytes           | 1 byte       | (16 bytes)
+    # | Header   | Agent ID          | Capabilities |
+    LAYOUT = struct.Struct('>BBII5sB')
+    TYPE = PacketType.RegisterAgent.value
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += (self.sequence_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += self.agent_id.ljust(5).encode('utf-8')
-        return packet_bytes
+        return RegisterAgentPacket.LAYOUT.pack(
+            PROTOCOL_VERSION, RegisterAgentPacket.TYPE, self.sequence_number or 0, self.ack_number or 0,
+            self.agent_id.ljust(5).encode('utf-8'), self.capabilities
+        )
 
     def deserialize(data):
-        sequence_number = data[1]
-        ack_number = data[2]
-        agent_id = data[3:8].decode('utf-8').strip()
-        return RegisterAgentPacket(agent_id, sequence_number, ack_number)
+        _, _, sequence_number, ack_number, agent_id, capabilities = RegisterAgentPacket.LAYOUT.unpack_from(data)
+        return RegisterAgentPacket(agent_id.decode('utf-8').strip(), sequence_number, ack_number, capabilities)
 
 class AgentRegistrationStatus(Enum):
     '''
@@ -133,7 +175,7 @@ class RegisterAgentPacketResponse():
     '''
     Packet used for responding to agent registration requests.
     '''
-    def __init__(self, agent_registration_status, sequence_number=None, ack_number=None):
+    def __init__(self, agent_registration_status, sequence_number=None, ack_number=None, compression=Compression.NONE):
         '''
         Initializes a RegisterAgentPacketResponse.
 
@@ -141,35 +183,35 @@ class RegisterAgentPacketResponse():
             agent_registration_status (AgentRegistrationStatus): Registration status.
             sequence_number (int, optional): Sequence number of the packet. Defaults to None.
             ack_number (int, optional): Acknowledgment number of the packet. Defaults to None.
+            compression (Compression, optional): Compression method negotiated with the agent. Defaults to NONE.
         '''
         self.sequence_number = sequence_number
         self.ack_number = ack_number
         self.packet_type = PacketType.RegisterAgentResponse
         self.agent_registration_status = agent_registration_status
+        self.compression = compression
 
     # Packet structure :
-    # | 1 byte | 1 byte | (2 bytes)
-    # | Type   | Status |
+    # | 10 bytes | 1 byte | 1 byte      | (12 bytes)
+    # | Header   | Status | Compression |
+    LAYOUT = struct.Struct('>BBIIBB')
+    TYPE = PacketType.RegisterAgentResponse.value
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += (self.sequence_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += self.agent_registration_status.value.to_bytes(1, byteorder='big')
-        return packet_bytes
+        return RegisterAgentPacketResponse.LAYOUT.pack(
+            PROTOCOL_VERSION, RegisterAgentPacketResponse.TYPE, self.sequence_number or 0, self.ack_number or 0,
+            self.agent_registration_status.value, self.compression.value
+        )
 
     def deserialize(data):
-        sequence_number = data[1]
-        ack_number = data[2]
-        agent_registration_status = AgentRegistrationStatus(data[3])
-        return RegisterAgentPacketResponse(agent_registration_status, sequence_number, ack_number)
+        _, _, sequence_number, ack_number, status, compression = RegisterAgentPacketResponse.LAYOUT.unpack_from(data)
+        return RegisterAgentPacketResponse(AgentRegistrationStatus(status), sequence_number, ack_number, Compression(compression))
     
 class TaskPacket:
     '''
     Packet used for distributing tasks to agents.
     '''
-    def __init__(self, tasks, sequence_number, ack_number):
+    def __init__(self, tasks, sequence_number, ack_number, compression=Compression.NONE):
         '''
         Initializes a TaskPacket.
 
@@ -177,54 +219,55 @@ class TaskPacket:
             tasks (list[Task]): List of tasks to include in the packet.
             sequence_number (int): Sequence number of the packet.
             ack_number (int): Acknowledgment number of the packet.
+            compression (Compression, optional): Compression method negotiated with the agent. Defaults to NONE.
         '''
         self.sequence_number = sequence_number
         self.ack_number = ack_number
         self.packet_type = PacketType.Task
         self.tasks = tasks
+        self.compression = compression
 
     # Packet structure :
-    # | 1 byte | 1 byte | ? bytes | 
-    # | Type   | #Tasks | Task 1  | Task 2 | ... | Task N |
+    # | 10 bytes | 1 byte      | ? bytes                                       |
+    # | Header   | Compression | Body, compressed with the method of the byte  | Checksum (see lib.checksum) |
+    #
+    # Body structure :
+    # | 1 byte | ? bytes |
+    # | #Tasks | Task 1  | Task 2 | ... | Task N |
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += self.sequence_number.to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
+        # Number of tasks and every task, joined once
+        parts = [len(self.tasks).to_bytes(1, byteorder='big')]
+        parts.extend(TaskSerializer.serialize(task) for task in self.tasks)
+        compression, body = compress(b''.join(parts), self.compression)
 
-        # Serialize number of tasks
-        packet_bytes += len(self.tasks).to_bytes(1, byteorder='big')
-
-        # Serialize each task
-        for task in self.tasks:
-            packet_bytes += TaskSerializer.serialize(task)
-
-        checksum = Packet.calculate_checksum(packet_bytes)
-        packet_bytes += checksum.encode('utf-8')
-
-        return packet_bytes
+        return append_checksum(Packet.serialize_header(self) + compression.value.to_bytes(1, byteorder='big') + body)
     
     def deserialize(data):
-        sequence_number = data[1]
-        ack_number = data[2]
-        tasks = []
+        data = memoryview(data)
+        sequence_number, ack_number = Packet.deserialize_header(data)
+
+        # The checksum is validated first, so tasks are only decoded from intact data
+        end = split_checksum(data, "TaskPacket")
+        if end <= HEADER_SIZE + 1:
+            raise ValueError("Invalid length for TaskPacket")
+        compression = data[HEADER_SIZE]
+        data = memoryview(decompress(data[HEADER_SIZE + 1:end], compression))
 
         # Deserialize number of tasks
-        num_tasks = data[3]
+        num_tasks = data[0]
 
         # Deserialize each task
-        offset = 4
+        tasks = []
+        offset = 1
         for i in range(num_tasks):
             task, offset = TaskSerializer.deserialize(data, offset)
             tasks.append(task)
 
-        # Validate checksum
-        checksum = data[offset:].decode('utf-8')
-        if not Packet.validate_checksum(data[:offset], checksum):
-            raise ValueError("Invalid checksum for TaskPacket")
+        if offset != len(data):
+            raise ValueError("Invalid length for TaskPacket")
 
-        return TaskPacket(tasks, sequence_number, ack_number)
+        return TaskPacket(tasks, sequence_number, ack_number, Compression(compression))
     
     def __lt__(self, other):
         return self.sequence_number < other.sequence_number
@@ -249,46 +292,71 @@ class MetricsPacket:
         self.timestamp = timestamp
 
     # Packet structure:
-    # | 1 byte  | 10 bytes | 5 bytes | 4 bytes   | 4 bytes | 4 bytes | 4 bytes   | 4 bytes    | (36 bytes)
-    # | Type    | Task ID  | Dev ID  | Bandwidth | Jitter  | Loss    | Latency   | Timestamp  |
+    # | 10 bytes | 10 bytes | 5 bytes | 4 bytes   | 4 bytes | 4 bytes | 4 bytes   | 4 bytes    | 5 or 33 bytes |
+    # | Header   | Task ID  | Dev ID  | Bandwidth | Jitter  | Loss    | Latency   | Timestamp  | Checksum      |
+    #
+    # Everything between the header and the checksum is the sample, which MetricsBatchPacket reuses.
+    # Metrics are floats in the byte order of the host, the timestamp is big-endian: samples are
+    # encoded with one struct taking the timestamp as raw bytes, and decoded with one struct per
+    # byte order, which is cheaper than converting the raw timestamp.
+    SAMPLE = struct.Struct('=10s5s4f4s')
+    SAMPLE_SIZE = SAMPLE.size
+    SAMPLE_METRICS = struct.Struct('=10s5s4f')
+    SAMPLE_TIMESTAMP = struct.Struct('>I')
+    TYPE = PacketType.Metrics.value
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += (self.sequence_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += self.task_id.ljust(10).encode('utf-8')
-        packet_bytes += self.device_id.ljust(5).encode('utf-8')
+        return append_checksum(Packet.serialize_header(self) + self.serialize_sample())
 
-        packet_bytes += struct.pack('f', self.bandwidth if self.bandwidth is not None else float('nan'))
-        packet_bytes += struct.pack('f', self.jitter if self.jitter is not None else float('nan'))
-        packet_bytes += struct.pack('f', self.loss if self.loss is not None else float('nan'))
-        packet_bytes += struct.pack('f', self.latency if self.latency is not None else float('nan'))
-        packet_bytes += (self.timestamp or 0).to_bytes(4, byteorder='big')
-
-        checksum = Packet.calculate_checksum(packet_bytes)
-        packet_bytes += checksum.encode('utf-8')
+    def serialize_sample(self):
+        '''
+        Serializes the metrics of the packet, without header nor checksum.
 
-        return packet_bytes
+        Returns:
+            bytes: The serialized sample, SAMPLE_SIZE bytes long.
+        '''
+        # Missing metrics are sent as NaN
+        return MetricsPacket.SAMPLE.pack(
+            self.task_id.ljust(10).encode('utf-8'),
+            self.device_id.ljust(5).encode('utf-8'),
+            NAN if self.bandwidth is None else self.bandwidth,
+            NAN if self.jitter is None else self.jitter,
+            NAN if self.loss is None else self.loss,
+            NAN if self.latency is None else self.latency,
+            (self.timestamp or 0).to_bytes(4, byteorder='big')
+        )
 
     def deserialize(data):
-        packet_type = PacketType(data[0])
-        if packet_type != PacketType.Metrics:
+        if data[1] != MetricsPacket.TYPE:
             raise ValueError("Invalid packet type for MetricsPacket.")
-        
-        sequence_number = data[1]
-        ack_number = data[2]
 
-        # Deserialize Task ID and Device ID
-        task_id = data[3:13].decode('utf-8').strip()
-        device_id = data[13:18].decode('utf-8').strip()
+        data = memoryview(data)
+        sequence_number, ack_number = Packet.deserialize_header(data)
+        if split_checksum(data, "MetricsPacket") != HEADER_SIZE + MetricsPacket.SAMPLE_SIZE:
+            raise ValueError("Invalid length for MetricsPacket")
 
-        # Deserialize metrics as floats (convert NaN to None)
-        bandwidth = struct.unpack('f', data[18:22])[0]
-        jitter = struct.unpack('f', data[22:26])[0]
-        loss = struct.unpack('f', data[26:30])[0]
-        latency = struct.unpack('f', data[30:34])[0]
-        timestamp = int.from_bytes(data[34:38], byteorder='big')
+        packet = MetricsPacket.deserialize_sample(data, HEADER_SIZE)
+        packet.sequence_number = sequence_number
+        packet.ack_number = ack_number
+        return packet
+
+    @staticmethod
+    def deserialize_sample(data, offset=0):
+        '''
+        Deserializes the metrics of a sample.
+
+        Args:
+            data (bytes-like): Data holding the serialized sample, SAMPLE_SIZE bytes long.
+            offset (int, optional): Where the sample starts in the data. Defaults to 0.
+
+        Returns:
+            MetricsPacket: A packet with the sample's metrics and no sequence or ACK number.
+        '''
+        # Deserialize Task ID, Device ID and the metrics as floats (convert NaN to None)
+        task_id, device_id, bandwidth, jitter, loss, latency = MetricsPacket.SAMPLE_METRICS.unpack_from(data, offset)
+        timestamp, = MetricsPacket.SAMPLE_TIMESTAMP.unpack_from(data, offset + MetricsPacket.SAMPLE_METRICS.size)
+        task_id = task_id.decode('utf-8').strip()
+        device_id = device_id.decode('utf-8').strip()
 
         # Replace NaN values with None
         bandwidth = None if bandwidth != bandwidth else bandwidth  # Check for NaN
@@ -296,11 +364,7 @@ class MetricsPacket:
         loss = None if loss != loss else loss
         latency = None if latency != latency else latency
 
-        checksum = data[38:].decode('utf-8')
-        if not Packet.validate_checksum(data[:38], checksum):
-            raise ValueError("Invalid checksum for MetricsPacket")
-
-        return MetricsPacket(task_id, device_id, bandwidth, jitter, loss, latency, timestamp, sequence_number, ack_number)
+        return MetricsPacket(task_id, device_id, bandwidth, jitter, loss, latency, timestamp)
     
     def __lt__(self, other):
         return self.sequence_number < other.sequence_number
@@ -308,49 +372,179 @@ class MetricsPacket:
     def __eq__(self, other):
         return self.sequence_number == other.sequence_number
     
+class MetricsBatchPacket:
+    '''
+    Packet used for sending several metrics samples from an agent to the server at once.
+
+    Every sample has the same layout as the body of a MetricsPacket, and one checksum covers
+    the whole batch.
+    '''
+    MAX_SAMPLES = 255
+
+    def __init__(self, samples, sequence_number=None, ack_number=None):
+        '''
+        Initializes a MetricsBatchPacket.
+
+        Args:
+            samples (list[MetricsPacket]): The samples to send, at most MAX_SAMPLES.
+            sequence_number (int, optional): Sequence number of the packet. Defaults to None.
+            ack_number (int, optional): Acknowledgment number of the packet. Defaults to None.
+        '''
+        self.sequence_number = sequence_number
+        self.ack_number = ack_number
+        self.packet_type = PacketType.MetricsBatch
+        self.samples = samples
+
+    # Packet structure:
+    # | 10 bytes | 1 byte   | 35 bytes | ... | 35 bytes | 5 or 33 bytes |
+    # | Header   | #Samples | Sample 1 | ... | Sample N | Checksum      |
+
+    def serialize(self):
+        if len(self.samples) > MetricsBatchPacket.MAX_SAMPLES:
+            raise ValueError(f"A batch holds at most {MetricsBatchPacket.MAX_SAMPLES} samples.")
+
+        parts = [Packet.serialize_header(self), len(self.samples).to_bytes(1, byteorder='big')]
+        parts.extend(sample.serialize_sample() for sample in self.samples)
+
+        return append_checksum(b''.join(parts))
+
+    @staticmethod
+    def deserialize(data):
+        data = memoryview(data)
+        sequence_number, ack_number = Packet.deserialize_header(data)
+        count = data[HEADER_SIZE]
+        end = HEADER_SIZE + 1 + count * MetricsPacket.SAMPLE_SIZE
+
+        if split_checksum(data, "MetricsBatchPacket") != end:
+            raise ValueError("Invalid length for MetricsBatchPacket")
+
+        samples = [
+            MetricsPacket.deserialize_sample(data, offset)
+            for offset in range(HEADER_SIZE + 1, end, MetricsPacket.SAMPLE_SIZE)
+        ]
+        return MetricsBatchPacket(samples, sequence_number, ack_number)
+
 class ACKPacket():
     '''
     Packet used for acknowledgment of received packets.
+
+    ACKs are cumulative: the ACK number is the next sequence number the receiver expects, so
+    every packet before it was received. The selective ACK bitmap reports packets received
+    beyond that gap: bit i set means sequence number `ack_number + 1 + i` was received.
+
+    ACKs also carry the receiver's window (flow control credits): the sender may only send
+    sequence numbers before `ack_number + window`.
     '''
-    def __init__(self, sequence_number, ack_number):
+    SELECTIVE_ACK_BITS = 64
+
+    def __init__(self, sequence_number, ack_number, selective_acks=0, window=0):
         self.packet_type = PacketType.ACK
         self.sequence_number = sequence_number
         self.ack_number = ack_number
+        self.selective_acks = selective_acks
+        self.window = window
+
+    # Packet structure :
+    # | 10 bytes | 8 bytes            | 4 bytes | (22 bytes)
+    # | Header   | Selective ACK bits | Window  |
+    LAYOUT = struct.Struct('>BBIIQI')
+    TYPE = PacketType.ACK.value
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += (self.sequence_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
-        return packet_bytes
+        return ACKPacket.LAYOUT.pack(
+            PROTOCOL_VERSION, ACKPacket.TYPE, self.sequence_number or 0, self.ack_number or 0,
+            self.selective_acks, self.window
+        )
     
     @staticmethod
     def deserialize(data):
-        sequence_number = data[1]
-        ack_number = data[2]
-        return ACKPacket(sequence_number, ack_number)
+        _, _, sequence_number, ack_number, selective_acks, window = ACKPacket.LAYOUT.unpack_from(data)
+        return ACKPacket(sequence_number, ack_number, selective_acks, window)
+
+    def acknowledged(self, sequence_numbers):
+        '''
+        Filters the sequence numbers covered by this ACK.
+
+        Args:
+            sequence_numbers (iterable): Sequence numbers in flight.
+
+        Returns:
+            list: The sequence numbers that were received, either cumulatively or selectively.
+        '''
+        acknowledged = []
+        for sequence_number in sequence_numbers:
+            if seq_lt(sequence_number, self.ack_number):
+                acknowledged.append(sequence_number)
+                continue
+
+            distance = seq_distance(self.ack_number, sequence_number)
+            if 0 < distance <= ACKPacket.SELECTIVE_ACK_BITS and self.selective_acks >> (distance - 1) & 1:
+                acknowledged.append(sequence_number)
+        return acknowledged
     
-class FlowControlPacket():
+class FragmentPacket():
     '''
-    Packet used for managing flow control during communication.
+    Packet carrying one piece of a packet too large for a single datagram.
+
+    Fragments are not sequenced on their own (their header's sequence and ACK numbers are 0):
+    the reassembled packet carries its own header. Every fragment of a packet has the same
+    fragment ID, which is the packet's sequence number, so the fragments of a retransmission
+    complete the ones received from earlier attempts.
     '''
-    def __init__(self, sequence_number=None, ack_number=None, can_send=None):
+    def __init__(self, fragment_id, index, count, payload, sequence_number=None, ack_number=None):
+        '''
+        Initializes a FragmentPacket.
+
+        Args:
+            fragment_id (int): Identifier shared by every fragment of the packet.
+            index (int): Position of this fragment in the packet, starting at 0.
+            count (int): Total number of fragments of the packet.
+            payload (bytes-like): The piece of the serialized packet carried by this fragment.
+            sequence_number (int, optional): Sequence number of the packet. Defaults to None.
+            ack_number (int, optional): Acknowledgment number of the packet. Defaults to None.
+        '''
         self.sequence_number = sequence_number
         self.ack_number = ack_number
-        self.packet_type = PacketType.FlowControl
-        self.can_send = can_send  # True se pode enviar, False caso contrário
+        self.packet_type = PacketType.Fragment
+        self.fragment_id = fragment_id
+        self.index = index
+        self.count = count
+        self.payload = payload
+
+    # Packet structure :
+    # | 10 bytes | 4 bytes     | 2 bytes | 2 bytes | ? bytes | (18 bytes + payload)
+    # | Header   | Fragment ID | Index   | Count   | Payload |
+    LAYOUT = struct.Struct('>BBIIIHH')
+    TYPE = PacketType.Fragment.value
 
     def serialize(self):
-        packet_bytes = b''
-        packet_bytes += self.packet_type.value.to_bytes(1, byteorder='big')
-        packet_bytes += (self.sequence_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (self.ack_number or 0).to_bytes(1, byteorder='big')
-        packet_bytes += (1 if self.can_send else 0).to_bytes(1, byteorder='big')  # 1 byte para can_send
-        return packet_bytes
+        return FragmentPacket.LAYOUT.pack(
+            PROTOCOL_VERSION, FragmentPacket.TYPE, self.sequence_number or 0, self.ack_number or 0,
+            self.fragment_id, self.index, self.count
+        ) + self.payload
 
     @staticmethod
     def deserialize(data):
-        sequence_number = data[1]
-        ack_number = data[2]
-        can_send = True if data[3] == 1 else False
-        return FlowControlPacket(sequence_number, ack_number, can_send)
\ No newline at end of file
+        if len(data) < FRAGMENT_HEADER_SIZE:
+            raise ValueError("Fragment shorter than its header.")
+
+        _, _, sequence_number, ack_number, fragment_id, index, count = FragmentPacket.LAYOUT.unpack_from(data)
+        if index >= count:
+            raise ValueError(f"Fragment index {index} out of range for {count} fragments.")
+
+        # The payload is a view of the datagram, the reassembler copies it once when joining the fragments
+        return FragmentPacket(fragment_id, index, count, memoryview(data)[FRAGMENT_HEADER_SIZE:], sequence_number, ack_number)
+
+# Map packet type byte -> packet type and deserializer, so a datagram is dispatched with one
+# dictionary lookup instead of building an enum member and comparing it with every type.
+PACKET_TYPES = {packet_type.value: packet_type for packet_type in PacketType}
+
+DESERIALIZERS = {
+    PacketType.RegisterAgent.value: RegisterAgentPacket.deserialize,
+    PacketType.RegisterAgentResponse.value: RegisterAgentPacketResponse.deserialize,
+    PacketType.Task.value: TaskPacket.deserialize,
+    PacketType.Metrics.value: MetricsPacket.deserialize,
+    PacketType.ACK.value: ACKPacket.deserialize,
+    PacketType.Fragment.value: FragmentPacket.deserialize,
+    PacketType.MetricsBatch.value: MetricsBatchPacket.deserialize
+}
@@ -0,0 +1,69 @@
+class RTTEstimator:
+    '''
+    Estimates the round-trip time to a peer and derives its retransmission timeout (RTO).
+
+    Follows Jacobson/Karels (RFC 6298): a smoothed RTT and an RTT variance are updated from
+    every sample, the RTO is the smoothed RTT plus four times the variance, and the RTO doubles
+    on every timeout until a new sample arrives. Samples must only be taken from packets that
+    were not retransmitted (Karn's algorithm), since their ACK is ambiguous.
+    '''
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(self, initial_rto=2, min_rto=0.1, max_rto=60):
+        '''
+        Initializes the estimator.
+
+        Args:
+            initial_rto (float, optional): RTO used before the first sample, in seconds. Defaults to 2.
+            min_rto (float, optional): Lower bound of the RTO, in seconds. Defaults to 0.1.
+            max_rto (float, optional): Upper bound of the RTO, in seconds. Defaults to 60.
+        '''
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = min(max(initial_rto, min_rto), max_rto)
+        self.samples = 0
+        self.backoffs = 0
+
+    def sample(self, rtt):
+        '''
+        Updates the estimates with a new RTT measurement.
+
+        Args:
+            rtt (float): The measured round-trip time, in seconds.
+        '''
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTTEstimator.BETA) * self.rttvar + RTTEstimator.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTTEstimator.ALPHA) * self.srtt + RTTEstimator.ALPHA * rtt
+
+        self.rto = min(max(self.srtt + RTTEstimator.K * self.rttvar, self.min_rto), self.max_rto)
+        self.samples += 1
+
+    def backoff(self):
+        '''
+        Doubles the RTO after a retransmission timeout (exponential backoff).
+        '''
+        self.rto = min(self.rto * 2, self.max_rto)
+        self.backoffs += 1
+
+    def snapshot(self):
+        '''
+        Returns the current estimates, for monitoring.
+
+        Returns:
+            dict: Smoothed RTT, RTT variance and RTO (in seconds), and the number of samples
+            and backoffs so far.
+        '''
+        return {
+            "srtt": self.srtt,
+            "rttvar": self.rttvar,
+            "rto": self.rto,
+            "samples": self.samples,
+            "backoffs": self.backoffs
+        }
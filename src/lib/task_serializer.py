@@ -1,3 +1,5 @@
+import struct
+
 from lib.task import *
 
 '''
@@ -26,6 +28,45 @@ Classes:
         Handles serialization and deserialization of alert flow conditions, which define thresholds for triggering alerts.
 '''
 
+# Fields are read in place with precompiled structs; TaskSerializer.deserialize wraps the data in a
+# memoryview, so strings are decoded straight from the packet without copying a slice first.
+UINT32 = struct.Struct('>I')
+UINT32_PAIR = struct.Struct('>II')
+DEVICE_METRICS_HEADER = struct.Struct('>BBI')
+ALERTFLOW_CONDITIONS = struct.Struct('>5I')
+
+def read_uint32(data, index):
+    '''
+    Reads a big-endian 32-bit unsigned integer.
+
+    Args:
+        data (memoryview): The serialized data.
+        index (int): Where the integer starts.
+
+    Returns:
+        tuple: (value, index right after it).
+    '''
+    return UINT32.unpack_from(data, index)[0], index + 4
+
+def read_string(data, index):
+    '''
+    Reads a UTF-8 string prefixed with its length, as a 32-bit unsigned integer.
+
+    Args:
+        data (memoryview): The serialized data.
+        index (int): Where the length prefix starts.
+
+    Returns:
+        tuple: (string, index right after it).
+
+    Raises:
+        ValueError: If the string runs past the end of the data.
+    '''
+    length, index = read_uint32(data, index)
+    if length > len(data) - index:
+        raise ValueError("String longer than the remaining data")
+    return str(data[index:index + length], 'utf-8'), index + length
+
 class TaskSerializer:
     def serialize(task):
         task_bytes = b''
@@ -51,26 +92,21 @@ class TaskSerializer:
         return task_bytes
     
     def deserialize(data, index):
-        task_id_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        data = memoryview(data)
+        task_id_len, index = read_uint32(data, index)
 
         if task_id_len <= 0 or task_id_len > len(data) - index:
             raise ValueError("Invalid task ID length")
         
-        task_id = data[index:index+task_id_len].decode('utf-8')
+        task_id = str(data[index:index+task_id_len], 'utf-8')
         index += task_id_len
 
-        task_frequency = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        num_devices = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        task_frequency, num_devices = UINT32_PAIR.unpack_from(data, index)
+        index += UINT32_PAIR.size
+
         devices = []
         for _ in range(num_devices):
-            device_id_len = int.from_bytes(data[index:index+4], byteorder='big')
-            index += 4
-            device_id = data[index:index+device_id_len].decode('utf-8')
-            index += device_id_len
+            device_id, index = read_string(data, index)
 
             device_metrics, index = DeviceMetricsSerializer.deserialize(data, index)
             link_metrics, index = LinkMetricsSerializer.deserialize(data, index)
@@ -101,19 +137,14 @@ class DeviceMetricsSerializer:
         return device_metrics_bytes
     
     def deserialize(data, index):
-        cpu_usage = int.from_bytes(data[index:index+1], byteorder='big') == 1
-        index += 1
-        ram_usage = int.from_bytes(data[index:index+1], byteorder='big') == 1
-        index += 1
-        num_interfaces = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        cpu_usage, ram_usage, num_interfaces = DEVICE_METRICS_HEADER.unpack_from(data, index)
+        cpu_usage = cpu_usage == 1
+        ram_usage = ram_usage == 1
+        index += DEVICE_METRICS_HEADER.size
         interfaces = []
         for _ in range(num_interfaces):
-            interface_len = int.from_bytes(data[index:index+4], byteorder='big')
-            index += 4
-            interface_name = data[index:index+interface_len].decode('utf-8')
+            interface_name, index = read_string(data, index)
             interfaces.append(interface_name)
-            index += interface_len
 
         device_metrics = DeviceMetrics(cpu_usage,ram_usage,interfaces)
 
@@ -232,30 +263,18 @@ class BandwidthSerializer:
         return bandwidth_bytes
     
     def deserialize(data, index):
-        tool_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        tool = data[index:index+tool_len].decode('utf-8')
-        index += tool_len
+        tool, index = read_string(data, index)
 
-        is_server = int.from_bytes(data[index:index+1], byteorder='big') == 1
+        is_server = data[index] == 1
         index += 1
 
-        server_address_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        server_address = data[index:index+server_address_len].decode('utf-8')
-        index += server_address_len
+        server_address, index = read_string(data, index)
 
-        duration = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        duration, index = read_uint32(data, index)
 
-        transport_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        transport = data[index:index+transport_len].decode('utf-8')
-        index += transport_len
+        transport, index = read_string(data, index)
 
-        frequency = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        frequency, index = read_uint32(data, index)
         
         bandwidth = BandwidthMetric(
             tool = tool,
@@ -293,29 +312,18 @@ class JitterSerializer:
         return jitter_bytes
     
     def deserialize(data, index):
-        tool_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        tool = data[index:index+tool_len].decode('utf-8')
-        index += tool_len
+        tool, index = read_string(data, index)
 
-        is_server = int.from_bytes(data[index:index+1], byteorder='big') == 1
+        is_server = data[index] == 1
         index += 1
 
-        server_address_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        server_address = data[index:index+server_address_len].decode('utf-8')
-        index += server_address_len
+        server_address, index = read_string(data, index)
 
-        duration = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        duration, index = read_uint32(data, index)
 
-        transport_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        transport = data[index:index+transport_len].decode('utf-8')
-        index += transport_len
+        transport, index = read_string(data, index)
 
-        frequency = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        frequency, index = read_uint32(data, index)
         
         jitter = JitterMetric(
             tool = tool,
@@ -353,29 +361,18 @@ class PacketLossSerializer:
         return packet_loss_bytes
     
     def deserialize(data, index):
-        tool_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        tool = data[index:index+tool_len].decode('utf-8')
-        index += tool_len
+        tool, index = read_string(data, index)
 
-        is_server = int.from_bytes(data[index:index+1], byteorder='big') == 1
+        is_server = data[index] == 1
         index += 1
 
-        server_address_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        server_address = data[index:index+server_address_len].decode('utf-8')
-        index += server_address_len
+        server_address, index = read_string(data, index)
 
-        duration = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        duration, index = read_uint32(data, index)
 
-        transport_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        transport = data[index:index+transport_len].decode('utf-8')
-        index += transport_len
+        transport, index = read_string(data, index)
 
-        frequency = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        frequency, index = read_uint32(data, index)
         
         packet_loss = PacketLossMetric(
             tool = tool,
@@ -406,21 +403,12 @@ class LatencySerializer:
         return latency_bytes
     
     def deserialize(data, index):
-        tool_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        tool = data[index:index+tool_len].decode('utf-8')
-        index += tool_len
-        
-        destination_address_len = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        destination_address = data[index:index+destination_address_len].decode('utf-8')
-        index += destination_address_len
+        tool, index = read_string(data, index)
         
-        packet_count = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        destination_address, index = read_string(data, index)
         
-        frequency = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        packet_count, frequency = UINT32_PAIR.unpack_from(data, index)
+        index += UINT32_PAIR.size
         
         latency = LatencyMetric(
             tool = tool,
@@ -444,20 +432,8 @@ class AlertFlowConditionsSerializer:
         return alertflow_bytes
     
     def deserialize(data, index):
-        cpu_usage = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        ram_usage = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        interface_stats = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        packet_loss = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
-        
-        jitter = int.from_bytes(data[index:index+4], byteorder='big')
-        index += 4
+        cpu_usage, ram_usage, interface_stats, packet_loss, jitter = ALERTFLOW_CONDITIONS.unpack_from(data, index)
+        index += ALERTFLOW_CONDITIONS.size
         
         alertflow_conditions = AlertFlowConditions(
             cpu_usage = cpu_usage,
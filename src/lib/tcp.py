@@ -1,8 +1,32 @@
+import selectors
 import socket
+import struct
 import threading
+import time
+from collections import deque
 from enum import Enum
 
+from lib.compression import Compression, compress, decompress
 from lib.logging import log
+from lib.worker_pool import WorkerPool
+
+# Every alert travels in a frame: its length (4 bytes, big-endian), then the serialized AlertMessage
+FRAME_HEADER = struct.Struct('>I')
+
+# Largest frame a server accepts, as large as a decompressed payload may be (see lib.compression)
+MAX_FRAME_SIZE = 1024 * 1024
+
+def frame(data):
+    '''
+    Prefixes data with its length, so several frames can share a connection.
+
+    Args:
+        data (bytes): The serialized message.
+
+    Returns:
+        bytes: The frame.
+    '''
+    return FRAME_HEADER.pack(len(data)) + data
 
 class AlertType(Enum):
     '''
@@ -18,7 +42,7 @@ class AlertMessage:
     '''
     Represents an alert message exchanged between the agent and the server.
     '''
-    def __init__(self, task_id, device_id, alert_type, details, timestamp):
+    def __init__(self, task_id, device_id, alert_type, details, timestamp, compression=Compression.NONE):
         '''
         Initializes an AlertMessage object.
 
@@ -28,12 +52,14 @@ class AlertMessage:
             alert_type (AlertType): Type of alert being triggered.
             details (str): Additional details about the alert.
             timestamp (int): Timestamp of when the alert was generated.
+            compression (Compression, optional): Compression method of the details, negotiated with the server. Defaults to NONE.
         '''
         self.task_id = task_id
         self.device_id = device_id
         self.alert_type = alert_type
         self.details = details
         self.timestamp = timestamp
+        self.compression = compression
 
     def serialize(self):
         '''
@@ -60,8 +86,9 @@ class AlertMessage:
         # Timestamp
         message += int(self.timestamp).to_bytes(8, byteorder='big')
 
-        # Details
-        details_bytes = self.details.encode('utf-8')
+        # Details, compressed if they are large enough
+        compression, details_bytes = compress(self.details.encode('utf-8'), self.compression)
+        message += compression.value.to_bytes(1, byteorder='big')
         message += len(details_bytes).to_bytes(4, byteorder='big')
         message += details_bytes
 
@@ -78,7 +105,7 @@ class AlertMessage:
             AlertMessage: The deserialized AlertMessage object.
 
         Raises:
-            ValueError: If the alert type is invalid.
+            ValueError: If the alert type is invalid or the details can't be decompressed.
         '''
         index = 0
 
@@ -107,119 +134,461 @@ class AlertMessage:
         index += 8
 
         # Details
+        compression = int.from_bytes(data[index:index+1], byteorder='big')
+        index += 1
         details_len = int.from_bytes(data[index:index+4], byteorder='big')
         index += 4
-        details = data[index:index+details_len].decode('utf-8')
+        if index + details_len != len(data):
+            raise ValueError(f"Invalid details length {details_len} for an alert of {len(data)} bytes")
+        details = bytes(decompress(data[index:index+details_len], compression)).decode('utf-8')
 
-        return AlertMessage(task_id, device_id, alert_type, details, timestamp)
+        return AlertMessage(task_id, device_id, alert_type, details, timestamp, Compression(compression))
 
 class TCPClient:
     '''
     A TCP client for sending alert messages to the server.
+
+    Alerts travel as length-prefixed frames on one long-lived connection, so an alert storm costs
+    no handshake nor TIME_WAIT socket per alert. They are queued and written by a sender thread:
+    callers never wait for the network, and the alerts queued while a write is in progress are
+    pipelined into the next one. A dropped connection is reopened with exponential backoff, and
+    the alerts of a failed write are sent again on the new connection.
     '''
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, max_queue_size=1024, reconnect_delay=0.5, max_reconnect_delay=30):
         '''
         Initializes the TCP client with the server's address and port.
 
         Args:
             server_ip (str): The server's IP address.
             server_port (int): The server's port number.
+            max_queue_size (int, optional): Maximum number of alerts waiting to be sent, the oldest are dropped beyond it. Defaults to 1024.
+            reconnect_delay (float, optional): Delay before the first reconnection attempt, doubled after each failure. Defaults to 0.5 seconds.
+            max_reconnect_delay (float, optional): Upper bound of the reconnection delay. Defaults to 30 seconds.
         '''
         self.server_ip = server_ip
         self.server_port = server_port
+        self.max_queue_size = max_queue_size
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.socket = None
+        self.queue = deque()  # Frames waiting to be sent, oldest first
+        self.condition = threading.Condition()
+        self.sender = None
+        self.is_running = True
+        self.sent = 0
+        self.dropped = 0
+        self.reconnects = 0
 
     def send_alert(self, alert_message):
         '''
-        Sends an alert message to the server.
+        Queues an alert message for the server. Never blocks.
 
         Args:
             alert_message (AlertMessage): The alert message to send.
 
         Logs:
-            Sends a log message indicating the status of the transmission.
+            Sends a log message if the queue is full and the oldest alert is dropped.
         '''
-        try:
-            log(f"Sending alert to {self.server_ip}:{self.server_port}.")
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.server_ip, self.server_port))
-                s.sendall(alert_message.serialize())
-                log("Alert sent.")
-        except Exception as e:
-            log(f"Error sending alert: {e}.")
+        data = frame(alert_message.serialize())
+        with self.condition:
+            if len(self.queue) >= self.max_queue_size:
+                self.queue.popleft()
+                self.dropped += 1
+                log("Alert queue full, dropping the oldest alert.", "ERROR")
+            self.queue.append(data)
+
+            if self.sender is None:
+                self.sender = threading.Thread(target=self.run, daemon=True)
+                self.sender.start()
+            self.condition.notify()
+
+    def run(self):
+        '''
+        Sender loop: writes every queued alert in one go, reconnecting when the connection fails.
+        '''
+        delay = self.reconnect_delay
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or not self.is_running)
+                if not self.queue:
+                    return
+                frames = list(self.queue)
+                self.queue.clear()
+
+            try:
+                if self.socket is None:
+                    self.connect()
+                self.socket.sendall(b''.join(frames))
+                self.sent += len(frames)
+                delay = self.reconnect_delay
+                log(f"{len(frames)} alert(s) sent to {self.server_ip}:{self.server_port}.")
+            except OSError as e:
+                log(f"Error sending alert: {e}. Reconnecting in {delay} s.", "ERROR")
+                self.disconnect()
+                with self.condition:
+                    # Keep the alerts for the next connection, ahead of the newer ones
+                    self.queue.extendleft(reversed(frames))
+                    while len(self.queue) > self.max_queue_size:
+                        self.queue.popleft()
+                        self.dropped += 1
+                    if not self.is_running:
+                        return
+                    self.condition.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def connect(self):
+        '''
+        Opens the connection to the server.
+        '''
+        self.socket = socket.create_connection((self.server_ip, self.server_port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reconnects += 1
+        log(f"Alert connection to {self.server_ip}:{self.server_port} opened.")
+
+    def disconnect(self):
+        '''
+        Closes the connection to the server, if open.
+        '''
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+
+    def close(self, timeout=5):
+        '''
+        Sends the queued alerts, then closes the connection.
+
+        Args:
+            timeout (float, optional): How long to wait for the queued alerts to be sent. Defaults to 5 seconds.
+        '''
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+        if self.sender:
+            self.sender.join(timeout)
+        self.disconnect()
+
+class FrameReader:
+    '''
+    Splits the data received on a stream socket into length-prefixed frames.
+
+    Data is received straight into a reusable buffer, so one read may hold many frames
+    (coalesced writes) and one frame may span many reads (partial reads). Frames larger than
+    `max_frame_size` are rejected from their header, before their data is received.
+    '''
+    def __init__(self, sock, max_frame_size=MAX_FRAME_SIZE, chunk_size=65536):
+        '''
+        Initializes a frame reader.
+
+        Args:
+            sock (socket): The connected socket.
+            max_frame_size (int, optional): Largest accepted frame, in bytes. Defaults to MAX_FRAME_SIZE.
+            chunk_size (int, optional): Initial size of the buffer, the most received at once for small frames. Defaults to 64 KiB.
+        '''
+        self.socket = sock
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Start of the unread data in the buffer
+        self.end = 0  # End of the received data in the buffer
+
+    @property
+    def pending(self):
+        '''
+        Number of bytes received but not read yet, those of an incomplete frame once every complete one is read.
+        '''
+        return self.end - self.start
+
+    def receive(self):
+        '''
+        Receives the data available on the socket, as much as the buffer has room for.
+
+        Once full, the unread data is moved back to the start of the buffer, and the buffer only
+        grows when a single frame is larger than it.
+
+        Returns:
+            int: The number of bytes received, 0 if the peer closed the connection.
+
+        Raises:
+            BlockingIOError: If the socket is non-blocking and has no data.
+            OSError: If the connection failed.
+        '''
+        if self.end == len(self.buffer):
+            unread = self.end - self.start
+            self.buffer[:unread] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, unread
+            if unread == len(self.buffer):
+                # Full of one frame (next_frame checked its length), grow it to fit
+                length, = FRAME_HEADER.unpack_from(self.buffer)
+                # A bytearray can't be resized while it is viewed
+                self.view.release()
+                self.buffer.extend(bytes(FRAME_HEADER.size + length - unread))
+                self.view = memoryview(self.buffer)
+
+        received = self.socket.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def next_frame(self):
+        '''
+        Reads the next complete frame out of the received data.
+
+        Returns:
+            bytes or None: The payload of the frame, or None if it isn't complete yet.
+
+        Raises:
+            ValueError: If the frame is larger than `max_frame_size`.
+        '''
+        if self.end - self.start < FRAME_HEADER.size:
+            return None
+
+        length, = FRAME_HEADER.unpack_from(self.buffer, self.start)
+        if length > self.max_frame_size:
+            raise ValueError(f"Frame of {length} bytes larger than the {self.max_frame_size} bytes allowed.")
+        if self.end - self.start < FRAME_HEADER.size + length:
+            return None
+
+        start = self.start + FRAME_HEADER.size
+        self.start = start + length
+        if self.start == self.end:
+            self.start = self.end = 0
+        return bytes(self.view[start:start + length])
 
 class TCPServer:
     '''
-    A multithreaded TCP server for handling alert messages from agents.
+    An event-driven TCP server for handling alert messages from agents.
+
+    A single thread waits on the listening socket and every connection at once with a selector,
+    so a burst of agents connecting costs no thread each, and hands the received alerts to a
+    bounded worker pool. Alerts from the same connection always go to the same worker, so they
+    are handled in the order they were sent. While that worker's queue is full, the server stops
+    reading from the connection, so TCP slows the client down instead of alerts being dropped.
     '''
-    def __init__(self, host, port, alert_handler):
+    def __init__(self, host, port, alert_handler, max_frame_size=MAX_FRAME_SIZE, read_timeout=10, idle_timeout=None, backlog=1024, workers=4, worker_queue_size=1024):
         '''
-        Initializes the TCP server with a host, port, and an alert handler function.
+        Initializes the TCP server with a host, port, and an alert handler function, and binds it.
 
         Args:
             host (str): The host/IP address to bind the server to.
             port (int): The port to bind the server to.
             alert_handler (callable): Function to process incoming alerts.
+            max_frame_size (int, optional): Largest accepted alert frame, in bytes. Defaults to MAX_FRAME_SIZE.
+            read_timeout (float, optional): How long a client may stall in the middle of an alert. Defaults to 10 seconds.
+            idle_timeout (float, optional): How long a client may stay silent between alerts, None to wait forever. Defaults to None.
+            backlog (int, optional): Maximum number of connections waiting to be accepted (capped by the kernel's somaxconn). Defaults to 1024.
+            workers (int, optional): Number of worker threads running the alert handler. Defaults to 4.
+            worker_queue_size (int, optional): Maximum number of pending alerts per worker. Defaults to 1024.
         '''
         self.host = host
         self.port = port
         self.alert_handler = alert_handler
+        self.max_frame_size = max_frame_size
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.backlog = backlog
         self.is_running = False
+        self.pool = WorkerPool(workers, worker_queue_size, name="tcp-worker")
+        self.selector = selectors.DefaultSelector()
+        self.paused = {}  # Map client_socket -> client, of the connections waiting for room in their worker's queue
+        self.connections = 0
+        self.accepted = 0
+        self.alerts = 0  # Alerts received and handed to the pool (or dropped by it)
+        self.invalid = 0  # Frames that didn't hold a valid alert
+        self.timed_out = 0  # Connections closed for stalling or idling
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(self.backlog)
+        self.socket.setblocking(False)
 
     def start(self):
         '''
         Starts the TCP server to accept connections and handle incoming alerts.
 
-        Continuously listens for connections and spawns a new thread for each client.
+        Waits for connections and data on every socket at once, until the server is stopped.
+        Paused connections are resumed as soon as their worker has room, and connections that
+        stalled or idled for too long are closed about once per second.
         '''
         self.is_running = True
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.bind((self.host, self.port))
-        self.socket.listen(5)
+        self.pool.start()
+        self.selector.register(self.socket, selectors.EVENT_READ)
 
         log(f"TCP Server started on {self.host}:{self.port}.")
 
+        next_sweep = time.monotonic() + 1
+        while self.is_running:
+            try:
+                # Poll the workers' queues often while connections wait for room in them
+                for key, _ in self.selector.select(timeout=0.005 if self.paused else 1):
+                    if key.data is None:
+                        self.accept_clients()
+                    else:
+                        self.read_client(key.fileobj, key.data)
+
+                for client_socket, client in list(self.paused.items()):
+                    if self.pool.has_room(client["address"]):
+                        del self.paused[client_socket]
+                        self.selector.register(client_socket, selectors.EVENT_READ, client)
+                        self.deliver_alerts(client_socket, client)
+
+                now = time.monotonic()
+                if now >= next_sweep:
+                    self.expire_clients(now)
+                    next_sweep = now + 1
+            except Exception as e:
+                log(f"{e}", "ERROR")
+
+        # Release every socket from this thread, the selector isn't thread-safe
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        for client_socket in self.paused:
+            client_socket.close()
+        self.selector.close()
+
+    def accept_clients(self):
+        '''
+        Accepts every connection waiting in the backlog, and starts watching them for alerts.
+        '''
         while True:
             try:
                 client_socket, client_address = self.socket.accept()
-                threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, client_address),
-                    daemon=True
-                ).start()
-            except Exception as e:
-                log(f"Error accepting connection: {e}.")
+            except BlockingIOError:
+                return
+            except OSError as e:
+                log(f"Error accepting connection: {e}.", "ERROR")
+                return
+
+            client_socket.setblocking(False)
+            # Map client_socket -> {address, reader, last_active}
+            client = {"address": client_address, "reader": FrameReader(client_socket, self.max_frame_size), "last_active": time.monotonic()}
+            self.selector.register(client_socket, selectors.EVENT_READ, client)
+            self.connections += 1
+            self.accepted += 1
 
-    def handle_client(self, client_socket, client_address):
+    def read_client(self, client_socket, client):
         '''
-        Handles communication with a connected client.
+        Receives the data available from a client, and hands the complete alerts to the worker pool.
 
-        Receives an alert message from the client, deserializes it, and invokes the alert handler.
+        The connection is closed when the client closes it or fails.
 
         Args:
             client_socket (socket): The socket connected to the client.
-            client_address (tuple): The address of the connected client.
-
-        Logs:
-            Errors or issues with the connection or data processing.
+            client (dict): The state of the connection.
         '''
+        client_address = client["address"]
+        reader = client["reader"]
         try:
-            data = client_socket.recv(1024)
-            if not data:
-                log(f"Empty message from {client_address}.")
+            received = reader.receive()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            log(f"Error handling client {client_address}: {e}.", "ERROR")
+            self.close_client(client_socket)
+            return
+
+        if not received:
+            if reader.pending:
+                log(f"Client {client_address} closed the connection in the middle of a frame.", "ERROR")
+            self.close_client(client_socket)
+            return
+        client["last_active"] = time.monotonic()
+        self.deliver_alerts(client_socket, client)
+
+    def deliver_alerts(self, client_socket, client):
+        '''
+        Hands every complete alert received from a client to the worker pool.
+
+        Malformed alerts are skipped, since frames keep their boundaries, and the connection is
+        closed if the client sends an oversized frame. If the client's worker has no room left,
+        the connection is paused until it does.
+
+        Args:
+            client_socket (socket): The socket connected to the client.
+            client (dict): The state of the connection.
+        '''
+        client_address = client["address"]
+        reader = client["reader"]
+        while self.pool.has_room(client_address):
+            try:
+                data = reader.next_frame()
+            except ValueError as e:
+                log(f"Error handling client {client_address}: {e}.", "ERROR")
+                self.close_client(client_socket)
+                return
+            if data is None:
                 return
 
-            alert_message = AlertMessage.deserialize(data)
-            self.alert_handler(alert_message, client_address)
+            try:
+                alert_message = AlertMessage.deserialize(data)
+            except ValueError as e:
+                log(f"Invalid alert from {client_address}: {e}.", "ERROR")
+                self.invalid += 1
+                continue
 
-        except Exception as e:
-            log(f"Error handling client {client_address}: {e}.")
-        finally:
-            client_socket.close()
+            self.alerts += 1
+            self.pool.submit(client_address, self.alert_handler, alert_message, client_address)
+
+        self.selector.unregister(client_socket)
+        self.paused[client_socket] = client
+
+    def expire_clients(self, now):
+        '''
+        Closes the connections of clients that stalled in the middle of an alert for longer than
+        `read_timeout`, or stayed silent for longer than `idle_timeout`.
+
+        Args:
+            now (float): The current monotonic time.
+        '''
+        for key in list(self.selector.get_map().values()):
+            client = key.data
+            if client is None:
+                continue
+
+            silent = now - client["last_active"]
+            if client["reader"].pending and silent > self.read_timeout:
+                log(f"Client {client['address']} stalled in the middle of an alert, closing its connection.", "ERROR")
+            elif self.idle_timeout is not None and silent > self.idle_timeout:
+                log(f"Client {client['address']} idle for too long, closing its connection.")
+            else:
+                continue
+            self.timed_out += 1
+            self.close_client(key.fileobj)
+
+    def close_client(self, client_socket):
+        '''
+        Stops watching a client's connection and closes it.
+
+        Args:
+            client_socket (socket): The socket connected to the client.
+        '''
+        if self.paused.pop(client_socket, None) is None:
+            self.selector.unregister(client_socket)
+        client_socket.close()
+        self.connections -= 1
+
+    def stats(self):
+        '''
+        Returns counters describing the load of the server.
+
+        Returns:
+            dict: Worker pool counters (queue depth, busy workers, utilisation, ...), the number of
+            open connections and of paused ones, of connections accepted, of alerts received, of
+            invalid alerts and of connections closed for stalling or idling.
+        '''
+        return {
+            "pool": self.pool.stats(),
+            "connections": self.connections,
+            "paused": len(self.paused),
+            "accepted": self.accepted,
+            "alerts": self.alerts,
+            "invalid": self.invalid,
+            "timed_out": self.timed_out
+        }
 
     def stop(self):
         '''
-        Stops the TCP server and closes the listening socket.
+        Stops the TCP server. Its sockets are closed by the server's thread within a second, and
+        alerts already queued are given up on.
         '''
         self.is_running = False
-        self.socket.close()
+        self.pool.stop()
         log("TCP Server stopped.")
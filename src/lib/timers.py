@@ -0,0 +1,145 @@
+import heapq
+import itertools
+import threading
+import time
+
+from lib.logging import log
+
+
+class Timer:
+    '''
+    Handle for a callback scheduled on a TimerScheduler.
+    '''
+    def __init__(self, scheduler, due, callback, args):
+        self.scheduler = scheduler
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        '''
+        Cancels the timer. Does nothing if it already fired.
+        '''
+        self.scheduler.cancel(self)
+
+class TimerScheduler:
+    '''
+    Runs scheduled callbacks from a single thread, ordered by a heap of due times.
+
+    Used by the UDP server to own every retransmission timer, so the number of threads does not
+    grow with the number of packets in flight. Cancelled timers are dropped lazily, and the heap
+    is compacted when they make up most of it, so memory stays proportional to live timers.
+    '''
+    def __init__(self, name="timer"):
+        '''
+        Initializes the scheduler.
+
+        Args:
+            name (str, optional): Name of the scheduler thread. Defaults to "timer".
+        '''
+        self.name = name
+        self.heap = []  # Heap of (due, counter, timer)
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.cancelled = 0
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        '''
+        Starts the scheduler thread.
+        '''
+        with self.condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Stops the scheduler thread. Pending timers never fire.
+        '''
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+
+    def schedule(self, delay, callback, *args):
+        '''
+        Schedules a callback to run after a delay.
+
+        Args:
+            delay (float): Delay in seconds.
+            callback (callable): The function to call.
+            *args: Arguments passed to the callback.
+
+        Returns:
+            Timer: A handle that can be used to cancel the callback.
+        '''
+        due = time.monotonic() + delay
+        timer = Timer(self, due, callback, args)
+        with self.condition:
+            heapq.heappush(self.heap, (due, next(self.counter), timer))
+            # Only wake the thread up if the new timer is now the earliest one
+            if self.heap[0][2] is timer:
+                self.condition.notify()
+        return timer
+
+    def cancel(self, timer):
+        '''
+        Cancels a timer. Does nothing if it already fired or was cancelled.
+
+        Args:
+            timer (Timer): The timer to cancel.
+        '''
+        with self.condition:
+            if timer.cancelled:
+                return
+            timer.cancelled = True
+            self.cancelled += 1
+            if self.cancelled > 64 and self.cancelled > len(self.heap) // 2:
+                self.heap = [entry for entry in self.heap if not entry[2].cancelled]
+                heapq.heapify(self.heap)
+                self.cancelled = 0
+
+    def pending(self):
+        '''
+        Returns the number of timers waiting to fire.
+
+        Returns:
+            int: The number of live timers.
+        '''
+        with self.condition:
+            return len(self.heap) - self.cancelled
+
+    def run(self):
+        '''
+        Fires timers as they become due until the scheduler is stopped.
+        '''
+        while True:
+            with self.condition:
+                while self.is_running:
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    delay = self.heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+
+                if not self.is_running:
+                    return
+
+                _, _, timer = heapq.heappop(self.heap)
+                if timer.cancelled:
+                    self.cancelled -= 1
+                    continue
+                # Mark as fired so a late cancel is a no-op
+                timer.cancelled = True
+
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                log(f"Error running timer callback: {e}", "ERROR")
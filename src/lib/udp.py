@@ -1,69 +1,126 @@
+import heapq
+import random
 import socket
 import threading
-import queue
-from lib.packets import ACKPacket, Packet, PacketType, FlowControlPacket
+import time
+from collections import deque
+from concurrent.futures import Future
+from lib.packets import ACKPacket, Packet, PacketType
+from lib.fragments import Reassembler, fragment
 from lib.logging import log
+from lib.memory import deep_sizeof
+from lib.rtt import RTTEstimator
+from lib.timers import Timer, TimerScheduler
+from lib.window import SEQUENCE_SPACE, ReceiveWindow, ReorderBuffer, SendWindow, seq_add, seq_lt
+from lib.worker_pool import WorkerPool
 
 
 class UDPServer:
-    def __init__(self, host, port, handler, retransmission_timeout=2, max_retries=3, flow_control=20):
+    def __init__(self, host, port, handler, retransmission_timeout=2, max_retries=3, flow_control=20, workers=4, worker_queue_size=1024, window_size=16, min_retransmission_timeout=0.1, max_retransmission_timeout=60, ack_delay=0.02, ack_every=4, receive_buffer_size=65535, max_datagram_size=1400, reassembly_timeout=5, max_reassembly_bytes=1024 * 1024, drain_target=0.05, reuse_port=False, session_idle_timeout=300, max_sessions=10000):
         '''
         Initializes the UDP server with the specified parameters.
 
         Args:
             host (str): Hostname or IP address to bind the server to.
             port (int): Port number to bind the server to.
-            handler (callable): A handler function to process incoming packets.
-            retransmission_timeout (int, optional): Timeout for retransmission of unacknowledged packets. Defaults to 2 seconds.
+            handler (callable): A handler function to process incoming packets. A packet it returns is sent back to the client.
+            retransmission_timeout (int, optional): Timeout for retransmission of unacknowledged packets, until the peer's RTT is measured. Defaults to 2 seconds.
             max_retries (int, optional): Maximum number of retransmissions for unacknowledged packets. Defaults to 3.
-            flow_control (int, optional): Maximum size of the client queue before applying flow control. Defaults to 20.
+            flow_control (int, optional): Largest receive window advertised to a client, in packets. Defaults to 20.
+            workers (int, optional): Number of worker threads processing received packets. Defaults to 4.
+            worker_queue_size (int, optional): Maximum number of pending datagrams per worker. Defaults to 1024.
+            window_size (int, optional): Maximum number of unacknowledged packets per peer. Defaults to 16.
+            min_retransmission_timeout (float, optional): Lower bound of the adaptive retransmission timeout. Defaults to 0.1 seconds.
+            max_retransmission_timeout (float, optional): Upper bound of the adaptive retransmission timeout. Defaults to 60 seconds.
+            ack_delay (float, optional): How long an ACK may be delayed to coalesce it with the next ones. Defaults to 0.02 seconds.
+            ack_every (int, optional): Number of in-order packets after which an ACK is sent without waiting. Defaults to 4.
+            receive_buffer_size (int, optional): Maximum size of a received datagram, in bytes. Defaults to 65535.
+            max_datagram_size (int, optional): Size above which sent packets are fragmented, in bytes. Defaults to 1400.
+            reassembly_timeout (float, optional): How long the fragments of an incomplete packet are kept. Defaults to 5 seconds.
+            max_reassembly_bytes (int, optional): Maximum number of bytes held for incomplete packets. Defaults to 1 MiB.
+            drain_target (float, optional): How long the handler may take to drain a client's receive window. Defaults to 0.05 seconds.
+            reuse_port (bool, optional): Share the port with other sockets (SO_REUSEPORT). The kernel then hands each
+                datagram to one of them by hashing the sender's address, so every peer sticks to one server. Defaults to False.
+            session_idle_timeout (float, optional): How long the session of a silent peer is kept, None to keep it forever. Defaults to 300 seconds.
+            max_sessions (int, optional): Maximum number of sessions, the least recently active ones are evicted beyond it. Defaults to 10000.
         '''
         self.host = host
         self.port = port
         self.handler = handler
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind((self.host, self.port))
         self.is_running = False
-        self.global_sequence_number = 0  # Global sequence number
-        self.sent_packets = {}  # Map sequence_number -> (packet, client_address, event)
-        self.client_queues = {}  # Map client_address -> {queue, expected_sequence_number, flow_state}
-        self.lock = threading.Lock()
+        # Map client_address -> {lock, window, rtt, send_limit, peer_ack, pending, sent, reorder, receive_window, advertised, unacked, ack_timer, last_active}
+        self.sessions = {}
+        self.lock = threading.Lock()  # Only guards the creation and eviction of sessions
+        self.session_idle_timeout = session_idle_timeout
+        self.max_sessions = max_sessions
+        self.idle_evictions = 0
+        self.lru_evictions = 0
         self.retransmission_timeout = retransmission_timeout
         self.max_retries = max_retries
+        self.min_retransmission_timeout = min_retransmission_timeout
+        self.max_retransmission_timeout = max_retransmission_timeout
         self.flow_control = flow_control
-        self.flow_condition = threading.Condition()
+        self.drain_target = drain_target
+        self.window_size = window_size
+        self.ack_delay = ack_delay
+        self.ack_every = ack_every
+        # Guards the counters below, updated from the worker, receive and scheduler threads
+        self.counters_lock = threading.Lock()
+        self.control_sent = 0  # ACKs and window updates sent on the express lane
+        self.control_dropped = 0  # Control packets dropped because the socket's send buffer was full
+        self.duplicates_suppressed = 0  # Duplicates acknowledged again but not delivered
+        self.late_dropped = 0  # Packets that arrived after the sender gave up on them
+        self.receive_buffer_size = receive_buffer_size
+        self.max_datagram_size = max_datagram_size
+        self.reassembler = Reassembler(reassembly_timeout, max_reassembly_bytes)
+        self.pool = WorkerPool(workers, worker_queue_size, name="udp-worker")
+        # Owns every retransmission timer; started right away so messages can be sent before start()
+        self.scheduler = TimerScheduler(name="udp-retransmission")
+        self.scheduler.start()
 
     def start(self):
         '''
         Starts the UDP server to listen for incoming packets.
 
-        Continuously listens for incoming packets and spawns threads to handle them.
+        Continuously listens for incoming packets. ACKs are processed right away, since they
+        only wake up senders, while every other packet is handed to the worker pool. Packets
+        from the same client always go to the same worker, so they are handled in order.
         '''
         self.is_running = True
+        self.pool.start()
+        if self.session_idle_timeout:
+            self.scheduler.schedule(self.session_idle_timeout / 2, self.evict_idle_sessions)
         hostname, port = self.socket.getsockname()
         log(f"UDP server started on {hostname}:{port}.")
 
         while self.is_running:
             try:
-                message, client_address = self.socket.recvfrom(1024)
-
-                # Start a new thread for handling the received packet
-                threading.Thread(
-                    target=self.handle_packet,
-                    args=(message, client_address),
-                    daemon=True
-                ).start()
+                message, client_address = self.socket.recvfrom(self.receive_buffer_size)
+
+                if Packet.peek_type(message) == PacketType.ACK:
+                    self.handle_packet(message, client_address)
+                elif not self.pool.submit(client_address, self.handle_packet, message, client_address):
+                    log(f"Worker queue full, dropping packet from {client_address}.", "ERROR")
             except KeyboardInterrupt:
                 log("Server interrupted manually. Stopping.", "INFO")
                 self.stop()
             except Exception as e:
-                log(f"{e}", "ERROR")
+                # The socket is closed when the server stops
+                if self.is_running:
+                    log(f"{e}", "ERROR")
 
     def handle_packet(self, message, client_address):
         '''
         Handles incoming packets from clients.
 
-        Processes the packet, verifies checksums, and adds it to the appropriate client queue.
+        Processes the packet, verifies checksums and acknowledges it. Fragments are held until
+        their packet is complete. Packets are passed through the client's reorder buffer, so the
+        handler sees them in sequence even if they arrived out of order, and duplicates are
+        acknowledged again but not delivered twice.
 
         Args:
             message (bytes): The raw packet data received from the client.
@@ -73,53 +130,327 @@ class UDPServer:
             # Deserialize the received packet
             received_packet = Packet.deserialize(message)
 
-            if received_packet.ack_number != 0:
-                self.process_ack(received_packet)
-                return
+            if received_packet.packet_type == PacketType.Fragment:
+                message = self.reassembler.add((client_address, received_packet.fragment_id), received_packet)
+                if message is None:
+                    return
+                received_packet = Packet.deserialize(message)
+                if received_packet.packet_type == PacketType.Fragment:
+                    raise ValueError("Reassembled packet is a fragment.")
 
-            # Add the packet to the clients queue
-            self.add_to_client_queue(received_packet, client_address)
+            if received_packet.packet_type == PacketType.ACK:
+                self.process_ack(received_packet, client_address)
+                return
 
-            # Process all client queues
-            self.process_all_client_queues()
+            # Add the packet to the clients queue and deliver whatever is now in order
+            packets = self.add_to_client_queue(received_packet, client_address)
+            self.process_client_queue(client_address, packets)
         except ValueError as e:
+            # Not acknowledged, so the sender retransmits it
             log(f"Packet checksum mismatch: {e}", "ERROR")
-            self.send_message(ACKPacket(received_packet.sequence_number, None), client_address)
         except Exception as e:
             log(f"Error handling packet from {client_address}: {e}", "ERROR")
 
     def stop(self):
         '''
-        Stops the UDP server and releases the socket.
+        Stops the UDP server and releases the socket. Messages still in flight or waiting for
+        room in a window are given up on.
         '''
         self.is_running = False
+        self.pool.stop()
+        self.scheduler.stop()
+
+        with self.lock:
+            sessions = list(self.sessions.values())
+
+        futures = []
+        for session in sessions:
+            with session["lock"]:
+                futures.extend(entry["future"] for entry in session["sent"].values())
+                futures.extend(future for _, future in session["pending"])
+                session["sent"].clear()
+                session["pending"].clear()
+
+        for future in futures:
+            if not future.done():
+                future.set_result(False)
+
         self.socket.close()
         log("UDP Server stopped.", "INFO")
 
-    def process_ack(self, ack_packet):
+    def stats(self):
+        '''
+        Returns counters describing the load of the server.
+
+        Returns:
+            dict: Worker pool counters (queue depth, busy workers, utilisation, ...), the number
+            of packets waiting in the reorder buffers, the number of packets in flight, the number
+            of messages waiting for room in a send window, the number of live timers, the number of
+            control packets sent and dropped, of duplicates suppressed, of late packets dropped and
+            of sessions evicted, and the reassembly buffer counters.
+        '''
+        with self.lock:
+            sessions = list(self.sessions.values())
+
+        client_queue_depth = in_flight = pending = 0
+        for session in sessions:
+            with session["lock"]:
+                client_queue_depth += session["reorder"].buffered()
+                in_flight += len(session["sent"])
+                pending += len(session["pending"])
+
+        with self.counters_lock:
+            control = {"sent": self.control_sent, "dropped": self.control_dropped}
+            duplicates_suppressed = self.duplicates_suppressed
+            late_dropped = self.late_dropped
+
+        return {
+            "pool": self.pool.stats(),
+            "clients": len(sessions),
+            "client_queue_depth": client_queue_depth,
+            "in_flight": in_flight,
+            "pending": pending,
+            "timers": self.scheduler.pending(),
+            "control": control,
+            "duplicates_suppressed": duplicates_suppressed,
+            "late_dropped": late_dropped,
+            "sessions_evicted": {"idle": self.idle_evictions, "lru": self.lru_evictions},
+            "reassembly": self.reassembler.stats()
+        }
+
+    def rtt_estimates(self):
+        '''
+        Returns the RTT estimates kept for every peer, for monitoring.
+
+        Returns:
+            dict: Map client_address -> smoothed RTT, RTT variance, RTO, samples and backoffs.
+        '''
+        with self.lock:
+            sessions = list(self.sessions.items())
+
+        estimates = {}
+        for client_address, session in sessions:
+            with session["lock"]:
+                estimates[client_address] = session["rtt"].snapshot()
+        return estimates
+
+    def session_memory(self):
+        '''
+        Returns the memory held by every session, for monitoring.
+
+        Returns:
+            dict: Map client_address -> estimated bytes held by the session, seconds since it was
+            last active, and the number of packets in flight, waiting for room and buffered out of order.
+        '''
+        with self.lock:
+            sessions = list(self.sessions.items())
+
+        now = time.monotonic()
+        memory = {}
+        for client_address, session in sessions:
+            with session["lock"]:
+                memory[client_address] = {
+                    # Timers and futures reference the whole server, so they are not followed
+                    "bytes": deep_sizeof(session, (Timer, Future, type(session["lock"]))),
+                    "idle": now - session["last_active"],
+                    "in_flight": len(session["sent"]),
+                    "pending": len(session["pending"]),
+                    "buffered": session["reorder"].buffered()
+                }
+        return memory
+
+    def get_session(self, client_address):
+        '''
+        Returns the state kept for a peer, creating it if needed.
+
+        Each session has its own lock, so packets from different peers are processed in parallel;
+        the server lock is only taken the first time a peer is seen. Creating a session beyond
+        `max_sessions` evicts the least recently active ones, 1% of the cap at a time so the
+        scan is not repeated for every new peer.
+
+        A new session starts sending at a random sequence number and receiving at whatever the
+        peer is sending, so a peer whose session was evicted is picked up where it is, and does
+        not mistake new packets for duplicates of the previous session's.
+
+        Args:
+            client_address (tuple): The address of the peer.
+
+        Returns:
+            dict: The peer's lock, sending state (send window, RTT estimator, the peer's advertised
+            window, messages waiting for room and packets in flight), receiving state (reorder
+            buffer, receive window and delayed ACK) and when it was last active.
+        '''
+        session = self.sessions.get(client_address)
+        if session is not None:
+            session["last_active"] = time.monotonic()
+            return session
+
+        evicted = []
+        with self.lock:
+            if client_address not in self.sessions:
+                if len(self.sessions) >= self.max_sessions:
+                    count = len(self.sessions) - self.max_sessions + max(1, self.max_sessions // 100)
+                    evicted = heapq.nsmallest(count, self.sessions.items(), key=lambda item: item[1]["last_active"])
+                    for evicted_address, _ in evicted:
+                        del self.sessions[evicted_address]
+                    self.lru_evictions += len(evicted)
+
+                self.sessions[client_address] = {
+                    "lock": threading.Lock(),
+                    "window": SendWindow(self.window_size, random.randrange(SEQUENCE_SPACE)),
+                    "rtt": RTTEstimator(self.retransmission_timeout, self.min_retransmission_timeout, self.max_retransmission_timeout),
+                    "send_limit": None,  # Sequence number the peer's advertised window ends at
+                    "peer_ack": None,  # ACK number of the latest ACK from the peer
+                    "pending": deque(),
+                    "sent": {},  # Map sequence_number -> {message, datagrams, future, retries, sent_at, rto, timer}
+                    "reorder": ReorderBuffer(self.window_size, None),
+                    "receive_window": ReceiveWindow(self.flow_control, self.drain_target),
+                    "advertised": None,  # Window advertised in the latest ACK
+                    "unacked": 0,
+                    "ack_timer": None,
+                    "last_active": time.monotonic()
+                }
+                log(f"Created session for client {client_address}")
+            session = self.sessions[client_address]
+
+        for evicted_address, evicted_session in evicted:
+            log(f"Too many sessions, evicting the least recently active one of {evicted_address}.")
+            self.close_session(evicted_address, evicted_session)
+        return session
+
+    def close_session(self, client_address, session):
+        '''
+        Releases an evicted session: its timers are cancelled and its unacknowledged messages are
+        given up on. The session must already be removed from `sessions`.
+
+        Args:
+            client_address (tuple): The address of the peer.
+            session (dict): The peer's session.
+        '''
+        with session["lock"]:
+            if session["ack_timer"]:
+                session["ack_timer"].cancel()
+                session["ack_timer"] = None
+            futures = []
+            for entry in session["sent"].values():
+                if entry["timer"]:
+                    entry["timer"].cancel()
+                futures.append(entry["future"])
+            futures.extend(future for _, future in session["pending"])
+            session["sent"].clear()
+            session["pending"].clear()
+
+        for future in futures:
+            if not future.done():
+                future.set_result(False)
+        if futures:
+            log(f"Gave up on {len(futures)} messages to evicted client {client_address}.")
+
+    def evict_idle_sessions(self):
+        '''
+        Evicts the sessions of peers that were silent for longer than `session_idle_timeout`.
+
+        Runs on the scheduler thread every half timeout, for as long as the server runs, even if
+        closing a session fails.
+        '''
+        if not self.is_running:
+            return
+
+        try:
+            deadline = time.monotonic() - self.session_idle_timeout
+            with self.lock:
+                evicted = [(client_address, session) for client_address, session in self.sessions.items() if session["last_active"] < deadline]
+                for client_address, _ in evicted:
+                    del self.sessions[client_address]
+                self.idle_evictions += len(evicted)
+
+            for client_address, session in evicted:
+                log(f"Evicting idle session of {client_address}.")
+                self.close_session(client_address, session)
+        finally:
+            self.scheduler.schedule(self.session_idle_timeout / 2, self.evict_idle_sessions)
+
+    def process_ack(self, ack_packet, client_address):
         '''
         Processes an acknowledgment (ACK) packet.
 
-        Updates the sent packets dictionary to mark the packet as acknowledged and signals waiting threads.
+        Completes every packet in flight covered by the ACK, cumulatively or selectively, which
+        cancels their retransmission timers and resolves their futures. The window advertised in
+        the ACK sets how far ahead the peer accepts packets; ACKs older than the latest one
+        are not used for that, since they arrived out of order.
 
         Args:
             ack_packet (ACKPacket): The acknowledgment packet.
+            client_address (tuple): The address of the peer that sent the ACK.
         '''
         # Handle the reception of an ACK packet.
-        with self.lock:
-            if ack_packet.ack_number in self.sent_packets:
-                _, _, ack_event = self.sent_packets.pop(ack_packet.ack_number)
-                log(f"ACK received for sequence {ack_packet.ack_number}")
-                ack_event.set()  # Signal the waiting thread
+        session = self.sessions.get(client_address)
+        if session is None:
+            return
+
+        session["last_active"] = time.monotonic()
+        failed = []
+        with session["lock"]:
+            if session["peer_ack"] is None or not seq_lt(ack_packet.ack_number, session["peer_ack"]):
+                session["peer_ack"] = ack_packet.ack_number
+                session["send_limit"] = seq_add(ack_packet.ack_number, ack_packet.window)
+            acknowledged = ack_packet.acknowledged(list(session["window"].unacked))
+            if not acknowledged:
+                # Window update, the window may have opened
+                failed = self.flush_pending(session, client_address)
+
+        for future in failed:
+            future.set_result(False)
+
+        for sequence_number in acknowledged:
+            if self.complete(client_address, sequence_number, True):
+                log(f"ACK received for sequence {sequence_number}")
+
+    def complete(self, client_address, sequence_number, delivered):
+        '''
+        Finishes a reliable send, either acknowledged or given up on.
+
+        Frees the packet's slot in the peer's window and resolves the packet's future (outside the
+        lock, since it runs callbacks), before letting held back messages go out, so sending them
+        can never keep the future from resolving. The ACK of a packet that was only sent once is
+        also an RTT sample for the peer.
 
-        with self.flow_condition:
-            self.flow_condition.notify_all()
+        Args:
+            client_address (tuple): The address of the peer.
+            sequence_number (int): The sequence number of the packet.
+            delivered (bool): Whether the packet was acknowledged.
+
+        Returns:
+            bool: True if the packet was still in flight, False otherwise.
+        '''
+        session = self.sessions.get(client_address)
+        if session is None:
+            return False
+
+        with session["lock"]:
+            entry = session["sent"].pop(sequence_number, None)
+            if entry is None:
+                return False
+
+            entry["timer"].cancel()
+            if delivered and entry["retries"] == 1:
+                # Retransmitted packets are ambiguous, so they are never sampled (Karn's algorithm)
+                session["rtt"].sample(time.monotonic() - entry["sent_at"])
+            session["window"].release(sequence_number)
+
+        entry["future"].set_result(delivered)
+
+        with session["lock"]:
+            failed = self.flush_pending(session, client_address)
+        for future in failed:
+            future.set_result(False)
+        return True
 
     def send_message(self, message, client_address):
         '''
-        Sends a message to the specified client with retransmission logic.
+        Sends a message to the specified client and waits until it is acknowledged or given up on.
 
-        Retransmits the message up to `max_retries` times if an acknowledgment is not received.
+        Blocking wrapper around `send_message_nowait`.
 
         Args:
             message (Packet): The packet to be sent.
@@ -128,134 +459,349 @@ class UDPServer:
         Returns:
             bool: True if the message was acknowledged, False otherwise.
         '''
-        with self.lock:
-            client_data = self.client_queues.get(client_address)
-            if client_data and not client_data["can_send"]:
-                log(f"Waiting for flow control to allow sending to {client_address}.")
-                # Wait for the flow condition to be notified
-                with self.flow_condition:
-                    self.flow_condition.wait_for(lambda: client_data["can_send"])
+        return self.send_message_nowait(message, client_address).result()
+
+    def send_message_nowait(self, message, client_address):
+        '''
+        Sends a message to the specified client with retransmission logic, without blocking.
+
+        Up to `window_size` messages per peer can be in flight at the same time (selective
+        repeat), as long as the peer advertised room for them; later ones are held until there
+        is room in both windows. Retransmissions are timers on the server's scheduler, so no
+        thread waits for the ACK: the returned future resolves to True once the message is
+        acknowledged, or to False after `max_retries` unacknowledged transmissions. Completion
+        callbacks can be attached with `add_done_callback`.
 
-        # Send a message with retransmission logic.
+        Args:
+            message (Packet): The packet to be sent.
+            client_address (tuple): The address of the client to send the packet to.
+
+        Returns:
+            concurrent.futures.Future: Resolves to True if the message was acknowledged, False otherwise.
+        '''
+        future = Future()
+
+        # Control packets take the express lane, without retransmission
         if message.packet_type == PacketType.ACK:
-            # No need for retransmission
-            serialized_message = message.serialize()
-            self.socket.sendto(serialized_message, client_address)
+            future.set_result(self.send_control(message, client_address))
+            return future
+
+        session = self.get_session(client_address)
+        with session["lock"]:
+            if session["pending"] or not self.can_transmit(session):
+                log(f"Waiting for flow control to allow sending to {client_address}.")
+                session["pending"].append((message, future))
+                sent = True
+            else:
+                sent = self.transmit_new(session, message, client_address, future)
+
+        if not sent:
+            future.set_result(False)
+        return future
+
+    def flush_pending(self, session, client_address):
+        '''
+        Transmits held back messages for a peer while its window has room. Must be called with the session lock held.
+
+        Args:
+            session (dict): The peer's session.
+            client_address (tuple): The address of the peer.
+
+        Returns:
+            list: The futures of the messages that couldn't be sent, to resolve to False once the lock is released.
+        '''
+        failed = []
+        while session["pending"] and self.can_transmit(session):
+            message, future = session["pending"].popleft()
+            if not self.transmit_new(session, message, client_address, future):
+                failed.append(future)
+        return failed
+
+    def can_transmit(self, session):
+        '''
+        Checks whether a new packet fits in both the send window and the window advertised by the peer. Must be called with the session lock held.
+
+        A packet is always allowed when nothing is in flight: it probes the peer, whose ACK
+        brings the current window, so a lost window update never stalls the sender.
+
+        Args:
+            session (dict): The peer's session.
+
+        Returns:
+            bool: True if a new packet can be transmitted.
+        '''
+        window = session["window"]
+        if not window.can_send():
+            return False
+        if window.in_flight() == 0 or session["send_limit"] is None:
             return True
+        return seq_lt(window.next_sequence_number, session["send_limit"])
 
-        with self.lock:
-            # Assign a global sequence number
-            self.global_sequence_number += 1
-            message.sequence_number = self.global_sequence_number
+    def transmit_new(self, session, message, client_address, future):
+        '''
+        Assigns a sequence number to a message and transmits it for the first time. Must be called with the session lock held.
+
+        Messages larger than `max_datagram_size` are split into fragments, which are always sent together.
+        The message is serialized before its sequence number is taken from the window, so a message
+        that can't be serialized never holds a slot that nothing would release, and a message whose
+        first transmission fails gives its slot back right away.
+
+        Args:
+            session (dict): The peer's session.
+            message (Packet): The packet to be sent.
+            client_address (tuple): The address of the client to send the packet to.
+            future (Future): Future completed when the message is acknowledged or given up.
+
+        Returns:
+            bool: True if the message is in flight, False if it couldn't be sent, in which case the
+            caller must resolve its future to False once the session lock is released.
+        '''
+        # Number the message with the next sequence number of this peer, allocated once it is serialized
+        window = session["window"]
+        message.sequence_number = window.next_sequence_number
+        message.ack_number = window.base()
+        try:
+            datagrams = fragment(message.serialize(), message.sequence_number, self.max_datagram_size)
+        except Exception as e:
+            log(f"Couldn't serialize message to {client_address}: {e}", "ERROR")
+            return False
+        window.allocate()
+
+        entry = {
+            "message": message,
+            "datagrams": datagrams,
+            "future": future,
+            "retries": 0,
+            "sent_at": None,
+            "rto": None,
+            "timer": None
+        }
+        session["sent"][message.sequence_number] = entry
+        try:
+            self.transmit(session, entry, client_address)
+        except OSError as e:
+            log(f"Error sending sequence {message.sequence_number} to {client_address}: {e}", "ERROR")
+            del session["sent"][message.sequence_number]
+            window.release(message.sequence_number)
+            return False
+        return True
+
+    def transmit(self, session, entry, client_address):
+        '''
+        Sends a packet and schedules its retransmission after the peer's current RTO. Must be called with the session lock held.
+
+        Args:
+            session (dict): The peer's session.
+            entry (dict): The sent packets entry of the packet.
+            client_address (tuple): The address of the peer.
+        '''
+        message = entry["message"]
+        rto = session["rtt"].rto
+        for datagram in entry["datagrams"]:
+            self.socket.sendto(datagram, client_address)
+        entry["retries"] += 1
+        entry["sent_at"] = time.monotonic()
+        entry["rto"] = rto
+        log(f"Sent message to {client_address} with sequence {message.sequence_number}, packet_type: {message.packet_type}, fragments: {len(entry['datagrams'])}. Attempt {entry['retries']}")
+        entry["timer"] = self.scheduler.schedule(rto, self.retransmit, client_address, message.sequence_number)
+
+    def retransmit(self, client_address, sequence_number):
+        '''
+        Retransmits an unacknowledged packet, or gives up after `max_retries` attempts. Every
+        timeout doubles the peer's RTO until a new RTT sample is taken.
+
+        Runs on the scheduler thread when a packet's retransmission timer fires.
+
+        Args:
+            client_address (tuple): The address of the peer.
+            sequence_number (int): The sequence number of the packet.
+        '''
+        session = self.sessions.get(client_address)
+        if session is None:
+            return
+
+        with session["lock"]:
+            entry = session["sent"].get(sequence_number)
+            if entry is None:
+                return
+
+            rtt = session["rtt"]
+            if entry["rto"] >= rtt.rto:
+                # Several packets sent with the same RTO may time out together; back off only once
+                rtt.backoff()
+            if entry["retries"] < self.max_retries:
+                log(f"No ACK received for sequence {sequence_number}, retrying... ({entry['retries']}/{self.max_retries})")
+                try:
+                    self.transmit(session, entry, client_address)
+                    return
+                except OSError as e:
+                    log(f"Error retransmitting sequence {sequence_number}: {e}", "ERROR")
 
-        serialized_message = message.serialize()
-         # Create an Event to wait for the ACK
-        ack_event = threading.Event()
-        with self.lock:
-            self.sent_packets[message.sequence_number] = (message, client_address, ack_event)
-        retries = 0
-        while retries < self.max_retries:
-            # Send the message
-            self.socket.sendto(serialized_message, client_address)
-            log(f"Sent message to {client_address} with sequence {message.sequence_number}, packet_type: {message.packet_type}. Attempt {retries + 1}")
-            # Wait for the ACK
-            if ack_event.wait(self.retransmission_timeout):
-                log(f"ACK received for sequence {message.sequence_number}, stopping retransmission.")
-                with self.lock:
-                    self.sent_packets.pop(message.sequence_number, None)  # Clean up
-                with self.flow_condition:
-                    self.flow_condition.notify_all()
-                return True  # ACK received, message delivered
-            # Timeout, increment retry count
-            retries += 1
-            log(f"No ACK received for sequence {message.sequence_number}, retrying... ({retries}/{self.max_retries})")
         # Retries exhausted, clean up
-        log(f"Failed to deliver message with sequence {message.sequence_number} after {self.max_retries} attempts.")
-        with self.lock:
-            self.sent_packets.pop(message.sequence_number, None)
-        with self.flow_condition:
-            self.flow_condition.notify_all()
-        return False
+        log(f"Failed to deliver message with sequence {sequence_number} after {self.max_retries} attempts.")
+        self.complete(client_address, sequence_number, False)
 
     def add_to_client_queue(self, packet, client_address):
         '''
-        Adds a received packet to the client's queue.
+        Adds a received packet to the client's reorder buffer and acknowledges it.
 
-        Implements flow control by pausing/resuming sending based on the queue size.
+        ACKs of in-order packets are delayed by up to `ack_delay` so that one cumulative ACK covers
+        several packets, unless `ack_every` packets are already waiting for one. Out-of-order and
+        duplicate packets are acknowledged right away, so the sender learns about gaps quickly.
+        New packets count against the client's receive window until the handler is done with them.
+        Only the session of the sending client is locked.
 
         Args:
             packet (Packet): The received packet to be added to the queue.
             client_address (tuple): The address of the client sending the packet.
+
+        Returns:
+            list: The packets that are now ready to be delivered, in sequence.
         '''
-        with self.lock:
-            if client_address not in self.client_queues:
-                self.client_queues[client_address] = {
-                    "queue": queue.PriorityQueue(),
-                    "packets": {},
-                    "expected_sequence_number": 1,
-                    "can_send": True  # Initially, the server allows sending
-                }
-                log(f"Created queue for client {client_address}")
+        ack_packet = None
+        session = self.get_session(client_address)
+        with session["lock"]:
+            # Data packets carry the sender's window base in their ack number
+            log(f"Adding packet {packet.sequence_number} to queue for {client_address}")
+            status, packets = session["reorder"].push(packet.sequence_number, packet, packet.ack_number)
+            if status == ReorderBuffer.NEW:
+                session["receive_window"].received()
+
+            session["unacked"] += 1
+            if status == ReorderBuffer.NEW and session["reorder"].buffered() == 0 and session["unacked"] < self.ack_every:
+                if session["ack_timer"] is None:
+                    session["ack_timer"] = self.scheduler.schedule(self.ack_delay, self.send_delayed_ack, client_address)
+            else:
+                ack_packet = self.build_ack(session)
+
+        if ack_packet:
+            self.send_ack(ack_packet, client_address)
+        if status == ReorderBuffer.DUPLICATE:
+            with self.counters_lock:
+                self.duplicates_suppressed += 1
+            log(f"Duplicate packet {packet.sequence_number} from {client_address}, not delivered.")
+        elif status == ReorderBuffer.LATE:
+            with self.counters_lock:
+                self.late_dropped += 1
+            log(f"Packet {packet.sequence_number} from {client_address} arrived after the sender gave up on it, not delivered.")
+
+        return packets
+
+    def build_ack(self, session):
+        '''
+        Builds the cumulative ACK for a client, with its current receive window, and resets its delayed ACK state. Must be called with the session lock held.
 
-            client_data = self.client_queues[client_address]
-            queue_size = client_data["queue"].qsize()
+        Args:
+            session (dict): The client's session.
 
-            # Enforce flow control
-            if queue_size >= self.flow_control and client_data["can_send"]:
-                log(f"Flow control triggered for {client_address}. Sending FlowControlPacket(can_send=False).")
-                with self.lock:
-                    self.global_sequence_number += 1
-                self.send_message(FlowControlPacket(self.global_sequence_number,can_send=False), client_address)
-                client_data["can_send"] = False
+        Returns:
+            ACKPacket: The ACK packet to send.
+        '''
+        if session["ack_timer"]:
+            session["ack_timer"].cancel()
+            session["ack_timer"] = None
+        session["unacked"] = 0
 
-            elif queue_size < self.flow_control and not client_data["can_send"]:
-                # If queue size is below flow control and can_send is False, resume sending
-                log(f"Resuming flow for {client_address}. Sending FlowControlPacket(can_send=True).")
-                client_data["can_send"] = True
-                self.send_message(FlowControlPacket(self.global_sequence_number, can_send=True), client_address)
+        reorder = session["reorder"]
+        # Never more than the reorder buffer accepts
+        session["advertised"] = min(session["receive_window"].advertised(), reorder.window_size)
+        return ACKPacket(0, reorder.expected_sequence_number, reorder.selective_acks(ACKPacket.SELECTIVE_ACK_BITS), session["advertised"])
 
-            log(f"Adding packet {packet.sequence_number} to queue for {client_address}")
-            client_data["queue"].put(packet.sequence_number)
-            client_data["packets"][packet.sequence_number] = packet
+    def send_delayed_ack(self, client_address):
+        '''
+        Sends the pending ACK of a client once its ACK delay expires.
+
+        Runs on the scheduler thread.
 
-    def process_all_client_queues(self):
+        Args:
+            client_address (tuple): The address of the client.
         '''
-        Processes all client queues to handle packets in the correct order.
+        session = self.sessions.get(client_address)
+        if session is None:
+            return
 
-        Ensures packets are delivered to the handler function in sequence.
+        with session["lock"]:
+            if session["unacked"] == 0:
+                return
+            session["ack_timer"] = None
+            ack_packet = self.build_ack(session)
+
+        self.send_ack(ack_packet, client_address)
+
+    def send_ack(self, ack_packet, client_address):
         '''
-        with self.lock:
-            for client_address, client_data in self.client_queues.items():
-                self.process_client_queue(client_address, client_data)
+        Sends an ACK on the express lane (see `send_control`).
 
-    def process_client_queue(self, client_address, client_data):
+        Args:
+            ack_packet (ACKPacket): The ACK packet to send.
+            client_address (tuple): The address of the client.
         '''
-        Processes the packet queue for a specific client.
+        self.send_control(ack_packet, client_address)
 
-        Delivers packets to the handler function and manages flow control based on the queue size.
+    def send_control(self, packet, client_address):
+        '''
+        Sends a control packet (an ACK or a window update) on the express lane.
+
+        Control packets are never retransmitted nor held back by flow control, so they skip the
+        send window entirely and no lock is held while they are sent. They never block either:
+        if data filled the socket's send buffer, the packet is dropped instead of waiting behind
+        it, and the next cumulative ACK carries the same information.
 
         Args:
-            client_address (tuple): The address of the client whose queue is being processed.
-            client_data (dict): Data structure containing the client's queue and metadata.
-        '''
-        while not client_data["queue"].empty():
-            seq_num = client_data["queue"].queue[0]
-            log(f"Processing packet {seq_num} for client {client_address}")
-
-            client_data["queue"].get()
-            packet = client_data["packets"].pop(seq_num)
-
-            threading.Thread(
-                target=self.handler,
-                args=(packet, client_address, self),
-                daemon=True
-            ).start()
-            client_data["expected_sequence_number"] += 1
-
-        # If the queue size is below the flow control limit and flow was paused, resume flow
-        if client_data["queue"].qsize() < self.flow_control and not client_data["can_send"]:
-            log(f"Resuming flow for {client_address}. Sending FlowControlPacket(can_send=True).")
-            with self.lock:
-                self.global_sequence_number += 1
-            self.send_message(FlowControlPacket(self.global_sequence_number, can_send=True), client_address)
-            client_data["can_send"] = True
+            packet (Packet): The control packet to send.
+            client_address (tuple): The address of the client.
+
+        Returns:
+            bool: True if the packet was handed to the socket, False if it was dropped.
+        '''
+        try:
+            self.socket.sendto(packet.serialize(), socket.MSG_DONTWAIT, client_address)
+        except BlockingIOError:
+            with self.counters_lock:
+                self.control_dropped += 1
+            return False
+        except OSError as e:
+            # The socket is closed when the server stops
+            if self.is_running:
+                log(f"Error sending control packet to {client_address}: {e}", "ERROR")
+            return False
+
+        with self.counters_lock:
+            self.control_sent += 1
+        return True
+
+    def process_client_queue(self, client_address, packets):
+        '''
+        Delivers the in-order packets of a client to the handler.
+
+        The handler runs on the calling worker thread. Since every packet of a client is processed
+        by the same worker, packets are never delivered out of order. A packet the handler returns,
+        such as a registration response, is sent back to the client. The time the handler takes
+        adapts the client's receive window, and if the last ACK closed the window, a window
+        update is sent as soon as it opens again.
+
+        Args:
+            client_address (tuple): The address of the client whose packets are being delivered.
+            packets (list): The packets to deliver, in sequence.
+        '''
+        session = self.get_session(client_address)
+        for packet in packets:
+            log(f"Processing packet {packet.sequence_number} for client {client_address}")
+            started = time.monotonic()
+            try:
+                response = self.handler(packet, client_address, self)
+                if response is not None:
+                    self.send_message_nowait(response, client_address)
+            except Exception as e:
+                # The packets after it were already acknowledged, so they must still be delivered
+                log(f"Error handling packet from {client_address}: {e}", "ERROR")
+
+            ack_packet = None
+            with session["lock"]:
+                session["receive_window"].handled(time.monotonic() - started)
+                if session["advertised"] == 0 and session["receive_window"].advertised() > 0:
+                    ack_packet = self.build_ack(session)
+
+            if ack_packet:
+                log(f"Window opened for {client_address}, sending window update.")
+                self.send_ack(ack_packet, client_address)
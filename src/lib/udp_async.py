@@ -0,0 +1,658 @@
+import asyncio
+import inspect
+import random
+
+from lib.packets import ACKPacket, Packet, PacketType
+from lib.fragments import Reassembler, fragment
+from lib.logging import log
+from lib.memory import deep_sizeof
+from lib.rtt import RTTEstimator
+from lib.window import SEQUENCE_SPACE, ReceiveWindow, ReorderBuffer, SendWindow, seq_add, seq_lt
+
+
+class AsyncUDPServer(asyncio.DatagramProtocol):
+    '''
+    asyncio implementation of the reliable UDP transport.
+
+    Speaks the same protocol as UDPServer (same packet types, ACKs and flow control credits), but runs
+    on an event loop: retransmissions are loop timers instead of threads waiting for an ACK,
+    so the number of in-flight messages does not depend on the number of threads.
+    '''
+    def __init__(self, host, port, handler, retransmission_timeout=2, max_retries=3, flow_control=20, window_size=16, min_retransmission_timeout=0.1, max_retransmission_timeout=60, ack_delay=0.02, ack_every=4, max_datagram_size=1400, reassembly_timeout=5, max_reassembly_bytes=1024 * 1024, drain_target=0.05, session_idle_timeout=300, max_sessions=10000):
+        '''
+        Initializes the asyncio UDP server with the specified parameters.
+
+        Args:
+            host (str): Hostname or IP address to bind the server to.
+            port (int): Port number to bind the server to.
+            handler (callable): A handler function to process incoming packets. It may return an awaitable. A packet it returns (or its awaitable resolves to) is sent back to the client.
+            retransmission_timeout (int, optional): Timeout for retransmission of unacknowledged packets, until the peer's RTT is measured. Defaults to 2 seconds.
+            max_retries (int, optional): Maximum number of retransmissions for unacknowledged packets. Defaults to 3.
+            flow_control (int, optional): Largest receive window advertised to a client, in packets. Defaults to 20.
+            window_size (int, optional): Maximum number of unacknowledged packets per peer. Defaults to 16.
+            min_retransmission_timeout (float, optional): Lower bound of the adaptive retransmission timeout. Defaults to 0.1 seconds.
+            max_retransmission_timeout (float, optional): Upper bound of the adaptive retransmission timeout. Defaults to 60 seconds.
+            ack_delay (float, optional): How long an ACK may be delayed to coalesce it with the next ones. Defaults to 0.02 seconds.
+            ack_every (int, optional): Number of in-order packets after which an ACK is sent without waiting. Defaults to 4.
+            max_datagram_size (int, optional): Size above which sent packets are fragmented, in bytes. Defaults to 1400.
+            reassembly_timeout (float, optional): How long the fragments of an incomplete packet are kept. Defaults to 5 seconds.
+            max_reassembly_bytes (int, optional): Maximum number of bytes held for incomplete packets. Defaults to 1 MiB.
+            drain_target (float, optional): How long the handler may take to drain a client's receive window. Defaults to 0.05 seconds.
+            session_idle_timeout (float, optional): How long the state of a silent peer is kept, None to keep it forever. Defaults to 300 seconds.
+            max_sessions (int, optional): Maximum number of peers with state, the least recently active ones are evicted beyond it. Defaults to 10000.
+        '''
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.transport = None
+        self.loop = None
+        self.closed = None
+        self.is_running = False
+        self.sent_packets = {}  # Map (client_address, sequence_number) -> {message, datagrams, client_address, future, retries, sent_at, rto, timer}
+        self.client_queues = {}  # Map client_address -> {reorder, queue, task, receive_window, advertised, unacked, ack_timer}
+        self.peers = {}  # Map client_address -> {window, rtt, send_limit, peer_ack, pending}
+        self.last_active = {}  # Map client_address -> loop time of its latest activity, least recent first
+        self.session_idle_timeout = session_idle_timeout
+        self.max_sessions = max_sessions
+        self.idle_evictions = 0
+        self.lru_evictions = 0
+        self.eviction_timer = None
+        self.retransmission_timeout = retransmission_timeout
+        self.max_retries = max_retries
+        self.min_retransmission_timeout = min_retransmission_timeout
+        self.max_retransmission_timeout = max_retransmission_timeout
+        self.flow_control = flow_control
+        self.drain_target = drain_target
+        self.window_size = window_size
+        self.ack_delay = ack_delay
+        self.ack_every = ack_every
+        self.control_sent = 0  # ACKs and window updates sent on the express lane
+        self.duplicates_suppressed = 0  # Duplicates acknowledged again but not delivered
+        self.late_dropped = 0  # Packets that arrived after the sender gave up on them
+        self.max_datagram_size = max_datagram_size
+        self.reassembler = Reassembler(reassembly_timeout, max_reassembly_bytes)
+
+    async def start(self):
+        '''
+        Binds the server socket on the running event loop.
+        '''
+        self.loop = asyncio.get_running_loop()
+        self.closed = self.loop.create_future()
+        await self.loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+
+    async def serve_forever(self):
+        '''
+        Waits until the server is stopped.
+        '''
+        await self.closed
+
+    def stop(self):
+        '''
+        Stops the server, cancels every pending retransmission and releases the socket. Messages
+        still in flight or waiting for room in a window are given up on.
+        '''
+        self.is_running = False
+        if self.eviction_timer:
+            self.eviction_timer.cancel()
+            self.eviction_timer = None
+
+        futures = []
+        for entry in self.sent_packets.values():
+            if entry["timer"]:
+                entry["timer"].cancel()
+            futures.append(entry["future"])
+        self.sent_packets.clear()
+        for peer in self.peers.values():
+            futures.extend(future for _, future in peer["pending"])
+            peer["pending"].clear()
+
+        for future in futures:
+            if not future.done():
+                future.set_result(False)
+
+        for client_data in self.client_queues.values():
+            client_data["task"].cancel()
+            if client_data["ack_timer"]:
+                client_data["ack_timer"].cancel()
+
+        if self.transport:
+            self.transport.close()
+        log("UDP Server stopped.", "INFO")
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.is_running = True
+        if self.session_idle_timeout:
+            self.eviction_timer = self.loop.call_later(self.session_idle_timeout / 2, self.evict_idle_sessions)
+        hostname, port = transport.get_extra_info("sockname")[:2]
+        log(f"UDP server started on {hostname}:{port}.")
+
+    def connection_lost(self, exc):
+        self.is_running = False
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def error_received(self, exc):
+        log(f"{exc}", "ERROR")
+
+    def getsockname(self):
+        '''
+        Returns the address the server is bound to.
+
+        Returns:
+            tuple: The (host, port) of the server socket.
+        '''
+        return self.transport.get_extra_info("sockname")
+
+    def datagram_received(self, data, client_address):
+        '''
+        Handles incoming packets from clients.
+
+        Fragments are held until their packet is complete. ACKs complete pending sends and carry
+        the window the peer advertises, which resumes held back sends once it opens, and every
+        other packet is acknowledged and added to the client queue.
+
+        Args:
+            data (bytes): The raw packet data received from the client.
+            client_address (tuple): The address of the client sending the packet.
+        '''
+        self.touch(client_address)
+        try:
+            received_packet = Packet.deserialize(data)
+
+            if received_packet.packet_type == PacketType.Fragment:
+                data = self.reassembler.add((client_address, received_packet.fragment_id), received_packet)
+                if data is None:
+                    return
+                received_packet = Packet.deserialize(data)
+                if received_packet.packet_type == PacketType.Fragment:
+                    raise ValueError("Reassembled packet is a fragment.")
+
+            if received_packet.packet_type == PacketType.ACK:
+                self.process_ack(received_packet, client_address)
+                return
+
+            self.add_to_client_queue(received_packet, client_address)
+        except ValueError as e:
+            # Not acknowledged, so the sender retransmits it
+            log(f"Packet checksum mismatch: {e}", "ERROR")
+        except Exception as e:
+            log(f"Error handling packet from {client_address}: {e}", "ERROR")
+
+    def process_ack(self, ack_packet, client_address):
+        '''
+        Processes an acknowledgment (ACK) packet.
+
+        Completes every packet in flight covered by the ACK, cumulatively or selectively, which
+        cancels their retransmission timers and completes their futures. The window advertised
+        in the ACK sets how far ahead the peer accepts packets, unless the ACK is older than the
+        latest one.
+
+        Args:
+            ack_packet (ACKPacket): The acknowledgment packet.
+            client_address (tuple): The address of the peer that sent the ACK.
+        '''
+        peer = self.peers.get(client_address)
+        if peer is None:
+            return
+
+        if peer["peer_ack"] is None or not seq_lt(ack_packet.ack_number, peer["peer_ack"]):
+            peer["peer_ack"] = ack_packet.ack_number
+            peer["send_limit"] = seq_add(ack_packet.ack_number, ack_packet.window)
+
+        for sequence_number in ack_packet.acknowledged(list(peer["window"].unacked)):
+            log(f"ACK received for sequence {sequence_number}")
+            self.complete(client_address, sequence_number, True)
+
+        # Window update, the window may have opened
+        self.flush_pending(client_address)
+
+    def complete(self, client_address, sequence_number, delivered):
+        '''
+        Finishes a reliable send, either acknowledged or given up on.
+
+        Frees the packet's slot in the peer's window, which may let held back messages go out.
+        The ACK of a packet that was only sent once is also an RTT sample for the peer.
+
+        Args:
+            client_address (tuple): The address of the peer.
+            sequence_number (int): The sequence number of the packet.
+            delivered (bool): Whether the packet was acknowledged.
+        '''
+        entry = self.sent_packets.pop((client_address, sequence_number), None)
+        if entry is None:
+            return
+
+        if entry["timer"]:
+            entry["timer"].cancel()
+        if not entry["future"].done():
+            entry["future"].set_result(delivered)
+
+        peer = self.peers.get(client_address)
+        if peer is None:
+            return
+        if delivered and entry["retries"] == 1:
+            # Retransmitted packets are ambiguous, so they are never sampled (Karn's algorithm)
+            peer["rtt"].sample(self.loop.time() - entry["sent_at"])
+        peer["window"].release(sequence_number)
+        self.flush_pending(client_address)
+
+    def send_message(self, message, client_address):
+        '''
+        Sends a message to the specified client with retransmission logic.
+
+        Never blocks: the result is a future that resolves to True once the message is
+        acknowledged, or to False when `max_retries` transmissions went unacknowledged.
+        Callers that do not care about delivery can simply ignore it. Up to `window_size`
+        messages per peer are in flight at once, as long as the peer advertised room for them;
+        later ones wait for room in both windows.
+
+        The method can also be called from threads other than the event loop's, in which case
+        the send is scheduled on the loop and a `concurrent.futures.Future` is returned.
+
+        Args:
+            message (Packet): The packet to be sent.
+            client_address (tuple): The address of the client to send the packet to.
+
+        Returns:
+            Future: Resolves to True if the message was acknowledged, False otherwise.
+        '''
+        if not self.in_loop_thread():
+            return asyncio.run_coroutine_threadsafe(self.send_message_from_thread(message, client_address), self.loop)
+
+        future = self.loop.create_future()
+
+        # Control packets take the express lane, without retransmission
+        if message.packet_type == PacketType.ACK:
+            self.send_control(message, client_address)
+            future.set_result(True)
+            return future
+
+        self.touch(client_address)
+        peer = self.get_peer(client_address)
+        if peer["pending"] or not self.can_transmit(peer):
+            log(f"Waiting for flow control to allow sending to {client_address}.")
+            peer["pending"].append((message, future))
+            return future
+
+        self.transmit_new(message, client_address, future)
+        return future
+
+    async def send_message_from_thread(self, message, client_address):
+        return await self.send_message(message, client_address)
+
+    def in_loop_thread(self):
+        '''
+        Checks whether the caller is running on the server's event loop.
+
+        Returns:
+            bool: True if called from the event loop thread, False otherwise.
+        '''
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def transmit_new(self, message, client_address, future):
+        '''
+        Assigns a sequence number to a message and transmits it for the first time.
+
+        Messages larger than `max_datagram_size` are split into fragments, which are always sent together.
+        The message is serialized before its sequence number is taken from the window, so a message
+        that can't be serialized never holds a slot that nothing would release; its future resolves
+        to False instead.
+
+        Args:
+            message (Packet): The packet to be sent.
+            client_address (tuple): The address of the client to send the packet to.
+            future (asyncio.Future): Future completed when the message is acknowledged or given up.
+        '''
+        # Number the message with the next sequence number of this peer, allocated once it is serialized
+        window = self.get_peer(client_address)["window"]
+        message.sequence_number = window.next_sequence_number
+        message.ack_number = window.base()
+        try:
+            datagrams = fragment(message.serialize(), message.sequence_number, self.max_datagram_size)
+        except Exception as e:
+            log(f"Couldn't serialize message to {client_address}: {e}", "ERROR")
+            future.set_result(False)
+            return
+        window.allocate()
+
+        self.sent_packets[(client_address, message.sequence_number)] = {
+            "message": message,
+            "datagrams": datagrams,
+            "client_address": client_address,
+            "future": future,
+            "retries": 0,
+            "sent_at": None,
+            "rto": None,
+            "timer": None
+        }
+        self.retransmit(client_address, message.sequence_number)
+
+    def retransmit(self, client_address, sequence_number):
+        '''
+        (Re)transmits an unacknowledged packet and schedules the next retransmission.
+
+        Called by a loop timer after the peer's current RTO until the packet is acknowledged or
+        `max_retries` attempts were made. Every timeout doubles the peer's RTO until a new RTT
+        sample is taken.
+
+        Args:
+            client_address (tuple): The address of the peer.
+            sequence_number (int): The sequence number of the packet.
+        '''
+        entry = self.sent_packets.get((client_address, sequence_number))
+        if entry is None or not self.is_running:
+            return
+
+        rtt = self.get_peer(client_address)["rtt"]
+        if entry["retries"] > 0 and entry["rto"] >= rtt.rto:
+            # Several packets sent with the same RTO may time out together; back off only once
+            rtt.backoff()
+
+        if entry["retries"] >= self.max_retries:
+            # Retries exhausted, clean up
+            log(f"Failed to deliver message with sequence {sequence_number} after {self.max_retries} attempts.")
+            entry["timer"] = None
+            self.complete(client_address, sequence_number, False)
+            return
+
+        if entry["retries"] > 0:
+            log(f"No ACK received for sequence {sequence_number}, retrying... ({entry['retries']}/{self.max_retries})")
+
+        for datagram in entry["datagrams"]:
+            self.transport.sendto(datagram, entry["client_address"])
+        entry["retries"] += 1
+        entry["sent_at"] = self.loop.time()
+        entry["rto"] = rtt.rto
+        log(f"Sent message to {entry['client_address']} with sequence {sequence_number}, packet_type: {entry['message'].packet_type}, fragments: {len(entry['datagrams'])}. Attempt {entry['retries']}")
+        entry["timer"] = self.loop.call_later(rtt.rto, self.retransmit, client_address, sequence_number)
+
+    def rtt_estimates(self):
+        '''
+        Returns the RTT estimates kept for every peer, for monitoring.
+
+        Returns:
+            dict: Map client_address -> smoothed RTT, RTT variance, RTO, samples and backoffs.
+        '''
+        return {client_address: peer["rtt"].snapshot() for client_address, peer in self.peers.items()}
+
+    def touch(self, client_address):
+        '''
+        Marks a peer as active, evicting the least recently active peers if there are more than `max_sessions`.
+
+        Args:
+            client_address (tuple): The address of the peer.
+        '''
+        # Reinserted so the dict stays ordered from least to most recently active
+        self.last_active.pop(client_address, None)
+        self.last_active[client_address] = self.loop.time()
+        while len(self.last_active) > self.max_sessions:
+            evicted_address = next(iter(self.last_active))
+            log(f"Too many sessions, evicting the least recently active one of {evicted_address}.")
+            self.forget(evicted_address)
+            self.lru_evictions += 1
+
+    def forget(self, client_address):
+        '''
+        Drops every state kept for a peer: its timers are cancelled, its queue task stopped and
+        its unacknowledged messages are given up on.
+
+        Args:
+            client_address (tuple): The address of the peer.
+        '''
+        self.last_active.pop(client_address, None)
+
+        client_data = self.client_queues.pop(client_address, None)
+        if client_data:
+            client_data["task"].cancel()
+            if client_data["ack_timer"]:
+                client_data["ack_timer"].cancel()
+
+        futures = []
+        peer = self.peers.pop(client_address, None)
+        if peer:
+            for sequence_number in peer["window"].unacked:
+                entry = self.sent_packets.pop((client_address, sequence_number), None)
+                if entry:
+                    if entry["timer"]:
+                        entry["timer"].cancel()
+                    futures.append(entry["future"])
+            futures.extend(future for _, future in peer["pending"])
+
+        for future in futures:
+            if not future.done():
+                future.set_result(False)
+
+    def evict_idle_sessions(self):
+        '''
+        Forgets the peers that were silent for longer than `session_idle_timeout`. Runs every
+        half timeout, for as long as the server runs, even if forgetting a peer fails.
+        '''
+        if not self.is_running:
+            return
+
+        try:
+            deadline = self.loop.time() - self.session_idle_timeout
+            while self.last_active:
+                client_address, last_active = next(iter(self.last_active.items()))
+                if last_active >= deadline:
+                    break
+                log(f"Evicting idle session of {client_address}.")
+                self.forget(client_address)
+                self.idle_evictions += 1
+        finally:
+            self.eviction_timer = self.loop.call_later(self.session_idle_timeout / 2, self.evict_idle_sessions)
+
+    def session_memory(self):
+        '''
+        Returns the memory held for every peer, for monitoring.
+
+        Returns:
+            dict: Map client_address -> estimated bytes held for the peer, seconds since it was
+            last active, and the number of packets in flight, waiting for room and buffered out of order.
+        '''
+        now = self.loop.time()
+        memory = {}
+        for client_address, last_active in self.last_active.items():
+            peer = self.peers.get(client_address)
+            client_data = self.client_queues.get(client_address)
+            sent = [
+                self.sent_packets[(client_address, sequence_number)]
+                for sequence_number in (peer["window"].unacked if peer else ())
+                if (client_address, sequence_number) in self.sent_packets
+            ]
+            # Loop handles, tasks and futures reference the whole server, so only the transport state is measured
+            state = [
+                peer and {key: value for key, value in peer.items() if key != "pending"},
+                peer and [message for message, _ in peer["pending"]],
+                client_data and [client_data["reorder"], client_data["receive_window"]],
+                [(entry["message"], entry["datagrams"]) for entry in sent]
+            ]
+            memory[client_address] = {
+                "bytes": deep_sizeof(state),
+                "idle": now - last_active,
+                "in_flight": len(sent),
+                "pending": len(peer["pending"]) if peer else 0,
+                "buffered": client_data["reorder"].buffered() if client_data else 0
+            }
+        return memory
+
+    def get_peer(self, client_address):
+        '''
+        Returns the sending state kept for a peer, creating it if needed.
+
+        Args:
+            client_address (tuple): The address of the peer.
+
+        Returns:
+            dict: The peer's send window, RTT estimator, advertised window and the messages waiting for room.
+        '''
+        if client_address not in self.peers:
+            self.peers[client_address] = {
+                "window": SendWindow(self.window_size, random.randrange(SEQUENCE_SPACE)),
+                "rtt": RTTEstimator(self.retransmission_timeout, self.min_retransmission_timeout, self.max_retransmission_timeout),
+                "send_limit": None,  # Sequence number the peer's advertised window ends at
+                "peer_ack": None,  # ACK number of the latest ACK from the peer
+                "pending": []
+            }
+        return self.peers[client_address]
+
+    def flush_pending(self, client_address):
+        '''
+        Transmits held back messages for a peer while its window has room.
+
+        Args:
+            client_address (tuple): The address of the peer.
+        '''
+        peer = self.get_peer(client_address)
+        while peer["pending"] and self.can_transmit(peer):
+            message, future = peer["pending"].pop(0)
+            self.transmit_new(message, client_address, future)
+
+    def can_transmit(self, peer):
+        '''
+        Checks whether a new packet fits in both the send window and the window advertised by the peer.
+
+        A packet is always allowed when nothing is in flight, as a probe for the current window.
+
+        Args:
+            peer (dict): The peer's sending state.
+
+        Returns:
+            bool: True if a new packet can be transmitted.
+        '''
+        window = peer["window"]
+        if not window.can_send():
+            return False
+        if window.in_flight() == 0 or peer["send_limit"] is None:
+            return True
+        return seq_lt(window.next_sequence_number, peer["send_limit"])
+
+    def add_to_client_queue(self, packet, client_address):
+        '''
+        Adds a received packet to the client's reorder buffer and acknowledges it.
+
+        Packets that are in sequence move on to the client's queue, where a task delivers them
+        to the handler in order. ACKs are delayed and coalesced the same way as in UDPServer, and
+        new packets count against the client's receive window until the handler is done with them.
+
+        Args:
+            packet (Packet): The received packet to be added to the queue.
+            client_address (tuple): The address of the client sending the packet.
+        '''
+        if client_address not in self.client_queues:
+            client_queue = asyncio.Queue()
+            self.client_queues[client_address] = {
+                "reorder": ReorderBuffer(self.window_size, None),
+                "queue": client_queue,
+                "task": self.loop.create_task(self.process_client_queue(client_address, client_queue)),
+                "receive_window": ReceiveWindow(self.flow_control, self.drain_target),
+                "advertised": None,  # Window advertised in the latest ACK
+                "unacked": 0,
+                "ack_timer": None
+            }
+            log(f"Created queue for client {client_address}")
+
+        client_data = self.client_queues[client_address]
+
+        # Data packets carry the sender's window base in their ack number
+        log(f"Adding packet {packet.sequence_number} to queue for {client_address}")
+        status, packets = client_data["reorder"].push(packet.sequence_number, packet, packet.ack_number)
+        if status == ReorderBuffer.NEW:
+            client_data["receive_window"].received()
+
+        client_data["unacked"] += 1
+        if status == ReorderBuffer.NEW and client_data["reorder"].buffered() == 0 and client_data["unacked"] < self.ack_every:
+            if client_data["ack_timer"] is None:
+                client_data["ack_timer"] = self.loop.call_later(self.ack_delay, self.send_ack, client_address)
+        else:
+            self.send_ack(client_address)
+
+        if status == ReorderBuffer.DUPLICATE:
+            self.duplicates_suppressed += 1
+            log(f"Duplicate packet {packet.sequence_number} from {client_address}, not delivered.")
+        elif status == ReorderBuffer.LATE:
+            self.late_dropped += 1
+            log(f"Packet {packet.sequence_number} from {client_address} arrived after the sender gave up on it, not delivered.")
+
+        for ready_packet in packets:
+            client_data["queue"].put_nowait(ready_packet)
+
+    def send_ack(self, client_address, window_update=False):
+        '''
+        Sends the cumulative ACK of a client, with its current receive window, and resets its delayed ACK state.
+
+        ACKs are never retransmitted nor held back by flow control, they take the express lane (see `send_control`).
+
+        Args:
+            client_address (tuple): The address of the client.
+            window_update (bool, optional): Send the ACK even if no packet is waiting for one. Defaults to False.
+        '''
+        client_data = self.client_queues.get(client_address)
+        if client_data is None or (client_data["unacked"] == 0 and not window_update):
+            return
+
+        if client_data["ack_timer"]:
+            client_data["ack_timer"].cancel()
+            client_data["ack_timer"] = None
+        client_data["unacked"] = 0
+
+        if not self.is_running:
+            return
+        reorder = client_data["reorder"]
+        # Never more than the reorder buffer accepts
+        client_data["advertised"] = min(client_data["receive_window"].advertised(), reorder.window_size)
+        ack_packet = ACKPacket(0, reorder.expected_sequence_number, reorder.selective_acks(ACKPacket.SELECTIVE_ACK_BITS), client_data["advertised"])
+        self.send_control(ack_packet, client_address)
+
+    def send_control(self, packet, client_address):
+        '''
+        Sends a control packet (an ACK or a window update) on the express lane.
+
+        Control packets are never retransmitted nor held back by flow control or the send window.
+        The transport never blocks the loop, so they go straight to it.
+
+        Args:
+            packet (Packet): The control packet to send.
+            client_address (tuple): The address of the client.
+        '''
+        self.transport.sendto(packet.serialize(), client_address)
+        self.control_sent += 1
+
+    async def process_client_queue(self, client_address, client_queue):
+        '''
+        Delivers the packets of a client to the handler, in order.
+
+        If the handler returns an awaitable, the next packet is only delivered once it completes.
+        A packet the handler returns, such as a registration response, is sent back to the client.
+        The time the handler takes adapts the client's receive window, and if the last ACK closed
+        the window, a window update is sent as soon as it opens again.
+
+        Args:
+            client_address (tuple): The address of the client whose queue is being processed.
+            client_queue (asyncio.Queue): The client's packet queue.
+        '''
+        while True:
+            packet = await client_queue.get()
+            log(f"Processing packet {packet.sequence_number} for client {client_address}")
+            started = self.loop.time()
+            try:
+                result = self.handler(packet, client_address, self)
+                if inspect.isawaitable(result):
+                    result = await result
+                if result is not None:
+                    self.send_message(result, client_address)
+            except Exception as e:
+                log(f"Error handling packet from {client_address}: {e}", "ERROR")
+
+            client_data = self.client_queues.get(client_address)
+            if client_data is None:
+                # Evicted by the handler
+                return
+            client_data["receive_window"].handled(self.loop.time() - started)
+            if client_data["advertised"] == 0 and client_data["receive_window"].advertised() > 0:
+                log(f"Window opened for {client_address}, sending window update.")
+                self.send_ack(client_address, window_update=True)
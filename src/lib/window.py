@@ -0,0 +1,356 @@
+'''
+Sliding window helpers for the reliable UDP transport.
+
+Sequence numbers are 32-bit and live in a circular space of SEQUENCE_SPACE values, so every
+comparison between them is done on distances modulo that space (serial number arithmetic): a
+sequence number is "ahead" of another if it is less than half of the space away. For selective
+repeat to be unambiguous the window can never be larger than half of the sequence space.
+
+Classes:
+    - SendWindow:
+        Tracks the sequence numbers a sender has in flight for one peer and decides whether a
+        new packet fits in the window.
+
+    - ReorderBuffer:
+        Buffers packets received out of order for one peer, releases them in sequence and
+        remembers which of the latest ones were delivered, to suppress duplicates.
+
+    - ReceiveWindow:
+        Decides how many packets a peer may send (its credits), from how fast the handler drains them.
+'''
+
+SEQUENCE_SPACE = 2 ** 32
+MAX_WINDOW_SIZE = SEQUENCE_SPACE // 2
+
+def seq_add(sequence_number, n):
+    '''
+    Adds n to a sequence number, wrapping around the sequence space.
+
+    Args:
+        sequence_number (int): The sequence number.
+        n (int): The amount to add.
+
+    Returns:
+        int: The resulting sequence number.
+    '''
+    return (sequence_number + n) % SEQUENCE_SPACE
+
+def seq_distance(start, end):
+    '''
+    Returns how far `end` is ahead of `start` in the sequence space.
+
+    Args:
+        start (int): The starting sequence number.
+        end (int): The ending sequence number.
+
+    Returns:
+        int: The distance, between 0 and SEQUENCE_SPACE - 1.
+    '''
+    return (end - start) % SEQUENCE_SPACE
+
+def seq_lt(a, b):
+    '''
+    Checks whether sequence number `a` comes before `b`, taking wraparound into account.
+
+    Args:
+        a (int): The first sequence number.
+        b (int): The second sequence number.
+
+    Returns:
+        bool: True if `a` is strictly before `b`.
+    '''
+    return 0 < seq_distance(a, b) < MAX_WINDOW_SIZE
+
+def validate_window_size(window_size):
+    '''
+    Checks that a window size can be used with the sequence space.
+
+    Args:
+        window_size (int): The window size.
+
+    Raises:
+        ValueError: If the window is empty or larger than half of the sequence space.
+    '''
+    if window_size < 1 or window_size > MAX_WINDOW_SIZE:
+        raise ValueError(f"Window size must be between 1 and {MAX_WINDOW_SIZE}.")
+
+class SendWindow:
+    '''
+    Sender side of the sliding window for one peer.
+
+    Sequence numbers are handed out in order, so the oldest unacknowledged one (the window base)
+    is always the first key of `unacked`.
+    '''
+    def __init__(self, window_size, first_sequence=1):
+        '''
+        Initializes the send window.
+
+        Args:
+            window_size (int): Maximum distance between the window base and the next sequence number.
+            first_sequence (int, optional): First sequence number to use. Defaults to 1.
+        '''
+        validate_window_size(window_size)
+        self.window_size = window_size
+        self.next_sequence_number = first_sequence
+        self.unacked = {}
+
+    def base(self):
+        '''
+        Returns the oldest sequence number still in flight (or the next one, if none is).
+
+        Returns:
+            int: The window base.
+        '''
+        return next(iter(self.unacked), self.next_sequence_number)
+
+    def can_send(self):
+        '''
+        Checks whether a new packet fits in the window.
+
+        Returns:
+            bool: True if a new sequence number can be allocated.
+        '''
+        return seq_distance(self.base(), self.next_sequence_number) < self.window_size
+
+    def allocate(self):
+        '''
+        Allocates the next sequence number and marks it as in flight.
+
+        Returns:
+            int: The allocated sequence number.
+        '''
+        sequence_number = self.next_sequence_number
+        self.next_sequence_number = seq_add(sequence_number, 1)
+        self.unacked[sequence_number] = True
+        return sequence_number
+
+    def release(self, sequence_number):
+        '''
+        Removes a sequence number from the window, once it is acknowledged or given up on.
+
+        Args:
+            sequence_number (int): The sequence number to release.
+        '''
+        self.unacked.pop(sequence_number, None)
+
+    def in_flight(self):
+        '''
+        Returns the number of unacknowledged packets.
+
+        Returns:
+            int: The number of packets in flight.
+        '''
+        return len(self.unacked)
+
+class ReorderBuffer:
+    '''
+    Receiver side of the sliding window for one peer.
+
+    Packets are released strictly in sequence. Packets ahead of the expected sequence number
+    are buffered until the gap is filled. Packets behind it are never released again: a bitmap
+    of the last `history_size` sequence numbers tells duplicates of delivered packets apart from
+    late packets the sender already gave up on. Anything older than the history is a duplicate.
+
+    Without a first sequence number, the buffer starts at the window base of the first packet,
+    which lets a receiver that forgot a peer pick up where the peer is. A window base further
+    behind than the history means the peer started over, e.g. after forgetting this receiver
+    and picking a new initial sequence number, so the buffer starts over as well.
+    '''
+    NEW = "new"
+    DUPLICATE = "duplicate"
+    LATE = "late"
+    OUT_OF_WINDOW = "out_of_window"
+
+    def __init__(self, window_size, first_sequence=1, history_size=1024):
+        '''
+        Initializes the reorder buffer.
+
+        Args:
+            window_size (int): Number of sequence numbers accepted ahead of the expected one.
+            first_sequence (int, optional): First sequence number expected, None to start at the first packet's window base. Defaults to 1.
+            history_size (int, optional): Number of sequence numbers behind the expected one that are remembered. Defaults to 1024.
+        '''
+        validate_window_size(window_size)
+        self.window_size = window_size
+        self.expected_sequence_number = first_sequence
+        self.packets = {}
+        # A sender's window base is never more than a window behind
+        self.history_size = max(history_size, window_size)
+        # Bit i is set if sequence number `expected_sequence_number - 1 - i` was delivered
+        self.history = 0
+        self.duplicates = 0
+        self.late = 0
+
+    def push(self, sequence_number, packet, window_base=None):
+        '''
+        Adds a received packet to the buffer.
+
+        If the sender's window base is ahead of the expected sequence number, the sender gave up
+        on the packets in between, so the buffer skips them instead of waiting forever. If it is
+        further behind than the history, the sender started over and so does the buffer.
+
+        Args:
+            sequence_number (int): The sequence number of the packet.
+            packet (Packet): The received packet.
+            window_base (int, optional): Oldest sequence number the sender still retransmits.
+
+        Returns:
+            tuple: (status, ready), where status is NEW, DUPLICATE, LATE or OUT_OF_WINDOW and
+            ready is the list of packets that can now be delivered, in order.
+        '''
+        ready = []
+
+        if window_base is None:
+            window_base = self.expected_sequence_number if self.expected_sequence_number is not None else sequence_number
+        if self.expected_sequence_number is None or (
+            seq_lt(window_base, self.expected_sequence_number)
+            and seq_distance(window_base, self.expected_sequence_number) > self.history_size
+        ):
+            self.expected_sequence_number = window_base
+            self.packets.clear()
+            self.history = 0
+
+        if seq_lt(self.expected_sequence_number, window_base):
+            # Release what was buffered before the new base, in order, and jump to it
+            skipped = [
+                seq for seq in self.packets
+                if seq_lt(seq, window_base)
+            ]
+            skipped.sort(key=lambda seq: seq_distance(self.expected_sequence_number, seq))
+            for seq in skipped:
+                ready.append(self.packets.pop(seq))
+            distance = seq_distance(self.expected_sequence_number, window_base)
+            self.history = self.history << distance if distance < self.history_size else 0
+            self.expected_sequence_number = window_base
+            for seq in skipped:
+                self.remember(seq)
+
+        if seq_distance(self.expected_sequence_number, sequence_number) >= self.window_size:
+            if seq_lt(sequence_number, self.expected_sequence_number):
+                offset = seq_distance(sequence_number, self.expected_sequence_number) - 1
+                if offset >= self.history_size or self.history >> offset & 1:
+                    status = ReorderBuffer.DUPLICATE
+                else:
+                    status = ReorderBuffer.LATE
+            else:
+                status = ReorderBuffer.OUT_OF_WINDOW
+        elif sequence_number in self.packets:
+            status = ReorderBuffer.DUPLICATE
+        else:
+            status = ReorderBuffer.NEW
+            self.packets[sequence_number] = packet
+
+        while self.expected_sequence_number in self.packets:
+            ready.append(self.packets.pop(self.expected_sequence_number))
+            self.expected_sequence_number = seq_add(self.expected_sequence_number, 1)
+            self.history = self.history << 1 | 1
+        self.history &= (1 << self.history_size) - 1
+
+        if status == ReorderBuffer.DUPLICATE:
+            self.duplicates += 1
+        elif status == ReorderBuffer.LATE:
+            self.late += 1
+        return status, ready
+
+    def remember(self, sequence_number):
+        '''
+        Marks a sequence number behind the expected one as delivered.
+
+        Args:
+            sequence_number (int): The delivered sequence number.
+        '''
+        offset = seq_distance(sequence_number, self.expected_sequence_number) - 1
+        if offset < self.history_size:
+            self.history |= 1 << offset
+
+    def selective_acks(self, bits=64):
+        '''
+        Returns a bitmap of the buffered packets, relative to the expected sequence number.
+
+        Bit i is set if sequence number `expected_sequence_number + 1 + i` was received.
+
+        Args:
+            bits (int, optional): Size of the bitmap. Defaults to 64.
+
+        Returns:
+            int: The selective ACK bitmap.
+        '''
+        bitmap = 0
+        for sequence_number in self.packets:
+            distance = seq_distance(self.expected_sequence_number, sequence_number)
+            if 0 < distance <= bits:
+                bitmap |= 1 << (distance - 1)
+        return bitmap
+
+    def buffered(self):
+        '''
+        Returns the number of packets waiting for a gap to be filled.
+
+        Returns:
+            int: The number of buffered packets.
+        '''
+        return len(self.packets)
+
+class ReceiveWindow:
+    '''
+    Receive window advertised to one peer, in packets.
+
+    The window is the number of packets the handler can drain within `drain_target` seconds,
+    measured with a moving average of the time it spends on each packet, bounded by
+    `max_window`. Packets received but not handled yet (the backlog) use up part of it, so
+    the advertised window shrinks smoothly as the backlog grows, instead of going from
+    "send everything" to "stop" at a fixed threshold.
+    '''
+    ALPHA = 1 / 8
+
+    def __init__(self, max_window, drain_target=0.05):
+        '''
+        Initializes the receive window.
+
+        Args:
+            max_window (int): Largest window ever advertised.
+            drain_target (float, optional): How long the handler may take to drain a full window, in seconds. Defaults to 0.05.
+        '''
+        self.max_window = max_window
+        self.drain_target = drain_target
+        self.service_time = None
+        self.backlog = 0
+
+    def received(self):
+        '''
+        Counts a packet accepted from the peer and not handled yet.
+        '''
+        self.backlog += 1
+
+    def handled(self, service_time):
+        '''
+        Counts a packet handed to the handler and updates the drain rate.
+
+        Args:
+            service_time (float): Time the handler spent on the packet, in seconds.
+        '''
+        self.backlog = max(self.backlog - 1, 0)
+        if self.service_time is None:
+            self.service_time = service_time
+        else:
+            self.service_time += ReceiveWindow.ALPHA * (service_time - self.service_time)
+
+    def capacity(self):
+        '''
+        Returns the number of packets the handler can drain within the target time.
+
+        Returns:
+            int: The window size, between 1 and `max_window`.
+        '''
+        if not self.service_time:
+            return self.max_window
+        return max(1, min(self.max_window, int(self.drain_target / self.service_time)))
+
+    def advertised(self):
+        '''
+        Returns the number of packets the peer may send beyond the ones already acknowledged.
+
+        Returns:
+            int: The credits left, 0 if the backlog fills the window.
+        '''
+        return max(self.capacity() - self.backlog, 0)
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+
+from lib.logging import log
+
+
+class WorkerPool:
+    '''
+    A bounded pool of worker threads with per-key ordering.
+
+    Every submitted job carries a key (e.g. a client address). Jobs with the same key are
+    always routed to the same worker, so they run one after the other in submission order,
+    while jobs for different keys run in parallel across the pool.
+    '''
+    def __init__(self, num_workers=4, max_queue_size=1024, name="worker"):
+        '''
+        Initializes the worker pool.
+
+        Args:
+            num_workers (int, optional): Number of worker threads. Defaults to 4.
+            max_queue_size (int, optional): Maximum number of pending jobs per worker. Defaults to 1024.
+            name (str, optional): Prefix used for the worker thread names. Defaults to "worker".
+        '''
+        if num_workers < 1:
+            raise ValueError("A worker pool needs at least one worker.")
+
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.name = name
+        self.queues = [queue.Queue(maxsize=max_queue_size) for _ in range(num_workers)]
+        self.threads = []
+        self.is_running = False
+        self.lock = threading.Lock()
+        self.busy_workers = 0
+        self.busy_time = 0.0
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.started_at = None
+
+    def start(self):
+        '''
+        Starts the worker threads.
+        '''
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.started_at = time.monotonic()
+        for index, jobs in enumerate(self.queues):
+            thread = threading.Thread(
+                target=self.worker_loop,
+                args=(jobs,),
+                name=f"{self.name}-{index}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        '''
+        Stops the worker threads once they finish their current job.
+        '''
+        self.is_running = False
+        for jobs in self.queues:
+            try:
+                jobs.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def submit(self, key, function, *args):
+        '''
+        Submits a job to the worker responsible for the given key.
+
+        The job is dropped if that worker's queue is full, so a slow handler can never make
+        the caller block.
+
+        Args:
+            key (hashable): Ordering key; jobs with the same key run sequentially.
+            function (callable): The function to run.
+            *args: Arguments passed to the function.
+
+        Returns:
+            bool: True if the job was queued, False if it was dropped.
+        '''
+        jobs = self.queues[hash(key) % self.num_workers]
+        try:
+            jobs.put_nowait((function, args))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    def has_room(self, key):
+        '''
+        Tells whether the worker responsible for the given key can take one more job.
+
+        Args:
+            key (hashable): Ordering key of the job.
+
+        Returns:
+            bool: True if its queue isn't full, so that submitting from the only submitting thread won't drop the job.
+        '''
+        return not self.queues[hash(key) % self.num_workers].full()
+
+    def worker_loop(self, jobs):
+        '''
+        Runs jobs from a worker queue until the pool is stopped.
+
+        Args:
+            jobs (queue.Queue): The queue owned by this worker.
+        '''
+        while self.is_running:
+            job = jobs.get()
+            if job is None:
+                break
+
+            function, args = job
+            with self.lock:
+                self.busy_workers += 1
+            started = time.monotonic()
+            try:
+                function(*args)
+            except Exception as e:
+                log(f"Error running job in {threading.current_thread().name}: {e}", "ERROR")
+                with self.lock:
+                    self.failed += 1
+            finally:
+                with self.lock:
+                    self.busy_workers -= 1
+                    self.busy_time += time.monotonic() - started
+                    self.completed += 1
+
+    def stats(self):
+        '''
+        Returns counters describing the state of the pool.
+
+        Returns:
+            dict: Queue depth (total and per worker), busy workers, utilisation (share of
+            worker time spent running jobs since start) and job counters.
+        '''
+        queue_depths = [jobs.qsize() for jobs in self.queues]
+        with self.lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+            utilisation = self.busy_time / (elapsed * self.num_workers) if elapsed > 0 else 0.0
+            return {
+                "workers": self.num_workers,
+                "busy_workers": self.busy_workers,
+                "utilisation": min(utilisation, 1.0),
+                "queue_depth": sum(queue_depths),
+                "queue_depths": queue_depths,
+                "max_queue_size": self.max_queue_size,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
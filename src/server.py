@@ -1,33 +1,43 @@
+import asyncio
 import threading
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from time import localtime
 import time
 
 from lib.packets import (
-    ACKPacket,
     AgentRegistrationStatus,
     Packet,
     PacketType,
+    RegisterAgentPacket,
     RegisterAgentPacketResponse,
     TaskPacket
 )
 from lib.udp import UDPServer
+from lib.udp_async import AsyncUDPServer
 from server.agents_manager import AgentManager
-from server.database import insert_metrics, setup_database, insert_alert
+from server.alert_writer import AlertWriter
+from server.cluster import IngestCluster
+from server.database import insert_metrics, insert_metrics_batch, setup_database
 from server.task_json import load_tasks_json
+from lib.checksum import set_checksum_algorithm
+from lib.compression import negotiate
 from lib.logging import log
-from lib.tcp import AlertMessage, TCPServer
+from lib.tcp import TCPServer
 
 agent_manager = AgentManager()
 all_agents_registered = threading.Condition()
 required_agents = set()
 db_path = None
+alert_writer = None
+# Stores metrics for the asyncio transport, one write at a time, off the event loop
+database_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
 
 def server_packet_handler(message, client_address, server):
     '''
     Handles incoming packets from the UDP server.
 
-    If the packet is an ACK, it logs the acknowledgment. For registration packets,
+    Packets are acknowledged by the UDP server itself. For registration packets,
     it attempts to register the agent. For metrics packets, it processes and stores metrics.
 
     Args:
@@ -38,18 +48,35 @@ def server_packet_handler(message, client_address, server):
     Returns:
         RegisterAgentPacketResponse or None: A response packet for agent registration or None.
     '''
-    if message.ack_number != 0:
-        log(f"ACK received for sequence {message.ack_number} from {client_address}.")
-        return
-    ack_packet = ACKPacket(message.sequence_number, message.sequence_number)
-    server.send_message(ack_packet, client_address)
-
     if message.packet_type == PacketType.RegisterAgent:
         return handle_register_agent(message, client_address)
     elif message.packet_type == PacketType.Metrics:
         return handle_metrics(message, client_address)
+    elif message.packet_type == PacketType.MetricsBatch:
+        return handle_metrics_batch(message, client_address)
     return None
 
+async def server_packet_handler_async(message, client_address, server):
+    '''
+    Handles incoming packets from the asyncio UDP server.
+
+    Same as `server_packet_handler`, except that metrics are stored on a database thread, so the
+    SQLite writes never block the event loop, and with it the ACKs, delayed ACK timers and
+    retransmissions of every session. The server waits for the write before delivering the
+    client's next packet, so packets of a client are still handled in order.
+
+    Args:
+        message (Packet): The incoming packet object.
+        client_address : The address of the client sending the packet.
+        server (AsyncUDPServer): The asyncio UDP server instance.
+
+    Returns:
+        RegisterAgentPacketResponse or None: A response packet for agent registration or None.
+    '''
+    if message.packet_type in (PacketType.Metrics, PacketType.MetricsBatch):
+        return await asyncio.get_running_loop().run_in_executor(database_executor, server_packet_handler, message, client_address, server)
+    return server_packet_handler(message, client_address, server)
+
 def handle_metrics(message, client_address):
     '''
     Processes metrics packets sent by agents.
@@ -73,12 +100,40 @@ def handle_metrics(message, client_address):
         return None
     return None
 
+def handle_metrics_batch(message, client_address):
+    '''
+    Processes batches of metrics sent by agents.
+
+    Stores every sample from a registered agent in the database with a single write.
+
+    Args:
+        message (Packet): The metrics batch packet containing the samples.
+        client_address (tuple): The address of the agent sending the metrics.
+
+    Returns:
+        None.
+    '''
+    global db_path
+
+    rows = [
+        (sample.task_id, sample.device_id, sample.bandwidth, sample.jitter, sample.loss, sample.latency, time.strftime('%Y-%m-%d %H:%M:%S', localtime(sample.timestamp)))
+        for sample in message.samples
+        if sample.device_id in agent_manager.agent_ids
+    ]
+    if rows:
+        log(f"Metrics batch of {len(rows)} samples received from {client_address}.")
+
+        # Store metrics in the database
+        insert_metrics_batch(db_path, rows)
+    return None
+
 def handle_register_agent(message, client_address):
     '''
     Registers an agent with the server.
 
     If the agent is successfully registered, it updates the set of required agents
-    and notifies any waiting threads.
+    and notifies any waiting threads. The response carries the compression method
+    negotiated from the capabilities the agent offered.
 
     Args:
         message (Packet): The registration packet.
@@ -88,7 +143,8 @@ def handle_register_agent(message, client_address):
         RegisterAgentPacketResponse: The response packet indicating registration success or failure.
     '''
     agent_id = message.agent_id
-    if agent_manager.register_agent(agent_id, client_address):
+    compression = negotiate(message.capabilities)
+    if agent_manager.register_agent(agent_id, client_address, compression):
         log(f"Agent {agent_id} registered.")
 
         # Check if all required agents are registered
@@ -97,64 +153,52 @@ def handle_register_agent(message, client_address):
             if not required_agents:  # All agents are registered
                 all_agents_registered.notify_all()
 
-        return RegisterAgentPacketResponse(AgentRegistrationStatus.Success)
+        return RegisterAgentPacketResponse(AgentRegistrationStatus.Success, compression=compression)
 
     return RegisterAgentPacketResponse(AgentRegistrationStatus.AlreadyRegistered)
 
-def handle_agent_alert(client_socket, client_address):
+def handle_alert(alert_message, client_address):
     '''
-    Processes an alert received from an agent.
+    Handles an alert message from an agent.
 
-    Logs the alert and inserts it into the database.
+    Logs the alert and queues it to be stored in the database with the next batch.
 
     Args:
         alert_message (AlertMessage): The alert message containing alert details.
-        client_address (tuple): The address of the agent sending the alert.
+        client_address: The address of the agent sending the alert.
 
     Returns:
         None.
     '''
-    try:
-        # Receives the message
-        data = client_socket.recv(1024)
-        if not data:
-            log(f"Empty message from {client_address}.")
-            return
-
-        # Deserializes the message
-        alert_message = AlertMessage.deserialize(data)
+    log(f"Received alert from {client_address}.")
 
-        # Calls the alert handler
-        handle_alert(alert_message, client_address)
+    alert_writer.add(alert_message.task_id, alert_message.device_id, alert_message.alert_type.name, alert_message.details, time.strftime('%Y-%m-%d %H:%M:%S', localtime(alert_message.timestamp)))
 
-    except Exception as e:
-        log(f"Error handling client {client_address}: {e}.")
-    finally:
-        client_socket.close()
 
-def handle_alert(alert_message, client_address):
+def group_tasks_by_device(tasks):
     '''
-    Handles an alert message from an agent.
-
-    Logs the alert and stores it in the database.
+    Groups tasks by the devices they must run on.
 
     Args:
-        alert_message (AlertMessage): The alert message containing alert details.
-        client_address: The address of the agent sending the alert.
+        tasks (list): A list of tasks to be distributed.
 
     Returns:
-        None.
+        dict: Map device_id -> list of tasks for that device.
     '''
-    log(f"Received alert from {client_address}.")
+    device_tasks = {}
 
-    insert_alert(db_path, alert_message.task_id, alert_message.device_id, alert_message.alert_type.name, alert_message.details,  time.strftime('%Y-%m-%d %H:%M:%S', localtime(alert_message.timestamp)))
+    for task in tasks:
+        for device in task.devices:
+            device_tasks.setdefault(device.device_id, []).append(task)
 
+    return device_tasks
 
 def distribute_tasks_to_agents(server, tasks):
     '''
     Distributes monitoring tasks to registered agents.
 
-    Groups tasks by device and sends them to the respective agents.
+    Groups tasks by device, sends the tasks of every agent at once and waits for all of them
+    to be acknowledged.
 
     Args:
         server (UDPServer): The UDP server instance.
@@ -163,23 +207,133 @@ def distribute_tasks_to_agents(server, tasks):
     Returns:
         None.
     '''
-    device_tasks = {}
-
-    # Group tasks by device
-    for task in tasks:
-        for device in task.devices:
-            device_tasks.setdefault(device.device_id, []).append(task)
+    device_tasks = group_tasks_by_device(tasks)
+    sends = {}
 
     # Send tasks to each agent
     for device in device_tasks:
         agent_address = agent_manager.get_agent_by_id(device)
         if agent_address:
-            task_packet = TaskPacket(device_tasks[device], None, None)
-            server.send_message(task_packet, agent_address)
+            task_packet = TaskPacket(device_tasks[device], None, None, agent_manager.get_compression(device))
+            sends[device] = server.send_message_nowait(task_packet, agent_address)
+
+    for device, future in sends.items():
+        if future.result():
             log(f"Tasks sent to agent with ID {device}.")
-            # Received ack:
-            server_packet_handler(ACKPacket(0, task_packet.sequence_number), agent_address, server)
+        else:
             # here we need to be careful when the task isn't send to the agent, we need to resend it
+            log(f"Couldn't deliver tasks to agent with ID {device}.", "ERROR")
+
+async def distribute_tasks_to_agents_async(server, tasks):
+    '''
+    Distributes monitoring tasks to registered agents over the asyncio transport.
+
+    Sends the tasks of every agent at once and waits for all of them to be acknowledged.
+
+    Args:
+        server (AsyncUDPServer): The asyncio UDP server instance.
+        tasks (list): A list of tasks to be distributed.
+
+    Returns:
+        None.
+    '''
+    device_tasks = group_tasks_by_device(tasks)
+    sends = {}
+
+    for device in device_tasks:
+        agent_address = agent_manager.get_agent_by_id(device)
+        if agent_address:
+            sends[device] = server.send_message(TaskPacket(device_tasks[device], None, None, agent_manager.get_compression(device)), agent_address)
+
+    results = await asyncio.gather(*sends.values())
+    for device, delivered in zip(sends, results):
+        if delivered:
+            log(f"Tasks sent to agent with ID {device}.")
+        else:
+            log(f"Couldn't deliver tasks to agent with ID {device}.", "ERROR")
+
+def wait_for_all_agents():
+    '''
+    Blocks until every agent required by the tasks has registered.
+
+    Returns:
+        None.
+    '''
+    with all_agents_registered:
+        all_agents_registered.wait_for(lambda: not required_agents)
+
+async def run_udp_server_async(tasks):
+    '''
+    Runs the UDP side of the server on a single event loop.
+
+    Waits for all agents to register before distributing tasks, then keeps serving.
+
+    Args:
+        tasks (list): A list of tasks to be distributed.
+
+    Returns:
+        None.
+    '''
+    udp_server = AsyncUDPServer("0.0.0.0", 8080, server_packet_handler_async)
+    await udp_server.start()
+
+    # Wait for all required agents to be registered
+    await asyncio.get_running_loop().run_in_executor(None, wait_for_all_agents)
+
+    # Distribute tasks to agents
+    await distribute_tasks_to_agents_async(udp_server, tasks)
+
+    await udp_server.serve_forever()
+
+def run_udp_cluster(tasks, workers, checksum_algorithm=None):
+    '''
+    Runs the UDP side of the server on several ingest worker processes sharing the port.
+
+    This process acts as the coordinator: it registers the agents the workers forward to it,
+    waits for all of them before distributing tasks through the workers that own them, and
+    keeps serving until interrupted.
+
+    Args:
+        tasks (list): A list of tasks to be distributed.
+        workers (int): Number of ingest worker processes.
+        checksum_algorithm (str, optional): Name of the algorithm of the checksums the workers produce. Defaults to CRC32.
+
+    Returns:
+        None.
+    '''
+    cluster = IngestCluster(workers, "0.0.0.0", 8080, db_path, checksum_algorithm=checksum_algorithm)
+    cluster.start()
+    distributed = False
+
+    try:
+        while True:
+            event = cluster.next_event()
+
+            if event[0] == "register":
+                _, worker, agent_id, client_address, capabilities = event
+                response = handle_register_agent(RegisterAgentPacket(agent_id, capabilities=capabilities), client_address)
+                if response.agent_registration_status == AgentRegistrationStatus.Success:
+                    cluster.confirm_registration(worker, agent_id)
+                cluster.respond(worker, client_address, response)
+
+                # Distribute tasks to agents once all required agents are registered
+                if not required_agents and not distributed:
+                    distributed = True
+                    for device, device_tasks in group_tasks_by_device(tasks).items():
+                        agent_address = agent_manager.get_agent_by_id(device)
+                        if agent_address:
+                            cluster.send_tasks(device, agent_address, device_tasks, agent_manager.get_compression(device))
+
+            elif event[0] == "delivered":
+                _, device, delivered = event
+                if delivered:
+                    log(f"Tasks sent to agent with ID {device}.")
+                else:
+                    log(f"Couldn't deliver tasks to agent with ID {device}.", "ERROR")
+    except KeyboardInterrupt:
+        log("Server interrupted manually. Stopping.", "INFO")
+    finally:
+        cluster.stop()
 
 def main():
     '''
@@ -188,21 +342,55 @@ def main():
     Sets up the database, loads tasks, starts the TCP and UDP servers, and
     waits for all agents to register before distributing tasks.
 
+    Command-line arguments:
+        <tasks-json-file>: The JSON file with the tasks to distribute.
+        <metrics-db-file>: The SQLite database where metrics and alerts are stored.
+        --asyncio: Run the UDP transport on an asyncio event loop.
+        --workers <n>: Receive UDP traffic on n worker processes sharing the port (SO_REUSEPORT).
+        --checksum <algorithm>: Checksum of the packets sent, crc32 (default), sha256-32 or sha256.
+
     Returns:
         None.
     '''
 
-    global db_path
+    global db_path, alert_writer
 
     log("Starting up NMS server.")
 
-    if len(sys.argv) != 3:
-        print("Usage: python " + sys.argv[0] + " <tasks-json-file> <metrics-db-file>")
+    usage = "Usage: python " + sys.argv[0] + " <tasks-json-file> <metrics-db-file> [--asyncio | --workers <n>] [--checksum <crc32|sha256-32|sha256>]"
+    use_asyncio = "--asyncio" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--asyncio"]
+
+    workers = None
+    if "--workers" in args:
+        index = args.index("--workers")
+        try:
+            workers = int(args[index + 1])
+        except (IndexError, ValueError):
+            workers = 0
+        if workers < 1 or use_asyncio:
+            print(usage)
+            sys.exit(1)
+        del args[index:index + 2]
+
+    checksum_algorithm = None
+    if "--checksum" in args:
+        index = args.index("--checksum")
+        try:
+            checksum_algorithm = args[index + 1]
+            set_checksum_algorithm(checksum_algorithm)
+        except (IndexError, KeyError):
+            print(usage)
+            sys.exit(1)
+        del args[index:index + 2]
+
+    if len(args) != 2:
+        print(usage)
         sys.exit(1)
 
-    tasks = load_tasks_json(sys.argv[1])
+    tasks = load_tasks_json(args[0])
 
-    db_path = sys.argv[2]
+    db_path = args[1]
     setup_database(db_path)
 
     # Store device IDs to check if all required agents are registered
@@ -210,22 +398,37 @@ def main():
         for device in task.devices:
             required_agents.add(device.device_id)
 
+    alert_writer = AlertWriter(db_path)
+    alert_writer.start()
+
     tcp_server = TCPServer("0.0.0.0", 9090, handle_alert)
     tcp_server_thread = threading.Thread(target=tcp_server.start, daemon=True)
     tcp_server_thread.start()
 
-    udp_server = UDPServer("0.0.0.0", 8080, server_packet_handler)
-    alert_task_thread = threading.Thread(target=udp_server.start, daemon=True)
-    alert_task_thread.start()
+    try:
+        if use_asyncio:
+            asyncio.run(run_udp_server_async(tasks))
+            return
+
+        if workers:
+            run_udp_cluster(tasks, workers, checksum_algorithm)
+            return
 
-    # Wait for all required agents to be registered
-    with all_agents_registered:
-        all_agents_registered.wait()
+        udp_server = UDPServer("0.0.0.0", 8080, server_packet_handler)
+        alert_task_thread = threading.Thread(target=udp_server.start, daemon=True)
+        alert_task_thread.start()
 
-    # Distribute tasks to agents
-    distribute_tasks_to_agents(udp_server, tasks)
+        # Wait for all required agents to be registered
+        wait_for_all_agents()
+
+        # Distribute tasks to agents
+        distribute_tasks_to_agents(udp_server, tasks)
 
-    alert_task_thread.join()
+        alert_task_thread.join()
+    finally:
+        # Store the alerts still queued
+        tcp_server.stop()
+        alert_writer.stop()
 
 if __name__ == "__main__":
     main()
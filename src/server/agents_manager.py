@@ -1,5 +1,7 @@
 import threading
 
+from lib.compression import Compression
+
 class AgentManager:
     '''
     Manages the registration and retrieval of agents in a thread-safe manner.
@@ -14,8 +16,9 @@ class AgentManager:
         self.agent_ids = set()
         self.lock = threading.Lock()
         self.agent_addresses = {}
+        self.agent_compressions = {}
 
-    def register_agent(self, agent_id, client_address):
+    def register_agent(self, agent_id, client_address, compression=Compression.NONE):
         '''
         Registers a new agent with the specified ID and client address.
 
@@ -25,6 +28,7 @@ class AgentManager:
         Args:
             agent_id (str): The unique identifier for the agent.
             client_address (tuple): The address of the client (IP and port).
+            compression (Compression, optional): The compression method negotiated with the agent. Defaults to NONE.
 
         Returns:
             bool: True if the agent was successfully registered, False if the agent
@@ -36,6 +40,7 @@ class AgentManager:
             else:
                 self.agent_ids.add(agent_id)
                 self.agent_addresses[agent_id] = client_address
+                self.agent_compressions[agent_id] = compression
                 return True
 
     def get_agents(self):
@@ -65,4 +70,17 @@ class AgentManager:
         '''
         with self.lock:
             return self.agent_addresses.get(agent_id)
-        
\ No newline at end of file
+        
+
+    def get_compression(self, agent_id):
+        '''
+        Retrieves the compression method negotiated with an agent.
+
+        Args:
+            agent_id (str): The unique identifier for the agent.
+
+        Returns:
+            Compression: The negotiated method, NONE if the agent ID does not exist.
+        '''
+        with self.lock:
+            return self.agent_compressions.get(agent_id, Compression.NONE)
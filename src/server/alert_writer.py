@@ -0,0 +1,163 @@
+'''
+Batched storage of the alerts received by the NMS server.
+
+Alert handlers only queue the rows of their alerts. A single writer thread drains the queue in
+batches, each stored with one executemany in one transaction, instead of one connection and one
+commit per alert. A batch is flushed once it is full, or `max_latency` after its first alert was
+taken from the queue, so an alert waits at most that long (plus the time of the write) before
+being stored.
+
+The queue is bounded: when the database falls behind, handlers block on it, which pauses the
+alert server's reads and lets TCP slow the agents down.
+'''
+import queue
+import threading
+import time
+
+from lib.logging import log
+from server.database import insert_alerts_batch
+
+class AlertWriter:
+    '''
+    Stores alerts in the database in batches, from a dedicated thread.
+    '''
+    def __init__(self, db_path, max_batch_size=256, max_latency=0.05, max_queue_size=10000):
+        '''
+        Initializes an AlertWriter.
+
+        Args:
+            db_path (str): The file path to the SQLite database.
+            max_batch_size (int, optional): Maximum number of alerts stored per transaction. Defaults to 256.
+            max_latency (float, optional): How long a batch waits for more alerts before being flushed, in seconds. Defaults to 0.05.
+            max_queue_size (int, optional): Maximum number of alerts waiting to be stored. Defaults to 10000.
+        '''
+        self.db_path = db_path
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.rows = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+        self.lock = threading.Lock()  # Guards the counters, read by stats() from other threads
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.flush_time = 0.0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def start(self):
+        '''
+        Starts the writer thread.
+        '''
+        self.thread = threading.Thread(target=self.run, name="alert-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        '''
+        Stores the alerts still queued and stops the writer thread.
+
+        Args:
+            timeout (float, optional): How long to wait for the last batches, in seconds. Defaults to 5.
+        '''
+        if self.thread is None:
+            return
+        self.rows.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+        stats = self.stats()
+        log(f"Alert writer stopped: {stats['written']} alerts stored in {stats['batches']} batches "
+            f"(mean {stats['batch_size']['mean']:.1f} alerts, {stats['flush_time']['mean'] * 1000:.1f} ms per batch).")
+
+    def add(self, task_id, device_id, alert_type, details, timestamp):
+        '''
+        Queues an alert to be stored, blocking while the queue is full.
+
+        Args:
+            task_id (str): The ID of the task associated with the alert.
+            device_id (str): The ID of the device generating the alert.
+            alert_type (str): The type of alert (e.g., high jitter, high packet loss).
+            details (str): Additional details about the alert.
+            timestamp (str): The timestamp of the alert record.
+        '''
+        self.rows.put((task_id, device_id, alert_type, details, timestamp))
+
+    def run(self):
+        '''
+        Drains the queue in batches until stopped.
+        '''
+        stopping = False
+        while not stopping:
+            row = self.rows.get()
+            if row is None:
+                break
+
+            batch = [row]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Take what is already queued without waiting, then wait until the deadline
+                    row = self.rows.get(timeout=remaining) if remaining > 0 else self.rows.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            self.flush(batch)
+
+    def flush(self, batch):
+        '''
+        Stores a batch of alerts in one transaction.
+
+        Args:
+            batch (list[tuple]): The rows of the alerts.
+        '''
+        started = time.perf_counter()
+        try:
+            insert_alerts_batch(self.db_path, batch)
+        except Exception as e:
+            log(f"Couldn't store {len(batch)} alerts: {e}", "ERROR")
+            with self.lock:
+                self.failed += len(batch)
+            return
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+            self.flush_time += elapsed
+            self.last_flush_time = elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+        log(f"Stored a batch of {len(batch)} alerts in {elapsed * 1000:.1f} ms.", "DEBUG")
+
+    def stats(self):
+        '''
+        Returns counters describing the work of the writer.
+
+        Returns:
+            dict: The number of alerts queued, stored and lost to failed writes, the number of
+            batches, and the last, largest and mean batch size and flush time (in seconds).
+        '''
+        with self.lock:
+            return {
+                "queued": self.rows.qsize(),
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "batch_size": {
+                    "last": self.last_batch_size,
+                    "max": self.max_batch_size_seen,
+                    "mean": self.written / self.batches if self.batches else 0.0
+                },
+                "flush_time": {
+                    "last": self.last_flush_time,
+                    "max": self.max_flush_time,
+                    "mean": self.flush_time / self.batches if self.batches else 0.0
+                }
+            }
@@ -0,0 +1,230 @@
+'''
+Multi-process UDP ingestion for the NMS server.
+
+Every ingest worker is a separate process running its own UDPServer on the same port, shared
+through SO_REUSEPORT, so metrics are decoded and stored on as many cores as there are workers.
+The kernel picks the worker of each datagram by hashing the sender's address, which gives
+session affinity: every packet of an agent, including its ACKs, reaches the same worker, which
+owns that agent's transport session.
+
+The coordinator (the main server process) owns the AgentManager state and task distribution.
+Since an agent's ACKs only ever reach its worker, the coordinator never talks to agents itself:
+workers forward registrations to it, and deliver tasks on its behalf.
+
+Messages between processes are tuples on multiprocessing queues:
+    - worker -> coordinator:
+        ("register", worker, agent_id, client_address, capabilities) when an agent registers.
+        ("delivered", agent_id, delivered) once tasks sent to an agent are acknowledged or given up on.
+    - coordinator -> worker:
+        ("registered", agent_id) to accept the metrics of a newly registered agent.
+        ("respond", agent_address, response) to answer a registration with its RegisterAgentResponse packet.
+        ("send_tasks", agent_id, agent_address, tasks, compression) to send tasks to an agent.
+        ("stop",) to shut the worker down.
+'''
+import multiprocessing
+import threading
+import time
+from time import localtime
+
+from lib.checksum import set_checksum_algorithm
+from lib.compression import Compression
+from lib.logging import log, set_log_level
+from lib.packets import PacketType, TaskPacket
+from lib.udp import UDPServer
+from server.database import insert_metrics_batch
+
+def metrics_rows(samples, agent_ids):
+    '''
+    Converts metrics samples into database rows, keeping only the ones of registered agents.
+
+    Args:
+        samples (list[MetricsPacket]): The received samples.
+        agent_ids (set): IDs of the registered agents.
+
+    Returns:
+        list[tuple]: Rows for `insert_metrics_batch`.
+    '''
+    return [
+        (sample.task_id, sample.device_id, sample.bandwidth, sample.jitter, sample.loss, sample.latency, time.strftime('%Y-%m-%d %H:%M:%S', localtime(sample.timestamp)))
+        for sample in samples
+        if sample.device_id in agent_ids
+    ]
+
+def run_ingest_worker(index, host, port, db_path, events, commands, log_level, checksum_algorithm):
+    '''
+    Entry point of an ingest worker process.
+
+    Receives the datagrams the kernel hands to this worker, stores metrics from agents the
+    coordinator registered, and runs the coordinator's commands until told to stop.
+
+    Args:
+        index (int): Index of the worker.
+        host (str): Address to bind to.
+        port (int): Port shared by every worker.
+        db_path (str): The file path to the SQLite database.
+        events (multiprocessing.Queue): Queue of events sent to the coordinator.
+        commands (multiprocessing.Queue): Queue of commands from the coordinator.
+        log_level (str or None): Minimum type of log printed by the worker, None to print every log.
+        checksum_algorithm (str or None): Name of the algorithm of the checksums the worker produces, None for the default.
+    '''
+    if log_level:
+        set_log_level(log_level)
+    if checksum_algorithm:
+        set_checksum_algorithm(checksum_algorithm)
+    agent_ids = set()
+
+    def handler(message, client_address, server):
+        if message.packet_type == PacketType.RegisterAgent:
+            events.put(("register", index, message.agent_id, client_address, message.capabilities))
+        elif message.packet_type == PacketType.Metrics:
+            rows = metrics_rows([message], agent_ids)
+            if rows:
+                insert_metrics_batch(db_path, rows)
+        elif message.packet_type == PacketType.MetricsBatch:
+            rows = metrics_rows(message.samples, agent_ids)
+            if rows:
+                log(f"Metrics batch of {len(rows)} samples received from {client_address}.")
+                insert_metrics_batch(db_path, rows)
+
+    udp_server = UDPServer(host, port, handler, reuse_port=True)
+    threading.Thread(target=udp_server.start, daemon=True).start()
+    log(f"Ingest worker {index} started.")
+
+    try:
+        while True:
+            command = commands.get()
+            if command[0] == "stop":
+                break
+            elif command[0] == "registered":
+                agent_ids.add(command[1])
+            elif command[0] == "respond":
+                _, agent_address, response = command
+                udp_server.send_message_nowait(response, agent_address)
+            elif command[0] == "send_tasks":
+                _, agent_id, agent_address, tasks, compression = command
+                future = udp_server.send_message_nowait(TaskPacket(tasks, None, None, compression), agent_address)
+                future.add_done_callback(lambda future, agent_id=agent_id: events.put(("delivered", agent_id, future.result())))
+    except KeyboardInterrupt:
+        # Ctrl+C reaches every process of the group, the coordinator stops the workers
+        pass
+    finally:
+        udp_server.stop()
+
+class IngestCluster:
+    '''
+    Starts the ingest worker processes and relays the coordinator's commands to them.
+
+    Attributes:
+        workers (int): Number of ingest worker processes.
+        events (multiprocessing.Queue): Queue of events sent by the workers.
+        owners (dict): Map agent_id -> index of the worker that owns the agent's session.
+    '''
+    def __init__(self, workers, host, port, db_path, log_level=None, checksum_algorithm=None):
+        '''
+        Initializes the cluster. No process is started until `start` is called.
+
+        Args:
+            workers (int): Number of ingest worker processes.
+            host (str): Address to bind to.
+            port (int): Port shared by every worker.
+            db_path (str): The file path to the SQLite database.
+            log_level (str, optional): Minimum type of log printed by the workers. Defaults to printing every log.
+            checksum_algorithm (str, optional): Name of the algorithm of the checksums the workers produce. Defaults to CRC32.
+        '''
+        # Workers are spawned rather than forked, since the coordinator already runs threads
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.db_path = db_path
+        self.log_level = log_level
+        # Spawned workers don't inherit the coordinator's selection, so it is handed to them
+        self.checksum_algorithm = checksum_algorithm
+        self.events = self.context.Queue()
+        self.commands = [self.context.Queue() for _ in range(workers)]
+        self.processes = []
+        self.owners = {}
+
+    def start(self):
+        '''
+        Starts the ingest worker processes.
+        '''
+        for index in range(self.workers):
+            process = self.context.Process(
+                target=run_ingest_worker,
+                args=(index, self.host, self.port, self.db_path, self.events, self.commands[index], self.log_level, self.checksum_algorithm),
+                name=f"ingest-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+        log(f"Started {self.workers} ingest workers on port {self.port}.")
+
+    def stop(self):
+        '''
+        Stops every worker process and waits for them to exit.
+        '''
+        for commands in self.commands:
+            commands.put(("stop",))
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    def next_event(self, timeout=None):
+        '''
+        Waits for the next event sent by a worker.
+
+        Args:
+            timeout (float, optional): How long to wait, in seconds. Defaults to waiting forever.
+
+        Returns:
+            tuple: The event.
+
+        Raises:
+            queue.Empty: If no event arrived within the timeout.
+        '''
+        return self.events.get(timeout=timeout)
+
+    def confirm_registration(self, worker, agent_id):
+        '''
+        Tells a worker that an agent it received was registered, so it stores the agent's metrics.
+
+        Args:
+            worker (int): Index of the worker that received the registration.
+            agent_id (str): The ID of the registered agent.
+        '''
+        self.owners[agent_id] = worker
+        self.commands[worker].put(("registered", agent_id))
+
+    def respond(self, worker, agent_address, response):
+        '''
+        Asks a worker to answer a registration it received, since the agent's ACKs only reach that worker.
+
+        Args:
+            worker (int): Index of the worker that received the registration.
+            agent_address (tuple): The address of the agent.
+            response (RegisterAgentPacketResponse): The registration status, and the negotiated compression.
+        '''
+        self.commands[worker].put(("respond", agent_address, response))
+
+    def send_tasks(self, agent_id, agent_address, tasks, compression=Compression.NONE):
+        '''
+        Asks the worker that owns an agent to send it tasks. A ("delivered", agent_id, delivered)
+        event follows once the agent acknowledged them, or they were given up on.
+
+        Args:
+            agent_id (str): The ID of the agent.
+            agent_address (tuple): The address of the agent.
+            tasks (list): The tasks to send.
+            compression (Compression, optional): The compression method negotiated with the agent. Defaults to NONE.
+
+        Returns:
+            bool: False if no worker owns the agent, True otherwise.
+        '''
+        worker = self.owners.get(agent_id)
+        if worker is None:
+            return False
+        self.commands[worker].put(("send_tasks", agent_id, agent_address, tasks, compression))
+        return True
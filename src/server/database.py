@@ -87,6 +87,42 @@ def insert_metrics(path, task_id, device_id, bandwidth, jitter, loss, latency, t
     connection.commit()
     connection.close()
 
+def insert_metrics_batch(path, rows):
+    '''
+    Inserts several rows of metrics data into the `packets` table in one transaction.
+
+    Args:
+        path (str): The file path to the SQLite database.
+        rows (list[tuple]): The rows to insert, as (task_id, device_id, bandwidth, jitter, loss, latency, timestamp)
+            tuples with the same meaning as the arguments of `insert_metrics`.
+
+    Returns:
+        None
+    '''
+    rows = [
+        (
+            task_id,
+            device_id,
+            round(bandwidth, 2) if bandwidth is not None else None,
+            round(jitter, 3) if jitter is not None else None,
+            loss,
+            round(latency, 3) if latency is not None else None,
+            timestamp
+        )
+        for task_id, device_id, bandwidth, jitter, loss, latency, timestamp in rows
+    ]
+
+    connection = sqlite3.connect(path)
+    cursor = connection.cursor()
+
+    cursor.executemany('''
+        INSERT INTO packets (task_id, device_id, bandwidth, jitter, loss, latency, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+    connection.commit()
+    connection.close()
+
 def insert_alert(path, task_id, device_id, alert_type, details, timestamp):
     '''
     Inserts a new row of alert data into the `alertflow` table.
@@ -112,3 +148,26 @@ def insert_alert(path, task_id, device_id, alert_type, details, timestamp):
 
     connection.commit()
     connection.close()
+
+def insert_alerts_batch(path, rows):
+    '''
+    Inserts several rows of alert data into the `alertflow` table in one transaction.
+
+    Args:
+        path (str): The file path to the SQLite database.
+        rows (list[tuple]): The rows to insert, as (task_id, device_id, alert_type, details, timestamp)
+            tuples with the same meaning as the arguments of `insert_alert`.
+
+    Returns:
+        None
+    '''
+    connection = sqlite3.connect(path)
+    cursor = connection.cursor()
+
+    cursor.executemany('''
+        INSERT INTO alertflow (task_id, device_id, alert_type, details, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+
+    connection.commit()
+    connection.close()
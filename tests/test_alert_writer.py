@@ -0,0 +1,74 @@
+import sqlite3
+import time
+
+from server import alert_writer
+from server.alert_writer import AlertWriter
+from server.database import setup_database
+
+def stored(db_path):
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute("SELECT task_id, device_id, alert_type, details, timestamp FROM alertflow ORDER BY rowid").fetchall()
+    connection.close()
+    return rows
+
+def row(index):
+    return ("task-1", "n1", "HIGH_CPU_USAGE", f"alert {index}", "2026-10-17 00:00:00")
+
+def test_full_batches_are_flushed_at_once(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    setup_database(db_path)
+    writer = AlertWriter(db_path, max_batch_size=10, max_latency=60)
+    # Queued before the thread starts, so the batches are full
+    for index in range(25):
+        writer.add(*row(index))
+    writer.start()
+    deadline = time.monotonic() + 5
+    while writer.stats()["written"] < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    stats = writer.stats()
+    assert stats["written"] == 20
+    assert stats["batch_size"]["max"] == 10
+    # The last 5 wait for more alerts until stop
+    writer.stop()
+    assert stored(db_path) == [row(index) for index in range(25)]
+    assert writer.stats()["batches"] == 3
+
+def test_partial_batch_is_flushed_after_max_latency(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    setup_database(db_path)
+    writer = AlertWriter(db_path, max_batch_size=100, max_latency=0.05)
+    writer.start()
+    try:
+        started = time.monotonic()
+        writer.add(*row(0))
+        while not stored(db_path) and time.monotonic() - started < 5:
+            time.sleep(0.005)
+        assert time.monotonic() - started < 1
+        assert stored(db_path) == [row(0)]
+    finally:
+        writer.stop()
+
+def test_stop_stores_the_queued_alerts(tmp_path):
+    db_path = str(tmp_path / "metrics.db")
+    setup_database(db_path)
+    writer = AlertWriter(db_path, max_batch_size=4, max_latency=60)
+    writer.start()
+    for index in range(10):
+        writer.add(*row(index))
+    writer.stop()
+    assert stored(db_path) == [row(index) for index in range(10)]
+
+def test_failed_writes_are_counted(tmp_path, monkeypatch):
+    def failing(db_path, rows):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(alert_writer, "insert_alerts_batch", failing)
+    writer = AlertWriter(str(tmp_path / "metrics.db"), max_batch_size=4, max_latency=60)
+    writer.start()
+    for index in range(6):
+        writer.add(*row(index))
+    writer.stop()
+    stats = writer.stats()
+    assert stats["failed"] == 6
+    assert stats["written"] == 0
@@ -0,0 +1,60 @@
+import pytest
+
+from agent.alerts import AlertSuppressor
+from lib.tcp import AlertType
+
+THRESHOLD = 80
+
+def check(suppressor, value, now, task_id="task-1", alert_type=AlertType.HIGH_CPU_USAGE):
+    return suppressor.check(task_id, alert_type, value, THRESHOLD, "CPU usage is above the threshold", now=now)
+
+def test_first_breach_is_sent():
+    suppressor = AlertSuppressor(cooldown=60, hysteresis=0.1)
+    assert check(suppressor, 70, now=0) is None
+    assert check(suppressor, 90, now=1) == "CPU usage is above the threshold"
+    assert suppressor.sent == 1
+
+def test_breaches_within_the_cooldown_are_suppressed_then_rolled_up():
+    suppressor = AlertSuppressor(cooldown=60, hysteresis=0.1)
+    check(suppressor, 90, now=0)
+    for now in range(10, 60, 10):
+        assert check(suppressor, 90, now=now) is None
+    assert suppressor.suppressed == 5
+    # The breach ending the cooldown is counted in the roll-up
+    assert check(suppressor, 90, now=60) == "CPU usage is above the threshold (still firing, 6 occurrences since the last alert)"
+    assert check(suppressor, 90, now=70) is None
+    assert check(suppressor, 90, now=120) == "CPU usage is above the threshold (still firing, 2 occurrences since the last alert)"
+    assert suppressor.sent == 3
+
+def test_condition_clears_through_the_hysteresis():
+    suppressor = AlertSuppressor(cooldown=0, hysteresis=0.1)
+    check(suppressor, 90, now=0)
+    # Below the threshold but not by 10% of it: still firing
+    assert check(suppressor, 75, now=1) is not None
+    assert suppressor.conditions[("task-1", AlertType.HIGH_CPU_USAGE)]["firing"]
+    assert check(suppressor, 71, now=2) is None
+    assert not suppressor.conditions[("task-1", AlertType.HIGH_CPU_USAGE)]["firing"]
+
+def test_fires_again_after_a_clear():
+    suppressor = AlertSuppressor(cooldown=60, hysteresis=0.1)
+    check(suppressor, 90, now=0)
+    check(suppressor, 50, now=10)
+    # Within the cooldown of the first alert, a new breach is only counted
+    assert check(suppressor, 90, now=20) is None
+    check(suppressor, 50, now=30)
+    # After it, the next one is sent, with the breaches suppressed in between
+    assert check(suppressor, 90, now=70) == "CPU usage is above the threshold (2 occurrences since the last alert)"
+    check(suppressor, 50, now=80)
+    assert check(suppressor, 90, now=200) == "CPU usage is above the threshold"
+
+def test_conditions_are_independent():
+    suppressor = AlertSuppressor(cooldown=60, hysteresis=0.1)
+    assert check(suppressor, 90, now=0) is not None
+    assert check(suppressor, 90, now=1, task_id="task-2") is not None
+    assert check(suppressor, 90, now=2, alert_type=AlertType.HIGH_RAM_USAGE) is not None
+    assert check(suppressor, 90, now=3) is None
+
+@pytest.mark.parametrize("cooldown, hysteresis", [(-1, 0.1), (60, -0.1), (60, 1), (60, 1.5)])
+def test_invalid_settings_are_rejected(cooldown, hysteresis):
+    with pytest.raises(ValueError):
+        AlertSuppressor(cooldown=cooldown, hysteresis=hysteresis)
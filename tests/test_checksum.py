@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from lib import checksum
+from lib.checksum import ChecksumAlgorithm, append_checksum, digest_size, set_checksum_algorithm, split_checksum
+from lib.packets import MetricsPacket
+
+@pytest.fixture(autouse=True)
+def default_algorithm():
+    yield
+    set_checksum_algorithm(ChecksumAlgorithm.CRC32)
+
+@pytest.mark.parametrize("name", ["crc32", "sha256-32", "sha256"])
+def test_round_trip(name):
+    set_checksum_algorithm(name)
+    data = append_checksum(b"packet data")
+    algorithm = ChecksumAlgorithm[name.upper().replace("-", "_")]
+    assert len(data) == len(b"packet data") + digest_size(algorithm) + 1
+    assert data[-1] == algorithm.value
+    assert split_checksum(memoryview(data), "Packet") == len(b"packet data")
+
+@pytest.mark.parametrize("name", ["crc32", "sha256-32", "sha256"])
+def test_flipped_byte_is_rejected(name):
+    set_checksum_algorithm(name)
+    data = bytearray(append_checksum(b"packet data"))
+    for index in range(len(data) - 1):
+        corrupt = bytearray(data)
+        corrupt[index] ^= 0x01
+        with pytest.raises(ValueError):
+            split_checksum(corrupt, "Packet")
+
+def test_unknown_algorithm_is_rejected():
+    data = bytearray(append_checksum(b"packet data"))
+    data[-1] = 0xFF
+    with pytest.raises(ValueError):
+        split_checksum(data, "Packet")
+
+@pytest.mark.parametrize("data", [b"", bytes([ChecksumAlgorithm.CRC32.value]), b"ab" + bytes([ChecksumAlgorithm.SHA256.value])])
+def test_too_short_packet_is_rejected(data):
+    with pytest.raises(ValueError):
+        split_checksum(data, "Packet")
+
+def test_unknown_algorithm_name_is_rejected():
+    with pytest.raises(KeyError):
+        set_checksum_algorithm("md5")
+    assert checksum.algorithm == ChecksumAlgorithm.CRC32
+
+def test_sha256_packet_is_accepted_by_a_crc32_receiver():
+    packet = MetricsPacket("task-1", "n1", 1.0, 2.0, 0.5, 3.0, int(time.time()))
+    packet.sequence_number = 7
+    packet.ack_number = 1
+    set_checksum_algorithm(ChecksumAlgorithm.SHA256)
+    data = packet.serialize()
+
+    set_checksum_algorithm(ChecksumAlgorithm.CRC32)
+    received = MetricsPacket.deserialize(data)
+    assert data[-1] == ChecksumAlgorithm.SHA256.value
+    assert (received.task_id, received.device_id, received.jitter) == ("task-1", "n1", 2.0)
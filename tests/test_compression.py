@@ -0,0 +1,70 @@
+import hashlib
+import random
+import zlib
+
+import pytest
+
+from lib.compression import (
+    CAPABILITIES, COMPRESSION_THRESHOLD, DICTIONARY, MAX_DECOMPRESSED_SIZE, Compression, compress, decompress, negotiate
+)
+
+# Typical alert details, repetitive enough for every method to shrink them
+PAYLOAD = b"CPU usage is above the threshold: 97% on eth0 of PC1 for task-1. " * 8
+
+def test_negotiate_picks_the_best_common_method():
+    assert negotiate(CAPABILITIES) == Compression.ZLIB_DICTIONARY
+    assert negotiate(1 << Compression.ZLIB.value) == Compression.ZLIB
+    assert negotiate(0) == Compression.NONE
+    # Methods this process doesn't know about are ignored
+    assert negotiate(1 << 7) == Compression.NONE
+
+@pytest.mark.parametrize("method", list(Compression))
+def test_round_trip(method):
+    used, payload = compress(PAYLOAD, method)
+    assert used == method
+    if method != Compression.NONE:
+        assert len(payload) < len(PAYLOAD)
+    assert bytes(decompress(payload, used.value)) == PAYLOAD
+
+def test_the_dictionary_helps_small_payloads():
+    data = PAYLOAD[:COMPRESSION_THRESHOLD + 10]
+    _, with_dictionary = compress(data, Compression.ZLIB_DICTIONARY)
+    _, without = compress(data, Compression.ZLIB)
+    assert len(with_dictionary) < len(without)
+
+def test_the_dictionary_never_changes():
+    # Peers decompress with their own copy, so changing it breaks every deployed agent
+    assert hashlib.sha256(DICTIONARY).hexdigest() == "bb6bf853f6bac854553400c98bf1017be2618e8354157a020a16492d0d255dbd"
+
+@pytest.mark.parametrize("method", [Compression.ZLIB, Compression.ZLIB_DICTIONARY])
+def test_small_payloads_are_not_compressed(method):
+    data = PAYLOAD[:COMPRESSION_THRESHOLD - 1]
+    assert compress(data, method) == (Compression.NONE, data)
+
+@pytest.mark.parametrize("method", [Compression.ZLIB, Compression.ZLIB_DICTIONARY])
+def test_payloads_that_dont_shrink_are_sent_as_is(method):
+    data = random.Random(0).randbytes(512)
+    assert compress(data, method) == (Compression.NONE, data)
+
+def test_decompression_is_capped():
+    compressor = zlib.compressobj(wbits=-15)
+    bomb = compressor.compress(b"\x00" * (MAX_DECOMPRESSED_SIZE + 1)) + compressor.flush()
+    with pytest.raises(ValueError):
+        decompress(bomb, Compression.ZLIB.value)
+
+    compressor = zlib.compressobj(wbits=-15)
+    largest = compressor.compress(b"\x00" * MAX_DECOMPRESSED_SIZE) + compressor.flush()
+    assert len(decompress(largest, Compression.ZLIB.value)) == MAX_DECOMPRESSED_SIZE
+
+@pytest.mark.parametrize("method", [Compression.ZLIB, Compression.ZLIB_DICTIONARY])
+def test_corrupt_payloads_are_rejected(method):
+    _, payload = compress(PAYLOAD, method)
+    with pytest.raises(ValueError):
+        decompress(b"\xff" + payload[1:], method.value)
+    # Truncated
+    with pytest.raises(ValueError):
+        decompress(payload[:len(payload) // 2], method.value)
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        decompress(PAYLOAD, 7)
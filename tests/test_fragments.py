@@ -0,0 +1,71 @@
+import pytest
+
+from lib import fragments
+from lib.fragments import Reassembler, fragment
+from lib.packets import FragmentPacket, FRAGMENT_HEADER_SIZE
+
+def pieces(data, fragment_id, payload_size=10):
+    return [FragmentPacket.deserialize(datagram) for datagram in fragment(data, fragment_id, payload_size + FRAGMENT_HEADER_SIZE)]
+
+def test_reassembles_out_of_order_fragments():
+    reassembler = Reassembler()
+    data = bytes(range(95))
+    parts = pieces(data, 1)
+    assert len(parts) == 10
+    for part in reversed(parts[1:]):
+        assert reassembler.add("a", part) is None
+    # A retransmitted fragment is ignored
+    assert reassembler.add("a", parts[5]) is None
+    assert reassembler.add("a", parts[0]) == data
+    assert reassembler.stats() == {"pending": 0, "bytes": 0, "completed": 1, "expired": 0, "evicted": 0}
+
+def test_small_packets_are_not_fragmented():
+    assert fragment(b"data", 1, 100) == [b"data"]
+
+def test_fragment_limits():
+    with pytest.raises(ValueError):
+        fragment(b"x" * 100, 1, FRAGMENT_HEADER_SIZE)
+    with pytest.raises(ValueError):
+        fragment(b"x" * (fragments.MAX_FRAGMENTS + 1), 1, FRAGMENT_HEADER_SIZE + 1)
+
+def test_changed_fragment_count_is_rejected():
+    reassembler = Reassembler()
+    reassembler.add("a", FragmentPacket(1, 0, 3, b"x"))
+    with pytest.raises(ValueError):
+        reassembler.add("a", FragmentPacket(1, 1, 4, b"y"))
+    assert reassembler.stats()["pending"] == 0
+
+def test_incomplete_packets_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(fragments.time, "monotonic", lambda: now[0])
+    reassembler = Reassembler(timeout=5)
+    parts = pieces(b"a" * 50, 1)
+    reassembler.add("a", parts[0])
+    now[0] += 3
+    reassembler.add("b", pieces(b"b" * 50, 2)[0])
+
+    now[0] += 3
+    # "a" is 6 s old and dropped, so its next fragment starts over
+    assert reassembler.add("a", parts[1]) is None
+    stats = reassembler.stats()
+    assert stats["expired"] == 1
+    assert stats["pending"] == 2
+    assert stats["bytes"] == 20
+    for part in parts[2:]:
+        assert reassembler.add("a", part) is None
+
+def test_oldest_packets_are_evicted_over_the_memory_cap():
+    reassembler = Reassembler(max_bytes=25)
+    parts = {key: pieces(key.encode() * 30, 1) for key in ("a", "b", "c")}
+    for key in ("a", "b", "c"):
+        reassembler.add(key, parts[key][0])
+    stats = reassembler.stats()
+    assert stats["evicted"] == 1
+    assert stats["pending"] == 2
+    assert stats["bytes"] == 20
+
+    assert reassembler.add("c", parts["c"][1]) is None
+    assert reassembler.add("c", parts["c"][2]) == b"c" * 30
+    # "a" was evicted, so its remaining fragments don't complete it
+    assert reassembler.add("a", parts["a"][1]) is None
+    assert reassembler.add("a", parts["a"][2]) is None
@@ -0,0 +1,42 @@
+import pytest
+
+from lib.rtt import RTTEstimator
+
+def test_initial_rto_is_bounded():
+    assert RTTEstimator(initial_rto=2).rto == 2
+    assert RTTEstimator(initial_rto=0.01, min_rto=0.1).rto == 0.1
+    assert RTTEstimator(initial_rto=100, max_rto=60).rto == 60
+
+def test_first_sample():
+    estimator = RTTEstimator(min_rto=0)
+    estimator.sample(0.2)
+    assert estimator.srtt == pytest.approx(0.2)
+    assert estimator.rttvar == pytest.approx(0.1)
+    assert estimator.rto == pytest.approx(0.2 + 4 * 0.1)
+
+def test_next_samples_are_smoothed():
+    estimator = RTTEstimator(min_rto=0)
+    estimator.sample(0.2)
+    estimator.sample(0.4)
+    assert estimator.rttvar == pytest.approx(0.75 * 0.1 + 0.25 * 0.2)
+    assert estimator.srtt == pytest.approx(0.875 * 0.2 + 0.125 * 0.4)
+    assert estimator.rto == pytest.approx(estimator.srtt + 4 * estimator.rttvar)
+
+def test_steady_rtt_converges_to_the_min_rto():
+    estimator = RTTEstimator(min_rto=0.1)
+    for _ in range(100):
+        estimator.sample(0.01)
+    assert estimator.srtt == pytest.approx(0.01)
+    assert estimator.rto == 0.1
+
+def test_backoff_doubles_up_to_the_max_rto():
+    estimator = RTTEstimator(initial_rto=1, max_rto=5)
+    estimator.backoff()
+    assert estimator.rto == 2
+    estimator.backoff()
+    estimator.backoff()
+    assert estimator.rto == 5
+    # A new sample ends the backoff
+    estimator.sample(0.2)
+    assert estimator.rto == pytest.approx(0.6)
+    assert estimator.snapshot()["backoffs"] == 3
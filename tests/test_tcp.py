@@ -0,0 +1,74 @@
+import socket
+
+import pytest
+
+from lib.tcp import FrameReader, frame
+
+@pytest.fixture
+def pair():
+    writer, reader = socket.socketpair()
+    reader.setblocking(False)
+    yield writer, reader
+    writer.close()
+    reader.close()
+
+def read_all(reader):
+    frames = []
+    while True:
+        try:
+            if reader.receive() == 0:
+                break
+        except BlockingIOError:
+            break
+        while (payload := reader.next_frame()) is not None:
+            frames.append(payload)
+    return frames
+
+def test_coalesced_frames(pair):
+    writer, sock = pair
+    reader = FrameReader(sock)
+    payloads = [bytes([index]) * index for index in range(1, 50)]
+    writer.sendall(b"".join(frame(payload) for payload in payloads))
+    assert read_all(reader) == payloads
+    assert reader.pending == 0
+
+def test_frame_split_across_reads(pair):
+    writer, sock = pair
+    reader = FrameReader(sock)
+    data = frame(b"first") + frame(b"second")
+    for offset in range(len(data)):
+        writer.sendall(data[offset:offset + 1])
+        reader.receive()
+        if offset < len(frame(b"first")) - 1:
+            assert reader.next_frame() is None
+    assert reader.next_frame() == b"first"
+    assert reader.next_frame() == b"second"
+
+def test_buffer_wraps_and_grows(pair):
+    writer, sock = pair
+    reader = FrameReader(sock, chunk_size=16)
+    # Frames straddling the end of the buffer, then one larger than the buffer
+    payloads = [b"x" * 10, b"y" * 10, b"z" * 10, b"w" * 100]
+    frames = []
+    for payload in payloads:
+        writer.sendall(frame(payload))
+        frames.extend(read_all(reader))
+    assert frames == payloads
+
+def test_oversized_frame_is_rejected_from_its_header(pair):
+    writer, sock = pair
+    reader = FrameReader(sock, max_frame_size=100)
+    writer.sendall(frame(b"x" * 101)[:8])
+    reader.receive()
+    with pytest.raises(ValueError):
+        reader.next_frame()
+
+def test_closed_connection(pair):
+    writer, sock = pair
+    reader = FrameReader(sock)
+    writer.sendall(frame(b"incomplete")[:6])
+    writer.close()
+    assert reader.receive() == 6
+    assert reader.next_frame() is None
+    assert reader.receive() == 0
+    assert reader.pending == 6
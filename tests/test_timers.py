@@ -0,0 +1,58 @@
+import threading
+
+from lib.timers import TimerScheduler
+
+def test_timers_fire_in_due_order():
+    scheduler = TimerScheduler()
+    scheduler.start()
+    fired = []
+    done = threading.Event()
+    try:
+        scheduler.schedule(0.06, fired.append, "c")
+        scheduler.schedule(0.02, fired.append, "a")
+        scheduler.schedule(0.04, fired.append, "b")
+        scheduler.schedule(0.08, done.set)
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert fired == ["a", "b", "c"]
+
+def test_cancelled_timers_never_fire():
+    scheduler = TimerScheduler()
+    scheduler.start()
+    fired = []
+    done = threading.Event()
+    try:
+        timer = scheduler.schedule(0.01, fired.append, "cancelled")
+        timer.cancel()
+        # Cancelling twice, or after it fired, does nothing
+        timer.cancel()
+        scheduler.schedule(0.03, done.set)
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert fired == []
+    assert scheduler.pending() == 0
+
+def test_cancelled_timers_are_compacted():
+    scheduler = TimerScheduler()
+    timers = [scheduler.schedule(60, lambda: None) for _ in range(200)]
+    for timer in timers[:150]:
+        timer.cancel()
+    assert scheduler.pending() == 50
+    assert len(scheduler.heap) < 200
+
+def test_a_failing_callback_does_not_stop_the_scheduler():
+    scheduler = TimerScheduler()
+    scheduler.start()
+    done = threading.Event()
+
+    def failing():
+        raise RuntimeError("boom")
+
+    try:
+        scheduler.schedule(0.01, failing)
+        scheduler.schedule(0.02, done.set)
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
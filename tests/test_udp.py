@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+from lib.packets import MetricsBatchPacket, MetricsPacket
+from lib.udp import UDPServer
+from lib.udp_async import AsyncUDPServer
+
+def metrics():
+    return MetricsPacket("task-1", "n1", 1.0, 1.0, 0.0, 1.0, int(time.time()))
+
+def unserializable():
+    # More samples than a batch can count
+    return MetricsBatchPacket([metrics() for _ in range(300)])
+
+def test_a_failing_handler_does_not_drop_the_next_packets():
+    delivered = []
+
+    def handler(message, address, server):
+        delivered.append(message.sequence_number)
+        if message.sequence_number == 101:
+            raise RuntimeError("boom")
+
+    server = UDPServer("127.0.0.1", 0, handler)
+    # Nothing listens there, the ACKs are lost
+    address = ("127.0.0.1", 9)
+    try:
+        for sequence_number in (102, 103, 101):
+            packet = metrics()
+            packet.sequence_number = sequence_number
+            packet.ack_number = 101
+            server.handle_packet(packet.serialize(), address)
+        session = server.get_session(address)
+        assert delivered == [101, 102, 103]
+        assert session["reorder"].expected_sequence_number == 104
+        assert session["receive_window"].backlog == 0
+    finally:
+        server.stop()
+
+def test_duplicates_are_counted_from_every_worker():
+    server = UDPServer("127.0.0.1", 0, lambda message, address, server: None)
+    addresses = [("127.0.0.1", port) for port in range(9000, 9008)]
+    datagrams = []
+    for sequence_number in range(1, 51):
+        packet = metrics()
+        packet.sequence_number = sequence_number
+        packet.ack_number = 1
+        datagrams.append(packet.serialize())
+
+    def replay(address):
+        # Every packet a second time
+        for datagram in datagrams + datagrams:
+            server.handle_packet(datagram, address)
+
+    threads = [threading.Thread(target=replay, args=(address,)) for address in addresses]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert server.stats()["duplicates_suppressed"] == len(addresses) * len(datagrams)
+    finally:
+        server.stop()
+
+def test_failed_serialization_does_not_take_a_window_slot():
+    received = []
+    receiver = UDPServer("127.0.0.1", 0, lambda message, address, server: received.append(message))
+    sender = UDPServer("127.0.0.1", 0, lambda message, address, server: None, window_size=1)
+    for server in (receiver, sender):
+        threading.Thread(target=server.start, daemon=True).start()
+    address = receiver.socket.getsockname()
+
+    try:
+        assert sender.send_message_nowait(unserializable(), address).result(5) is False
+        futures = [sender.send_message_nowait(metrics(), address) for _ in range(3)]
+        assert [future.result(10) for future in futures] == [True] * 3
+    finally:
+        sender.stop()
+        receiver.stop()
+    assert len(received) == 3
+
+def test_failed_serialization_does_not_take_a_window_slot_async():
+    async def run():
+        received = []
+        receiver = AsyncUDPServer("127.0.0.1", 0, lambda message, address, server: received.append(message))
+        sender = AsyncUDPServer("127.0.0.1", 0, lambda message, address, server: None, window_size=1)
+        await receiver.start()
+        await sender.start()
+        address = receiver.transport.get_extra_info("sockname")
+
+        try:
+            assert await asyncio.wait_for(sender.send_message(unserializable(), address), 5) is False
+            futures = [sender.send_message(metrics(), address) for _ in range(3)]
+            assert await asyncio.wait_for(asyncio.gather(*futures), 10) == [True] * 3
+        finally:
+            sender.stop()
+            receiver.stop()
+        assert len(received) == 3
+
+    asyncio.run(run())
+
+def test_stop_gives_up_on_held_back_messages_async():
+    async def run():
+        sender = AsyncUDPServer("127.0.0.1", 0, lambda message, address, server: None, window_size=1)
+        await sender.start()
+        # Nothing listens there, so the first message keeps the only slot of the window
+        futures = [sender.send_message(metrics(), ("127.0.0.1", 9)) for _ in range(3)]
+        sender.stop()
+        assert [future.done() for future in futures] == [True] * 3
+        assert [future.result() for future in futures] == [False] * 3
+        assert sender.eviction_timer is None
+
+    asyncio.run(run())
@@ -0,0 +1,138 @@
+from lib.window import SEQUENCE_SPACE, ReorderBuffer, SendWindow, seq_add, seq_distance, seq_lt
+
+def test_seq_arithmetic_wraps_around():
+    last = SEQUENCE_SPACE - 1
+    assert seq_add(last, 1) == 0
+    assert seq_add(last, 3) == 2
+    assert seq_distance(last, 1) == 2
+    assert seq_lt(last, 0)
+    assert not seq_lt(0, last)
+    assert not seq_lt(5, 5)
+
+
+def test_send_window_fills_up_and_slides():
+    window = SendWindow(2)
+    assert window.allocate() == 1
+    assert window.allocate() == 2
+    assert not window.can_send()
+    # Released out of order, the base only moves once the oldest is released
+    window.release(2)
+    assert window.base() == 1
+    assert not window.can_send()
+    window.release(1)
+    assert window.base() == 3
+    assert window.can_send()
+    assert window.in_flight() == 0
+
+def test_push_releases_in_order():
+    buffer = ReorderBuffer(8)
+    assert buffer.push(1, "a") == (ReorderBuffer.NEW, ["a"])
+    assert buffer.push(3, "c") == (ReorderBuffer.NEW, [])
+    assert buffer.buffered() == 1
+    assert buffer.push(2, "b") == (ReorderBuffer.NEW, ["b", "c"])
+    assert buffer.expected_sequence_number == 4
+    assert buffer.buffered() == 0
+
+def test_push_buffered_duplicate():
+    buffer = ReorderBuffer(8)
+    buffer.push(1, "a")
+    buffer.push(3, "c")
+    assert buffer.push(3, "c") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.buffered() == 1
+
+def test_push_out_of_window():
+    buffer = ReorderBuffer(8)
+    assert buffer.push(9, "i") == (ReorderBuffer.OUT_OF_WINDOW, [])
+    assert buffer.buffered() == 0
+    assert buffer.push(8, "h") == (ReorderBuffer.NEW, [])
+
+def test_window_base_skips_given_up_packets():
+    buffer = ReorderBuffer(8)
+    buffer.push(1, "a")
+    buffer.push(4, "d")
+    # The sender gave up on 2 and 3: 4 is released without waiting for them
+    assert buffer.push(5, "e", window_base=4) == (ReorderBuffer.NEW, ["d", "e"])
+    assert buffer.expected_sequence_number == 6
+
+def test_window_base_releases_buffered_packets_before_it():
+    buffer = ReorderBuffer(8)
+    buffer.push(3, "c")
+    buffer.push(5, "e")
+    assert buffer.push(7, "g", window_base=6) == (ReorderBuffer.NEW, ["c", "e"])
+    assert buffer.expected_sequence_number == 6
+    assert buffer.buffered() == 1
+
+def test_send_window_wraps_around():
+    window = SendWindow(2, first_sequence=SEQUENCE_SPACE - 1)
+    assert window.allocate() == SEQUENCE_SPACE - 1
+    assert window.allocate() == 0
+    assert not window.can_send()
+    window.release(SEQUENCE_SPACE - 1)
+    assert window.base() == 0
+    assert window.can_send()
+    assert window.allocate() == 1
+
+def test_push_wraps_around():
+    first = SEQUENCE_SPACE - 2
+    buffer = ReorderBuffer(8, first_sequence=first)
+    assert buffer.push(0, "c") == (ReorderBuffer.NEW, [])
+    assert buffer.push(first, "a") == (ReorderBuffer.NEW, ["a"])
+    assert buffer.push(SEQUENCE_SPACE - 1, "b") == (ReorderBuffer.NEW, ["b", "c"])
+    assert buffer.expected_sequence_number == 1
+    assert buffer.push(SEQUENCE_SPACE - 1, "b") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.push(9, "j") == (ReorderBuffer.OUT_OF_WINDOW, [])
+
+def test_window_base_skip_wraps_around():
+    buffer = ReorderBuffer(8, first_sequence=SEQUENCE_SPACE - 2)
+    buffer.push(SEQUENCE_SPACE - 1, "b")
+    assert buffer.push(1, "d", window_base=SEQUENCE_SPACE - 1) == (ReorderBuffer.NEW, ["b"])
+    assert buffer.expected_sequence_number == 0
+    assert buffer.push(0, "c", window_base=0) == (ReorderBuffer.NEW, ["c", "d"])
+    assert buffer.expected_sequence_number == 2
+
+def test_delivered_packets_are_duplicates():
+    buffer = ReorderBuffer(8)
+    buffer.push(1, "a")
+    buffer.push(2, "b")
+    assert buffer.push(1, "a") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.push(2, "b") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.duplicates == 2
+
+def test_skipped_packets_are_late():
+    buffer = ReorderBuffer(8)
+    buffer.push(1, "a")
+    buffer.push(4, "d")
+    buffer.push(5, "e", window_base=4)
+    # A late copy of a skipped packet is told apart from a duplicate of a delivered one
+    assert buffer.push(2, "b") == (ReorderBuffer.LATE, [])
+    assert buffer.push(4, "d") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.push(1, "a") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.late == 1
+    assert buffer.duplicates == 2
+
+def test_packets_released_by_a_skip_are_remembered():
+    buffer = ReorderBuffer(8)
+    buffer.push(3, "c")
+    buffer.push(5, "e")
+    buffer.push(7, "g", window_base=6)
+    assert buffer.push(5, "e") == (ReorderBuffer.DUPLICATE, [])
+    assert buffer.push(4, "d") == (ReorderBuffer.LATE, [])
+
+def test_packets_older_than_the_history_are_duplicates():
+    buffer = ReorderBuffer(8, history_size=16)
+    for sequence_number in range(1, 41):
+        buffer.push(sequence_number, sequence_number)
+    assert buffer.push(10, 10) == (ReorderBuffer.DUPLICATE, [])
+
+def test_restart_resets_the_buffer():
+    buffer = ReorderBuffer(8, history_size=16)
+    for sequence_number in range(1, 101):
+        buffer.push(sequence_number, sequence_number)
+    # A window base further behind than the history means the peer started over
+    assert buffer.push(1, "restarted", window_base=1) == (ReorderBuffer.NEW, ["restarted"])
+    assert buffer.expected_sequence_number == 2
+
+def test_first_sequence_from_the_first_window_base():
+    buffer = ReorderBuffer(8, first_sequence=None)
+    assert buffer.push(1001, "b", window_base=1000) == (ReorderBuffer.NEW, [])
+    assert buffer.push(1000, "a", window_base=1000) == (ReorderBuffer.NEW, ["a", "b"])
@@ -0,0 +1,64 @@
+import threading
+
+from lib.worker_pool import WorkerPool
+
+def test_jobs_with_the_same_key_run_in_order():
+    pool = WorkerPool(num_workers=4)
+    pool.start()
+    runs = {key: [] for key in range(8)}
+    done = threading.Semaphore(0)
+
+    def job(key, index):
+        runs[key].append(index)
+        done.release()
+
+    try:
+        for index in range(100):
+            for key in runs:
+                assert pool.submit(key, job, key, index)
+        for _ in range(100 * len(runs)):
+            assert done.acquire(timeout=5)
+    finally:
+        pool.stop()
+    assert all(indices == list(range(100)) for indices in runs.values())
+    assert pool.stats()["completed"] == 100 * len(runs)
+
+def test_jobs_are_dropped_when_the_queue_is_full():
+    pool = WorkerPool(num_workers=1, max_queue_size=2)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    pool.start()
+    try:
+        assert pool.submit("a", blocking)
+        assert started.wait(5)
+        assert pool.submit("a", lambda: None)
+        assert pool.submit("a", lambda: None)
+        assert not pool.has_room("a")
+        assert not pool.submit("a", lambda: None)
+    finally:
+        release.set()
+        pool.stop()
+    stats = pool.stats()
+    assert stats["submitted"] == 3
+    assert stats["dropped"] == 1
+
+def test_a_failing_job_does_not_stop_its_worker():
+    pool = WorkerPool(num_workers=1)
+    done = threading.Event()
+
+    def failing():
+        raise RuntimeError("boom")
+
+    pool.start()
+    try:
+        pool.submit("a", failing)
+        pool.submit("a", done.set)
+        assert done.wait(5)
+    finally:
+        pool.stop()
+    assert pool.stats()["failed"] == 1